@@ -12,5 +12,24 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoMetasearch.settings')
+# Serve the search through the async view and the asyncio search pipeline
+os.environ.setdefault('METASEARCH_ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from metasearch.search_modules.http_transport import close_async_http_session
+
+async def application(scope, receive, send):
+    # Django doesn't handle the lifespan events of the ASGI server, so they are answered here:
+    # the aiohttp session shared by the searches on the event loop is closed when the server shuts down
+    if scope["type"] != "lifespan":
+        await django_application(scope, receive, send)
+        return
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_http_session()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -122,3 +122,128 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Metasearch
+
+# Maximum number of threads used to call the search engines at the same time (shared by all requests)
+# Every search makes 4 engine calls, so 32 threads serve 8 searches at the same time; size it for the requests
+# a worker process handles at once (e.g. the threads of the WSGI server). The calls of the searches beyond it
+# wait for a thread, get only the rest of the budget, and are dropped if the budget runs out while waiting
+METASEARCH_ENGINE_WORKERS = 32
+
+# Latency budget in seconds for a search request, passed down to every search engine call
+# When it runs out, the search continues with the search engines which have already answered
+METASEARCH_REQUEST_TIMEOUT = 5.0
+
+# Use the async search view and the asyncio search pipeline, enabled by the ASGI entry point (asgi.py)
+# WSGI deployments keep using the synchronous view and the thread pool
+METASEARCH_ASYNC_VIEWS = os.environ.get('METASEARCH_ASYNC_VIEWS', 'False') == 'True'
+
+# In-process cache of the selected results in front of metasearch(), keyed on the normalized query
+METASEARCH_RESULT_CACHE_ENABLED = True
+# Seconds the selected results for a query stay in the cache
+METASEARCH_RESULT_CACHE_TTL = 300
+# Seconds the results are cached when some search engines failed or didn't answer in time, so that they are asked again soon
+# The search engines out of their daily quota don't shorten it, they can't answer until the quota is reset
+METASEARCH_RESULT_CACHE_PARTIAL_TTL = 30
+# Maximum (estimated) size of the cached results in bytes per process
+METASEARCH_RESULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Cache of the raw responses of the search engines before they are parsed, persisted under METASEARCH_RESPONSE_CACHE_DIR
+METASEARCH_RESPONSE_CACHE_ENABLED = True
+METASEARCH_RESPONSE_CACHE_DIR = os.path.join(BASE_DIR, 'response_cache')
+# Seconds the raw response of each search engine stays in the cache
+METASEARCH_RESPONSE_CACHE_TTL = {
+    "Google": 3600,
+    "Yahoo!": 600,
+    "DuckDuckGo": 600,
+    "Yandex": 3600,
+}
+# Seconds between the purges of the expired responses from the disk, run on a background thread of every worker
+# None to purge them only by "python manage.py purge_response_cache" (e.g. from cron)
+METASEARCH_RESPONSE_CACHE_PURGE_INTERVAL = 3600
+
+# Identical searches in flight are coalesced in each worker process
+# Across the workers, a worker waits for another one searching for the same query and reads the response cache
+METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS = True
+# The queries are locked through a fixed number of lock files (their stripes), which are kept after use
+METASEARCH_SINGLE_FLIGHT_LOCK_DIR = os.path.join(METASEARCH_RESPONSE_CACHE_DIR, 'locks')
+METASEARCH_SINGLE_FLIGHT_LOCK_STRIPES = 256
+
+# Daily quota of the search engine APIs shared by the workers through an SQLite database
+# (see "Limits related to the number of the throwable queries to each search engine" in README.md)
+METASEARCH_QUOTA_ENABLED = True
+METASEARCH_QUOTA_LEDGER_PATH = os.path.join(BASE_DIR, 'quota_ledger.sqlite3')
+METASEARCH_QUOTA_LIMITS = {
+    "Google": 10000,
+    "Yandex": 10000,
+}
+# A search engine is skipped (or served only from the response cache) when its remaining quota of the day reaches this number
+METASEARCH_QUOTA_MARGIN = 100
+
+# Token-bucket rate limits of the requests thrown to each search engine by this process
+# "rate" is the number of requests per second and "burst" the number of requests thrown at once without waiting
+# The engines not listed here are not limited
+METASEARCH_RATE_LIMITS = {
+    "Google": {"rate": 1.0, "burst": 5},
+}
+
+# Number of the pages (10 results each) of the Google search results retrieved in parallel for a query
+# Each page spends a query of the daily quota, even a page past the total number of the results of the query,
+# since all the pages are requested at once and such pages are dropped afterwards
+METASEARCH_GOOGLE_PAGE_DEPTH = 1
+
+# HTTP transport shared by the search modules
+# Number of the hosts to keep the connection pools for, and number of the connections kept alive for a host
+METASEARCH_HTTP_POOL_CONNECTIONS = 8
+METASEARCH_HTTP_POOL_MAXSIZE = 16
+# Retries of the idempotent requests failed by a connection error or a 5xx status, with the exponential backoff in seconds
+# The requests to Google and Yandex are never retried, since every request spends a query of the daily quota
+METASEARCH_HTTP_RETRIES = 2
+METASEARCH_HTTP_BACKOFF_FACTOR = 0.2
+
+# Parser of the DuckDuckGo result page: "tokenizer" (standard library), "lxml" (needs lxml installed) or "beautifulsoup"
+# All of them return the same search results, "python -m metasearch.benchmarks.duckduckgo_parsers" compares their speed
+METASEARCH_DUCKDUCKGO_PARSER = "tokenizer"
+
+# Versioned data file listing the domains of the categories (encyclopedia, news agencies) and the domains removed from the results
+# The workers check it every METASEARCH_DOMAIN_CATEGORIES_CHECK_INTERVAL seconds and switch to the new version without a restart
+# (None to read it only once); replace the file at once (e.g. write a new file and rename it) to update it
+METASEARCH_DOMAIN_CATEGORIES_PATH = os.path.join(BASE_DIR, 'metasearch', 'data', 'domain_categories.json')
+METASEARCH_DOMAIN_CATEGORIES_CHECK_INTERVAL = 5.0
+
+# Merge the near-duplicate results (e.g. copies of an article syndicated on several sites) after removing the duplicated URLs
+# Results whose titles and snippets have an estimated Jaccard similarity of METASEARCH_NEAR_DUPLICATES_THRESHOLD or more are merged
+METASEARCH_NEAR_DUPLICATES_ENABLED = False
+METASEARCH_NEAR_DUPLICATES_THRESHOLD = 0.8
+
+# Filter the search results on the NumPy columns of a ResultSet (metasearch/result_set.py) instead of the lists of ResultItem
+# Building the columns costs more than the vectorized stages save for the pools the search engines return now
+# (up to 100 results each, see python -m metasearch.benchmarks.result_set), it only pays off for much deeper pools
+METASEARCH_RESULT_SET_ENABLED = False
+
+# Send the durations of the stages of a search (the search engine calls, the removal of the duplication, ...) back
+# in the Server-Timing header of the response; the durations are also kept in histograms in every worker process
+METASEARCH_SERVER_TIMING_ENABLED = True
+
+# Metrics of the searches (search engine calls and failures, durations of the stages, numbers of the results, caches, quota)
+# exposed at /metasearch/metrics in the Prometheus text format (404 when disabled)
+# Every worker writes a snapshot of its metrics into METASEARCH_METRICS_DIR at most every METASEARCH_METRICS_WRITE_INTERVAL seconds,
+# and the endpoint sums the snapshots of all the workers (None to report only the worker answering the scrape)
+# The counters of the stopped workers are folded into a single file of the directory, so that they never go back
+# The endpoint has no authentication: enable it only where /metasearch/metrics can't be reached from outside
+METASEARCH_METRICS_ENABLED = False
+METASEARCH_METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METASEARCH_METRICS_WRITE_INTERVAL = 1.0
+
+# Profiling of a search request on demand, see metasearch/profiling.py
+# A search request carrying METASEARCH_PROFILING_TOKEN in the X-Metasearch-Profile-Token header and the parameter
+# profile=cprofile or profile=sampling is run under the profiler, and the profile is downloaded (pstats or collapsed stacks)
+# or saved into METASEARCH_PROFILES_DIR with profile_output=save
+# The token is read from the environment so that it's never committed, the profiling is off without it
+METASEARCH_PROFILING_ENABLED = False
+METASEARCH_PROFILING_TOKEN = os.environ.get("METASEARCH_PROFILING_TOKEN")
+METASEARCH_PROFILES_DIR = os.path.join(BASE_DIR, 'profiles')
+# Interval in seconds between the samples of the stacks of the sampling profiler
+METASEARCH_PROFILING_SAMPLE_INTERVAL = 0.005
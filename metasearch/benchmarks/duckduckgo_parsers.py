@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import django
+
+# Measures the time the parsers of the DuckDuckGo result page take over the sample pages of the unit tests
+# Run from the directory of manage.py:
+#     python -m metasearch.benchmarks.duckduckgo_parsers [number of repetitions]
+
+TEST_DATA_DIR = 'metasearch/tests/unit_test/view/scraping_modules/duckduckgo/test_data/'
+SAMPLE_PAGES = ['sample_page_01.html', 'sample_page_02.html', 'sample_page_03.html']
+
+def measure(parse, page: str, repetitions: int) -> float:
+    # Returns the average seconds a parse of the page takes
+    started_at: float = time.perf_counter()
+    for i in range(repetitions):
+        parse(page)
+    return (time.perf_counter() - started_at) / repetitions
+
+def main(repetitions: int):
+    from metasearch.search_modules.duckduckgo_search_module import RESULT_PAGE_PARSERS
+    from metasearch.search_modules import duckduckgo_parsers
+    for file_name in SAMPLE_PAGES:
+        with open(TEST_DATA_DIR + file_name, mode='r') as f:
+            page: str = f.read()
+        expected: list = RESULT_PAGE_PARSERS["beautifulsoup"](page)
+        print(file_name + " (" + str(len(page)) + " characters, " + str(len(expected)) + " results)")
+        # The speedups are relative to the BeautifulSoup parser, which is measured first
+        baseline: float = None
+        for name, parse in RESULT_PAGE_PARSERS.items():
+            if name == "lxml" and duckduckgo_parsers.lxml is None:
+                print("    " + name.ljust(14) + "not installed")
+                continue
+            seconds: float = measure(parse, page, repetitions)
+            if baseline is None:
+                baseline = seconds
+            identical: str = "identical" if parse(page) == expected else "DIFFERENT"
+            print("    " + name.ljust(14) + "{:8.2f} ms  x{:5.1f}  {}".format(seconds * 1000, baseline / seconds, identical))
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoMetasearch.settings')
+    django.setup()
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
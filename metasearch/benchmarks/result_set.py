@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import random
+import django
+
+# Measures the time the filtering of the collected search results takes with the lists of ResultItem
+# and with the columns of ResultSet, for the pools of the collected search results of several sizes
+# The building of the ResultItem objects by the search modules isn't measured
+# Run from the directory of manage.py:
+#     python -m metasearch.benchmarks.result_set [number of repetitions]
+
+# Numbers of the results collected from every search engine
+NUMS_RESULTS_PER_ENGINE = [10, 50, 100]
+ENGINES = ["Google", "Yahoo!", "DuckDuckGo", "Yandex"]
+# Number of the pages every search engine can return, a third of them are returned by another search engine too
+NUM_PAGES_PER_DOMAIN = 20
+
+def make_results(num_results_per_engine: int, seed: int) -> list:
+    from metasearch.models import ResultItem
+    from metasearch.domain_categories import get_domain_categories
+    categories = get_domain_categories()
+    generator = random.Random(seed)
+    domains: list = [domain for category, domain_list in categories.category_domains for domain in domain_list[:30]]
+    domains = domains + ["example" + str(i) + ".com" for i in range(30)]
+    results: list = []
+    for engine in ENGINES:
+        for rank in range(1, num_results_per_engine + 1):
+            url: str = "https://www." + generator.choice(domains) + "/" + str(generator.randrange(NUM_PAGES_PER_DOMAIN))
+            results.append(ResultItem("Article " + url, url, engine, rank))
+    return results
+
+def filter_with_lists(results: list) -> list:
+    from metasearch.views import (
+        remove_result_item_duplication, remove_movie_contents_from, result_classification,
+        separate_items_by_categories, selection_for_general_computers
+    )
+    items: list = remove_movie_contents_from(remove_result_item_duplication(results))
+    return selection_for_general_computers(separate_items_by_categories(result_classification(items)))
+
+def filter_with_result_set(results: list) -> list:
+    from metasearch.result_set import build_result_set
+    return build_result_set(results).remove_duplicates().remove_movie_contents().select_for_general_computers().to_items()
+
+def measure(filter_results, num_results_per_engine: int, repetitions: int) -> float:
+    # Returns the average seconds a filtering takes, the results are made again for every filtering as the filtering merges them
+    seconds: float = 0.0
+    for i in range(repetitions):
+        results: list = make_results(num_results_per_engine, i)
+        started_at: float = time.perf_counter()
+        filter_results(results)
+        seconds = seconds + time.perf_counter() - started_at
+    return seconds / repetitions
+
+def main(repetitions: int):
+    for num_results_per_engine in NUMS_RESULTS_PER_ENGINE:
+        print(str(num_results_per_engine) + " results per engine (" + str(num_results_per_engine * len(ENGINES)) + " results)")
+        for name, filter_results in [("lists", filter_with_lists), ("result set", filter_with_result_set)]:
+            seconds: float = measure(filter_results, num_results_per_engine, repetitions)
+            print("    " + name.ljust(14) + "{:8.3f} ms".format(seconds * 1000))
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoMetasearch.settings')
+    django.setup()
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+import time
+import tracemalloc
+import django
+import xml.etree.ElementTree
+
+# Measures the time and the peak memory reading the XML response of Yandex takes,
+# with the streaming reader and with the previous reader building the whole tree
+# The responses are made of the docs of the sample response of the unit tests, repeated
+# Run from the directory of manage.py:
+#     python -m metasearch.benchmarks.yandex_parsers [number of repetitions]
+
+TEST_DATA_DIR = 'metasearch/tests/unit_test/view/api_modules/yandex/test_data/'
+SAMPLE_RESPONSE = 'sample_response_01.xml'
+# Numbers of the docs in the measured responses, Yandex returns up to 100 docs per page
+NUMS_DOCS = [10, 50, 100]
+
+def make_response(sample: bytes, num_docs: int) -> bytes:
+    # The sample response with its groups repeated until it holds num_docs docs
+    # The last group of the sample is left out, its doc has no passages and breaks the previous reader
+    groups: list = re.findall(rb'      <group>.*?</group>\n', sample, re.DOTALL)[:-1]
+    head: bytes = sample[:sample.index(groups[0])]
+    tail: bytes = sample[sample.rindex(b'</group>\n') + len(b'</group>\n'):]
+    return head + b''.join(groups[i % len(groups)] for i in range(num_docs)) + tail
+
+def read_with_element_tree(payload: bytes) -> list:
+    # The previous reader: decode and rewrite the whole response, build the whole tree, then read the docs
+    from metasearch.search_modules.yandex_search_module import create_ResultItem
+    tree_root = xml.etree.ElementTree.fromstring(payload.decode('utf-8').replace('&', '&amp;'))
+    results: list = []
+    doc_count: int = 1
+    for doc in tree_root.iter('doc'):
+        passage: str = ""
+        for passages in doc.iter('passages'):
+            passage = ''.join(passages.itertext())
+            break
+        title: str = ""
+        for title_part in doc.iter('title'):
+            title = ''.join(title_part.itertext())
+            break
+        url: str = ""
+        for url_part in doc.iter('url'):
+            url = url_part.text
+            break
+        results.append(create_ResultItem(title, url, None, passage, doc[8][1].text, doc_count))
+        doc_count = doc_count + 1
+    return results
+
+def read_with_stream(payload: bytes) -> list:
+    from metasearch.search_modules.yandex_search_module import read_result_items, iterate_chunks
+    return list(read_result_items(iterate_chunks(payload)))
+
+def measure(read, payload: bytes, repetitions: int) -> tuple:
+    # Returns the average seconds a read of the response takes and the peak bytes allocated during a read
+    started_at: float = time.perf_counter()
+    for i in range(repetitions):
+        read(payload)
+    seconds: float = (time.perf_counter() - started_at) / repetitions
+    tracemalloc.start()
+    read(payload)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (seconds, peak)
+
+def main(repetitions: int):
+    with open(TEST_DATA_DIR + SAMPLE_RESPONSE, mode='rb') as f:
+        sample: bytes = f.read()
+    for num_docs in NUMS_DOCS:
+        payload: bytes = make_response(sample, num_docs)
+        print(str(num_docs) + " docs (" + str(len(payload)) + " bytes)")
+        for name, read in [("element tree", read_with_element_tree), ("stream", read_with_stream)]:
+            seconds, peak = measure(read, payload, repetitions)
+            print("    " + name.ljust(14) + "{:8.2f} ms  {:8.1f} KiB peak".format(seconds * 1000, peak / 1024))
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoMetasearch.settings')
+    django.setup()
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import threading
+from django.conf import settings
+
+# Domains symbolizing the categories of the search result items, and the index classifying the items by their domains
+# The domains are kept in a versioned data file (metasearch/data/domain_categories.json), compiled into
+# a domain -> category index so that an item is classified by a single lookup.
+# The file is checked for changes while the server is running, and the workers switch to the new index
+# without a restart. The searches in flight keep using the index they started with.
+
+# Category symbols, CATEGORIES of metasearch.views
+ENCYCLOPEDIA = 1
+FAMOUS_NEWS_AGENCIES = 2
+ONLINE_NEWS_AGENCIES = 3
+PORTALS_AND_BLOGS = 6
+# name of the category in the data file -> category symbol
+CATEGORY_SYMBOLS = {
+    "Encyclopedia": ENCYCLOPEDIA,
+    "Famous News Agencies": FAMOUS_NEWS_AGENCIES,
+    "Online News Agencies": ONLINE_NEWS_AGENCIES,
+}
+
+DEFAULTPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "domain_categories.json")
+DEFAULTCHECKINTERVAL = 5.0
+
+class DomainCategories:
+    '''
+    Compiled, read-only contents of a version of the data file
+    An instance is never modified after it's built, so it can be shared by the threads without locking
+    '''
+    __slots__ = ("version", "category_domains", "domain_index", "removed_domains")
+
+    def __init__(self, version, category_domains: tuple, removed_domains: frozenset):
+        # Version written in the data file
+        self.version = version
+        # Pairs of the category symbol and the domains of the category, in the order the categories are checked
+        self.category_domains: tuple = category_domains
+        # domain -> category symbol of the domain
+        self.domain_index: dict = build_domain_index(category_domains)
+        # Domains of the items removed from the search results (e.g. movie contents)
+        self.removed_domains: frozenset = removed_domains
+
+    def classify(self, domain: str, default: int = PORTALS_AND_BLOGS) -> int:
+        # Category symbol of the domain, default if the domain isn't listed in any category
+        return self.domain_index.get(domain, default)
+
+    def get_domains(self, category: int) -> tuple:
+        # Domains listed in the category, in the order of the data file
+        for listed_category, domains in self.category_domains:
+            if listed_category == category:
+                return domains
+        return ()
+
+    def is_removed(self, domain: str) -> bool:
+        return domain in self.removed_domains
+
+def build_domain_index(category_domains: tuple) -> dict:
+    '''
+    Parameters
+    ----------
+    category_domains : tuple
+        pairs of the category symbol and the domains of the category, in the order the categories are checked
+        ex. ((1, ("wikipedia.org",)), (2, ("reuters.com", "apnews.com", ...)), ...)
+
+    Returns
+    ----------
+    domain_index : dict
+        domain -> category symbol of the domain
+        ex. {"wikipedia.org": 1, "reuters.com": 2, "apnews.com": 2, ...}
+    '''
+    domain_index: dict = {}
+    for category, domains in category_domains:
+        for domain in domains:
+            # Keep the category checked first
+            domain_index.setdefault(domain, category)
+    return domain_index
+
+def compile_domain_categories(data: dict) -> DomainCategories:
+    '''
+    Parameters
+    ----------
+    data : dict
+        Contents of the data file
+        ex.
+        {
+            "version": 1,
+            "categories": [
+                {"name": "Encyclopedia", "domains": ["wikipedia.org"]},
+                {"name": "Famous News Agencies", "domains": ["xinhuanet.com", "reuters.com", ...]},
+                ...
+            ],
+            "removed_domains": ["youtube.com"]
+        }
+
+    Returns
+    ----------
+    domain_categories : DomainCategories
+        The compiled contents, the domains listed twice are only kept at their first place
+        ValueError is raised if the contents are malformed
+    '''
+    if not isinstance(data, dict) or "version" not in data or not isinstance(data.get("categories"), list):
+        raise ValueError("the data file must have the version and the list of the categories")
+    category_domains: list = []
+    for category in data["categories"]:
+        if not isinstance(category, dict) or category.get("name") not in CATEGORY_SYMBOLS or not isinstance(category.get("domains"), list):
+            raise ValueError("unknown or malformed category: " + repr(category))
+        domains: list = []
+        for domain in category["domains"]:
+            if not isinstance(domain, str):
+                raise ValueError("domain must be a string: " + repr(domain))
+            domain = domain.strip().lower()
+            if domain not in domains:
+                domains.append(domain)
+        category_domains.append((CATEGORY_SYMBOLS[category["name"]], tuple(domains)))
+    removed_domains: frozenset = frozenset(domain.strip().lower() for domain in data.get("removed_domains", []))
+    return DomainCategories(data["version"], tuple(category_domains), removed_domains)
+
+def load_domain_categories(path: str) -> DomainCategories:
+    with open(path, mode='r', encoding='utf-8') as f:
+        return compile_domain_categories(json.load(f))
+
+class DomainCategoryRegistry:
+    '''
+    Holds the compiled contents of the data file and replaces them when the file changes
+    The file is checked at most once per check_interval seconds, by the first search after the interval.
+    The other searches never wait for the check: they keep using the current contents while it's running.
+    The new contents replace the current ones at once, and a file which can't be read or compiled
+    (e.g. caught in the middle of a write) is ignored until it changes again.
+    '''
+    def __init__(self, path: str, check_interval: float = DEFAULTCHECKINTERVAL):
+        # Path of the data file
+        self.path: str = path
+        # Seconds between the checks of the file, None for no check after the first load
+        self.check_interval: float = check_interval
+        # (mtime, size) of the file the current contents are read from
+        self.signature: tuple = self.get_signature()
+        self.current: DomainCategories = load_domain_categories(path)
+        self.next_check_at: float = time.monotonic() + (check_interval or 0.0)
+        self.reload_lock = threading.Lock()
+
+    def get_signature(self) -> tuple:
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> DomainCategories:
+        '''
+        Returns
+        ----------
+        domain_categories : DomainCategories
+            The contents of the latest version of the data file read so far
+            A search should keep the returned contents until it finishes, so that it sees a single version
+        '''
+        if self.check_interval is not None and time.monotonic() >= self.next_check_at:
+            # Only one thread checks the file, the others go on with the current contents
+            if self.reload_lock.acquire(blocking=False):
+                try:
+                    self.next_check_at = time.monotonic() + self.check_interval
+                    self.reload_if_changed()
+                finally:
+                    self.reload_lock.release()
+        return self.current
+
+    def reload_if_changed(self) -> bool:
+        # Returns True if the contents are replaced by the ones of the changed file
+        try:
+            signature: tuple = self.get_signature()
+            if signature == self.signature:
+                return False
+            domain_categories: DomainCategories = load_domain_categories(self.path)
+        except (OSError, ValueError) as e:
+            print("[ERROR LOG] In DomainCategoryRegistry.reload_if_changed, the data file is not reloaded: " + repr(e))
+            return False
+        # Replace the reference at once, the searches holding the previous contents are not affected
+        self.current = domain_categories
+        self.signature = signature
+        return True
+
+# Registry shared by all requests handled by this process
+domain_category_registry: DomainCategoryRegistry = None
+domain_category_registry_lock = threading.Lock()
+
+def get_domain_category_registry() -> DomainCategoryRegistry:
+    '''
+    Returns
+    ----------
+    domain_category_registry : DomainCategoryRegistry
+        The registry configured by settings.METASEARCH_DOMAIN_CATEGORIES_PATH and
+        METASEARCH_DOMAIN_CATEGORIES_CHECK_INTERVAL
+    '''
+    global domain_category_registry
+    with domain_category_registry_lock:
+        if domain_category_registry is None:
+            domain_category_registry = DomainCategoryRegistry(
+                getattr(settings, "METASEARCH_DOMAIN_CATEGORIES_PATH", DEFAULTPATH),
+                getattr(settings, "METASEARCH_DOMAIN_CATEGORIES_CHECK_INTERVAL", DEFAULTCHECKINTERVAL)
+            )
+    return domain_category_registry
+
+def get_domain_categories() -> DomainCategories:
+    # The current contents of the data file
+    return get_domain_category_registry().get()
+
+def classify_domain(domain: str, default: int = PORTALS_AND_BLOGS) -> int:
+    # Category symbol of the domain in the current contents of the data file
+    return get_domain_categories().classify(domain, default)
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from metasearch.search_modules.response_cache import get_response_cache
+
+class Command(BaseCommand):
+    help = "Remove the expired raw responses of the search engines from the response cache directory"
+
+    def handle(self, *args, **options):
+        removed: int = get_response_cache().purge_expired()
+        self.stdout.write("Removed " + str(removed) + " expired entries from " + get_response_cache().directory)
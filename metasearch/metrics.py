@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import tempfile
+import atexit
+import threading
+from django.conf import settings
+from metasearch.timing import Histogram, DEFAULTBUCKETS, get_timing_registry
+from metasearch.result_cache import get_result_cache
+from metasearch.single_flight import get_single_flight
+from metasearch.search_modules.response_cache import get_response_cache
+from metasearch.search_modules.quota_ledger import get_quota_ledger
+
+# The snapshots of the stopped workers are folded by one worker at a time under a file lock, only available on POSIX
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Metrics of the search requests exposed at /metasearch/metrics in the Prometheus text format
+# Every worker process counts in its own MetricsRegistry, and writes a snapshot of its metrics into a file
+# of METASEARCH_METRICS_DIR after its searches, at most once per METASEARCH_METRICS_WRITE_INTERVAL seconds.
+# The endpoint sums the snapshots of all the workers, so any worker answering the scrape reports the whole server.
+# The counters and the histograms of the stopped workers are folded into a single file when the metrics are scraped,
+# so that the counters never go back and the directory doesn't grow with every worker started; their gauges are left out.
+# A worker writes the increments left after its last search a while later, and its last snapshot when it exits.
+
+# Upper bounds of the buckets of the histograms of the numbers of the search results
+SIZEBUCKETS = (0, 5, 10, 20, 50, 100, 200, 400, 800)
+DEFAULTWRITEINTERVAL = 1.0
+# Snapshot of the counters and the histograms of the stopped workers, and the lock of the folding
+RETIREDFILENAME = "retired.json"
+COMPACTLOCKFILENAME = "compact.lock"
+
+# name of the metric -> (type, help text)
+METRICS = {
+    "metasearch_engine_requests_total": ("counter", "Number of the calls of the search engines."),
+    "metasearch_engine_failures_total": ("counter", "Number of the calls of the search engines which raised an exception, by the type of the exception."),
+    "metasearch_engine_dropped_total": ("counter", "Number of the searches continued without a search engine, because it failed, didn't answer in time or ran out of its quota."),
+    "metasearch_engine_results_total": ("counter", "Number of the search results returned by the search engines."),
+    "metasearch_engine_duration_seconds": ("histogram", "Duration of the calls of the search engines."),
+    "metasearch_stage_duration_seconds": ("histogram", "Duration of the stages of the search requests."),
+    "metasearch_result_set_size": ("histogram", "Number of the search results of a search, when they are collected, without the duplication and selected."),
+    "metasearch_result_cache_hits_total": ("counter", "Number of the searches answered by the cache of the selected results."),
+    "metasearch_result_cache_misses_total": ("counter", "Number of the searches not found in the cache of the selected results."),
+    "metasearch_result_cache_evictions_total": ("counter", "Number of the entries evicted from the cache of the selected results to keep its size."),
+    "metasearch_result_cache_entries": ("gauge", "Number of the entries in the cache of the selected results."),
+    "metasearch_result_cache_bytes": ("gauge", "Estimated size in bytes of the cache of the selected results."),
+    "metasearch_response_cache_hits_total": ("counter", "Number of the raw responses of the search engines read from the response cache."),
+    "metasearch_response_cache_misses_total": ("counter", "Number of the raw responses of the search engines not found in the response cache."),
+    "metasearch_single_flight_leaders_total": ("counter", "Number of the searches made for a query."),
+    "metasearch_single_flight_followers_total": ("counter", "Number of the searches which waited for the identical search in flight."),
+    "metasearch_quota_used": ("gauge", "Number of the queries of the daily quota of a search engine used today."),
+    "metasearch_quota_limit": ("gauge", "Daily quota of the queries of a search engine."),
+}
+
+class MetricsRegistry:
+    '''
+    Counters and histograms of a worker process, identified by the name of the metric and its labels
+    The labels are a tuple of the pairs (name of the label, value), ex. (("engine", "Google"),)
+    '''
+    def __init__(self):
+        # (name, labels) -> value
+        self.counters: dict = {}
+        # (name, labels) -> Histogram
+        self.histograms: dict = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, labels: tuple = (), amount: float = 1):
+        key: tuple = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: tuple = (), bounds: tuple = DEFAULTBUCKETS):
+        key: tuple = (name, labels)
+        histogram: Histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(bounds))
+        histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        '''
+        Returns
+        ----------
+        snapshot : dict
+            The counters and the histograms in a form written to the snapshot files (JSON)
+            ex.
+            {
+                "counters": [["metasearch_engine_requests_total", [["engine", "Google"]], 12], ...],
+                "histograms": [["metasearch_engine_duration_seconds", [["engine", "Google"]], {"bounds": [...], "counts": [...], "count": 12, "sum": 3.2}], ...]
+            }
+        '''
+        with self.lock:
+            counters: list = list(self.counters.items())
+            histograms: list = list(self.histograms.items())
+        return {
+            "counters": [[name, [list(label) for label in labels], value] for (name, labels), value in counters],
+            "histograms": [[name, [list(label) for label in labels], histogram.snapshot()] for (name, labels), histogram in histograms],
+        }
+
+class MetricsStore:
+    '''
+    Directory of the snapshot files of the metrics of the worker processes, one file per process
+    A file is replaced at once (written into a temporary file and renamed), so it's never read half-written.
+    '''
+    def __init__(self, directory: str, write_interval: float = DEFAULTWRITEINTERVAL):
+        self.directory: str = directory
+        self.write_interval: float = write_interval
+        # The file of this process, its name changes when the process is forked
+        self.pid: int = None
+        self.path: str = None
+        self.next_write_at: float = 0.0
+        # Whether a write of the increments made before the interval passed is scheduled
+        self.write_pending: bool = False
+        self.lock = threading.Lock()
+
+    def get_path(self) -> str:
+        pid: int = os.getpid()
+        if pid != self.pid:
+            self.pid = pid
+            self.path = os.path.join(self.directory, "worker-" + str(pid) + "-" + str(int(time.time() * 1000)) + ".json")
+        return self.path
+
+    def write(self, snapshot: dict):
+        try:
+            with self.lock:
+                path: str = self.get_path()
+                os.makedirs(self.directory, exist_ok=True)
+                self.write_file(os.path.basename(path), snapshot)
+        except OSError as e:
+            print("[ERROR LOG] In MetricsStore.write, failed to write the snapshot of the metrics: " + repr(e))
+
+    def write_if_due(self, make_snapshot):
+        # Write the snapshot made by make_snapshot() if the last one is older than the interval,
+        # otherwise write it once the interval has passed, so that the last increments of an idle worker are written too
+        now: float = time.monotonic()
+        with self.lock:
+            if now < self.next_write_at:
+                if not self.write_pending:
+                    self.write_pending = True
+                    timer = threading.Timer(self.next_write_at - now, self.write_pending_snapshot, (make_snapshot,))
+                    timer.daemon = True
+                    timer.start()
+                return
+            self.next_write_at = now + self.write_interval
+        self.write(make_snapshot())
+
+    def write_pending_snapshot(self, make_snapshot):
+        with self.lock:
+            self.write_pending = False
+            self.next_write_at = time.monotonic() + self.write_interval
+        self.write(make_snapshot())
+
+    def read_file(self, file_name: str) -> dict:
+        # The snapshot of the file, None if it can't be read
+        try:
+            with open(os.path.join(self.directory, file_name), mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print("[ERROR LOG] In MetricsStore, failed to read " + file_name + ": " + repr(e))
+            return None
+
+    def read_all(self) -> list:
+        # Snapshots of all the worker processes, the files which can't be read are skipped
+        snapshots: list = []
+        if not os.path.isdir(self.directory):
+            return snapshots
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(".json"):
+                continue
+            snapshot: dict = self.read_file(file_name)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def compact(self) -> int:
+        '''
+        Folds the counters and the histograms of the snapshots of the stopped workers into the file RETIREDFILENAME,
+        and removes their files. Skipped while another worker is folding them, and without fcntl
+
+        Returns
+        ----------
+        folded : int
+            The number of the files of the stopped workers folded
+        '''
+        if fcntl is None or not os.path.isdir(self.directory):
+            return 0
+        try:
+            lock_file = open(os.path.join(self.directory, COMPACTLOCKFILENAME), mode='a')
+        except OSError as e:
+            print("[ERROR LOG] In MetricsStore.compact, failed to open the lock file: " + repr(e))
+            return 0
+        with lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            # file name -> snapshot of the workers which are not running anymore
+            stopped_snapshots: dict = {}
+            for file_name in sorted(os.listdir(self.directory)):
+                if not file_name.startswith("worker-") or not file_name.endswith(".json"):
+                    continue
+                snapshot: dict = self.read_file(file_name)
+                if snapshot is not None and not is_process_alive(snapshot.get("pid", os.getpid())):
+                    stopped_snapshots[file_name] = snapshot
+            if len(stopped_snapshots) == 0:
+                return 0
+            retired_snapshots: list = []
+            if os.path.exists(os.path.join(self.directory, RETIREDFILENAME)):
+                retired_snapshot: dict = self.read_file(RETIREDFILENAME)
+                if retired_snapshot is None:
+                    # Never overwrite the counters which can't be read
+                    return 0
+                retired_snapshots.append(retired_snapshot)
+            counters, gauges, histograms = merge_snapshots(retired_snapshots + list(stopped_snapshots.values()))
+            self.write_file(RETIREDFILENAME, {
+                "counters": [[name, [list(label) for label in labels], value] for (name, labels), value in counters.items()],
+                "histograms": [[name, [list(label) for label in labels], histogram] for (name, labels), histogram in histograms.items()],
+            })
+            for file_name in stopped_snapshots:
+                os.remove(os.path.join(self.directory, file_name))
+            return len(stopped_snapshots)
+
+    def write_file(self, file_name: str, snapshot: dict):
+        # Replace the file at once, so that it's never read half-written
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, mode='w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temporary_path, os.path.join(self.directory, file_name))
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+def is_process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+def record_engine_call(engine_name: str, seconds: float, results: list = None, exception: Exception = None):
+    # Count a call of a search engine which returned the results or raised the exception
+    metrics_registry: MetricsRegistry = get_metrics_registry()
+    labels: tuple = (("engine", engine_name),)
+    metrics_registry.increment("metasearch_engine_requests_total", labels)
+    metrics_registry.observe("metasearch_engine_duration_seconds", seconds, labels)
+    if exception is not None:
+        metrics_registry.increment("metasearch_engine_failures_total", labels + (("exception", type(exception).__name__),))
+    else:
+        metrics_registry.increment("metasearch_engine_results_total", labels, len(results))
+
+def record_dropped_engine(engine_name: str, reason: str):
+    # Count a search continued without the search engine, reason is "timeout", "failure" or "quota"
+    get_metrics_registry().increment("metasearch_engine_dropped_total", (("engine", engine_name), ("reason", reason)))
+
+def record_result_set_size(stage: str, size: int):
+    # Count the number of the search results of a search at the stage, "collected", "deduplicated" or "selected"
+    get_metrics_registry().observe("metasearch_result_set_size", size, (("stage", stage),), SIZEBUCKETS)
+
+def make_worker_snapshot() -> dict:
+    '''
+    Returns
+    ----------
+    snapshot : dict
+        The metrics of this process: the metrics registry, the histograms of the durations of the stages,
+        and the counters of the caches and of the single flight, with the pid of the process
+    '''
+    snapshot: dict = get_metrics_registry().snapshot()
+    for name, histogram in get_timing_registry().snapshot().items():
+        snapshot["histograms"].append(["metasearch_stage_duration_seconds", [["stage", name]], histogram])
+
+    result_cache_stats: dict = get_result_cache().get_stats()
+    response_cache_stats: dict = get_response_cache().get_stats()
+    single_flight_stats: dict = get_single_flight().get_stats()
+    snapshot["counters"].extend([
+        ["metasearch_result_cache_hits_total", [], result_cache_stats["hits"]],
+        ["metasearch_result_cache_misses_total", [], result_cache_stats["misses"]],
+        ["metasearch_result_cache_evictions_total", [], result_cache_stats["evictions"]],
+        ["metasearch_response_cache_hits_total", [], response_cache_stats["hits"]],
+        ["metasearch_response_cache_misses_total", [], response_cache_stats["misses"]],
+        ["metasearch_single_flight_leaders_total", [], single_flight_stats["leaders"]],
+        ["metasearch_single_flight_followers_total", [], single_flight_stats["followers"]],
+    ])
+    snapshot["gauges"] = [
+        ["metasearch_result_cache_entries", [], result_cache_stats["entries"]],
+        ["metasearch_result_cache_bytes", [], result_cache_stats["bytes"]],
+    ]
+    snapshot["pid"] = os.getpid()
+    return snapshot
+
+def merge_snapshots(snapshots: list) -> tuple:
+    '''
+    Parameters
+    ----------
+    snapshots : list
+        snapshots of the worker processes as make_worker_snapshot returns
+
+    Returns
+    ----------
+    merged : tuple
+        (counters, gauges, histograms) summed over the workers, dicts keyed by (name, labels)
+        The histograms are dicts of the bounds, the counts of the buckets, the count and the sum
+        The gauges of the workers which are not running anymore are left out
+    '''
+    counters: dict = {}
+    gauges: dict = {}
+    histograms: dict = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", []):
+            key: tuple = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        if is_process_alive(snapshot.get("pid", os.getpid())):
+            for name, labels, value in snapshot.get("gauges", []):
+                key = (name, tuple(tuple(label) for label in labels))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, histogram in snapshot.get("histograms", []):
+            key = (name, tuple(tuple(label) for label in labels))
+            merged_histogram: dict = histograms.get(key)
+            if merged_histogram is None:
+                histograms[key] = {"bounds": list(histogram["bounds"]), "counts": list(histogram["counts"]), "count": histogram["count"], "sum": histogram["sum"]}
+            elif list(merged_histogram["bounds"]) == list(histogram["bounds"]):
+                merged_histogram["counts"] = [a + b for a, b in zip(merged_histogram["counts"], histogram["counts"])]
+                merged_histogram["count"] = merged_histogram["count"] + histogram["count"]
+                merged_histogram["sum"] = merged_histogram["sum"] + histogram["sum"]
+    return (counters, gauges, histograms)
+
+def format_labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(
+        name + '="' + str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"' for name, value in labels
+    ) + "}"
+
+def format_value(value: float) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+def render_metrics(counters: dict, gauges: dict, histograms: dict) -> str:
+    '''
+    Returns
+    ----------
+    text : str
+        The metrics in the Prometheus text format (version 0.0.4)
+        ex.
+            # HELP metasearch_engine_requests_total Number of the calls of the search engines.
+            # TYPE metasearch_engine_requests_total counter
+            metasearch_engine_requests_total{engine="Google"} 12
+            ...
+    '''
+    # name of the metric -> lines of its samples
+    samples: dict = {}
+    for (name, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+        samples.setdefault(name, []).append(name + format_labels(labels) + " " + format_value(value))
+    for (name, labels), histogram in sorted(histograms.items(), key=lambda entry: entry[0]):
+        lines: list = samples.setdefault(name, [])
+        cumulative_count: int = 0
+        for bound, count in zip(list(histogram["bounds"]) + ["+Inf"], histogram["counts"]):
+            cumulative_count = cumulative_count + count
+            lines.append(name + "_bucket" + format_labels(labels + (("le", str(bound)),)) + " " + str(cumulative_count))
+        lines.append(name + "_sum" + format_labels(labels) + " " + repr(float(histogram["sum"])))
+        lines.append(name + "_count" + format_labels(labels) + " " + str(histogram["count"]))
+
+    text_lines: list = []
+    for name in sorted(samples.keys()):
+        metric_type, help_text = METRICS.get(name, ("untyped", ""))
+        text_lines.append("# HELP " + name + " " + help_text)
+        text_lines.append("# TYPE " + name + " " + metric_type)
+        text_lines.extend(samples[name])
+    return "\n".join(text_lines) + "\n"
+
+def get_quota_gauges() -> dict:
+    # The quota is kept in the database shared by the workers, so it's read once instead of summed over the workers
+    gauges: dict = {}
+    try:
+        for engine, stats in get_quota_ledger().get_stats().items():
+            gauges[("metasearch_quota_used", (("engine", engine),))] = stats["used"]
+            gauges[("metasearch_quota_limit", (("engine", engine),))] = stats["limit"]
+    except Exception as e:
+        print("[ERROR LOG] In get_quota_gauges, failed to read the quota ledger: " + repr(e))
+    return gauges
+
+def collect_metrics() -> str:
+    '''
+    Returns
+    ----------
+    text : str
+        The metrics of all the worker processes in the Prometheus text format
+        Only the metrics of this process if settings.METASEARCH_METRICS_DIR is None
+    '''
+    snapshot: dict = make_worker_snapshot()
+    metrics_store: MetricsStore = get_metrics_store()
+    if metrics_store is None:
+        snapshots: list = [snapshot]
+    else:
+        # Write the latest snapshot of this process first, fold the snapshots of the stopped workers, then read all of them
+        metrics_store.write(snapshot)
+        try:
+            metrics_store.compact()
+        except OSError as e:
+            print("[ERROR LOG] In collect_metrics, failed to fold the snapshots of the stopped workers: " + repr(e))
+        snapshots = metrics_store.read_all()
+    counters, gauges, histograms = merge_snapshots(snapshots)
+    gauges.update(get_quota_gauges())
+    return render_metrics(counters, gauges, histograms)
+
+def publish_metrics():
+    # Write the snapshot of the metrics of this process for the other workers, if the last one is old enough
+    metrics_store: MetricsStore = get_metrics_store()
+    if metrics_store is not None:
+        metrics_store.write_if_due(make_worker_snapshot)
+
+def flush_metrics():
+    # Write the last snapshot of this process when it exits, the increments since the last write would be lost otherwise
+    if not is_metrics_enabled():
+        return
+    metrics_store: MetricsStore = get_metrics_store()
+    if metrics_store is not None:
+        metrics_store.write(make_worker_snapshot())
+
+def is_metrics_enabled() -> bool:
+    # The endpoint has no authentication, so it's exposed only when enabled explicitly
+    return getattr(settings, "METASEARCH_METRICS_ENABLED", False)
+
+# Registry and store shared by all requests handled by this process
+metrics_registry: MetricsRegistry = None
+metrics_registry_lock = threading.Lock()
+metrics_store: MetricsStore = None
+metrics_store_lock = threading.Lock()
+
+def get_metrics_registry() -> MetricsRegistry:
+    global metrics_registry
+    with metrics_registry_lock:
+        if metrics_registry is None:
+            metrics_registry = MetricsRegistry()
+    return metrics_registry
+
+def get_metrics_store() -> MetricsStore:
+    '''
+    Returns
+    ----------
+    metrics_store : MetricsStore
+        The store configured by settings.METASEARCH_METRICS_DIR and METASEARCH_METRICS_WRITE_INTERVAL,
+        or None if the metrics are not shared by the workers
+    '''
+    global metrics_store
+    directory: str = getattr(settings, "METASEARCH_METRICS_DIR", None)
+    if directory is None:
+        return None
+    with metrics_store_lock:
+        if metrics_store is None or metrics_store.directory != directory:
+            if metrics_store is None:
+                atexit.register(flush_metrics)
+            metrics_store = MetricsStore(directory, getattr(settings, "METASEARCH_METRICS_WRITE_INTERVAL", DEFAULTWRITEINTERVAL))
+    return metrics_store
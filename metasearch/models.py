@@ -1,21 +1,162 @@
 import re
+import enum
 from django.db import models
 from tld import get_tld
 
+# Format of the URL accepted by ResultItem
+URL_PATTERN = re.compile(r"https?://[\w!?/+\-_~:;.,*&@#$%=()'[\]]+")
+# URL referencing a html file with '/' at the end
+HTML_URL_WITH_SLASH_PATTERN = re.compile(r"https?://[\w!?/+\-_~:;.,*&@#$%=()'[\]]+.html/")
+
+def get_domain_of(url: str) -> str:
+    '''
+    Parameters
+    ----------
+    url : str
+        URL of a page
+        ex. "https://www.example.co.jp/index.html"
+
+    Returns
+    ----------
+    domain : str
+        The registrable domain of the URL, or None if the URL has no known top level domain
+        ex. "example.co.jp"
+    '''
+    t_domain = get_tld(url, as_object=True, fail_silently=True)
+    if t_domain is None:
+        return None
+    return str(t_domain.domain) + '.' + str(t_domain)
+
+# Query parameters which only track the visitors and don't change the page
+TRACKINGPARAMETERS = frozenset([
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_hsenc", "_hsmi"
+])
+# Prefix of the query parameters of Google Analytics campaigns (utm_source, utm_medium, ...)
+TRACKINGPARAMETERPREFIX = "utm_"
+DEFAULTPORTS = {"http": "80", "https": "443"}
+# scheme, host, port, path and query of a URL, the fragment is left out
+URL_PARTS_PATTERN = re.compile(r"(https?)://([^/?#:]*)(?::([0-9]+))?([^?#]*)(?:\?([^#]*))?", re.IGNORECASE)
+
+def canonicalize_url(url: str) -> str:
+    '''
+    Parameters
+    ----------
+    url : str
+        URL of a page
+        ex. "https://www.example.com/news/?utm_source=feed&id=3#top"
+
+    Returns
+    ----------
+    canonical_url : str
+        The form of the URL shared by its variants which point to the same page:
+        without the scheme (http and https), "www.", the default port, the trailing "/", the fragment
+        and the tracking parameters, with the host in lower case and the rest of the parameters sorted
+        ex. "example.com/news?id=3"
+    '''
+    match = URL_PARTS_PATTERN.match(url)
+    if match is None:
+        return url
+    scheme, host, port, path, query = match.groups()
+    host = host.lower()
+    if host.startswith("www."):
+        host = host[len("www."):]
+    if port is not None and port != DEFAULTPORTS[scheme.lower()]:
+        host = host + ":" + port
+    path = path.rstrip("/")
+    if not query:
+        return host + path
+    parameters: list = [
+        parameter for parameter in query.split("&")
+        if parameter and not is_tracking_parameter(parameter.split("=", 1)[0].lower())
+    ]
+    if len(parameters) == 0:
+        return host + path
+    parameters.sort()
+    return host + path + "?" + "&".join(parameters)
+
+def is_tracking_parameter(name: str) -> bool:
+    return name in TRACKINGPARAMETERS or name.startswith(TRACKINGPARAMETERPREFIX)
+
+def normalize_title(title: str) -> str:
+    '''
+    Parameters
+    ----------
+    title : str
+        title of a page
+        ex. "  Hello  World "
+
+    Returns
+    ----------
+    normalized_title : str
+        The title in lower case with the runs of white spaces made a single space, "" for an empty title
+        ex. "hello world"
+    '''
+    return " ".join(title.split()).lower()
+
+class SearchEngine(enum.IntFlag):
+    # Bit of every search engine in the bitmask of the source search engines of ResultItem
+    GOOGLE = 1
+    YAHOO = 2
+    BING = 4
+    YANDEX = 8
+    DUCKDUCKGO = 16
+
+# Name of the search engine -> its bit, and the pairs of them in the order the names are listed
+ENGINEBITS = {
+    "Google": int(SearchEngine.GOOGLE),
+    "Yahoo!": int(SearchEngine.YAHOO),
+    "Bing": int(SearchEngine.BING),
+    "Yandex": int(SearchEngine.YANDEX),
+    "DuckDuckGo": int(SearchEngine.DUCKDUCKGO),
+}
+ENGINENAMES = tuple(ENGINEBITS.items())
+
+def get_engine_names(engine_mask: int) -> list:
+    # Names of the search engines of the bitmask, in the order of ResultItem.SEARCHENGINES
+    return [name for name, bit in ENGINENAMES if engine_mask & bit]
+
+def count_engines(items: list) -> dict:
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem
+        ex. [ResultItem1, ResultItem2, ...]
+
+    Returns
+    ----------
+    counts : dict
+        name of the search engine -> number of the items retrieved from it
+        ex. {"Google": 10, "Yahoo!": 8, "Bing": 0, "Yandex": 3, "DuckDuckGo": 10}
+    '''
+    # Count the items by their bitmask first, there are only a few different bitmasks
+    items_by_mask: dict = {}
+    for item in items:
+        engine_mask: int = item.get_engine_mask()
+        items_by_mask[engine_mask] = items_by_mask.get(engine_mask, 0) + 1
+    counts: dict = {}
+    for name, bit in ENGINENAMES:
+        counts[name] = sum(count for engine_mask, count in items_by_mask.items() if engine_mask & bit)
+    return counts
+
 class ResultItem:
+    # The attributes are fixed so that the items don't carry a __dict__ each
+    __slots__ = ("title", "url", "domain", "engine", "highest_rank", "lowest_rank", "abstract")
     HIGHESTRANK = 1
     LOWESTRANK = 100
     DEFAULTRANK = LOWESTRANK
-    SEARCHENGINES = ["Google", "Yahoo!", "Bing", "Yandex", "DuckDuckGo"]
+    SEARCHENGINES = list(ENGINEBITS)
 
     def __init__(self, title: str, url: str, engine: str, rank: int=DEFAULTRANK):
         # The title of the page
         self.set_title(title)
         # The URL of this item
         self.url: str = ""
+        # The registrable domain of the URL, computed when the URL is set
+        self.domain: str = None
         self.set_url(url)
-        # The list of source search engine this item is retrieved from
-        self.engine: list = []
+        # The bitmask of the source search engines this item is retrieved from, see SearchEngine
+        self.engine: int = 0
         self.set_engine(engine)
         # The place this search result item is displayed on the search result page
         self.highest_rank: int = ResultItem.DEFAULTRANK
@@ -30,28 +171,30 @@ class ResultItem:
 
     def set_url(self, url: str) -> bool:
         # if(re.fullmatch(r'https?://(([a-zA-Z0-9])+(\.))+([a-zA-Z]{2,})+/?', url) == None):
-        if(re.fullmatch(r"https?://[\w!?/+\-_~:;.,*&@#$%=()'[\]]+", url) == None):
+        if(URL_PATTERN.fullmatch(url) == None):
             # When the format of the URL is wrong
             print("The format of the given URL if wrong: ", url)
             return False
         else:
             # When the given URL matches the correct format of the URL
             # Cut '/' at the end of URL if the URL is referencing a html file
-            if(re.fullmatch(r"https?://[\w!?/+\-_~:;.,*&@#$%=()'[\]]+.html/", url) == None):
+            if(HTML_URL_WITH_SLASH_PATTERN.fullmatch(url) == None):
                 self.url = url
             else:
                 self.url = url.strip('/')
+            self.domain = get_domain_of(self.url)
             return True
     
     def get_url(self) -> str:
         return self.url
 
     def set_engine(self, engine: str) -> bool:
-        if(engine in ResultItem.SEARCHENGINES):
+        bit: int = ENGINEBITS.get(engine)
+        if(bit != None):
             # When the list of search engines contains the given name of search engine brand
-            if(engine not in self.engine):
+            if(not self.engine & bit):
                 # When the given name of search engine is not yet registered as the source search engine of this item
-                self.engine.append(engine)
+                self.engine = self.engine | bit
                 return True
             else:
                 # When the given name of search engine is already in the list of its source search engine
@@ -62,9 +205,17 @@ class ResultItem:
             print("Undefined search engine detected: ", engine)
             return False
 
-    def get_engine(self):
+    def get_engine(self) -> list:
+        # Names of the source search engines, in the order of SEARCHENGINES
+        # (not in the order the engines found the item, the bitmask doesn't keep it), and so are they in __str__
+        return get_engine_names(self.engine)
+
+    def get_engine_mask(self) -> int:
         return self.engine
 
+    def set_engine_mask(self, engine_mask: int):
+        self.engine = engine_mask
+
     def set_rank(self, rank: int):
         try:
             # Validate if the given rank is in the expected range
@@ -93,15 +244,19 @@ class ResultItem:
     def get_abstract(self):
         return self.abstract
 
+    def merge(self, item):
+        # Inherit the search engines and the highest and lowest rank of the given item pointing to the same page
+        self.engine = self.engine | item.get_engine_mask()
+        self.set_rank(item.get_highest_rank())
+        self.set_rank(item.get_lowest_rank())
+
     def get_domain(self):
-        # domain of its URL
-        t_domain = get_tld(self.url, as_object=True)
-        domain = str(t_domain.domain) + '.' + str(t_domain)
-        return domain
+        # domain of its URL, None if the URL has no known top level domain
+        return self.domain
     
     def __str__(self):
         engine_str = ""
-        for engine in self.engine:
+        for engine in self.get_engine():
             engine_str = engine_str + ", " + engine
         return (
             "[Title] " + self.title 
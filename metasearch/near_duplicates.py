@@ -0,0 +1,204 @@
+import re
+import zlib
+import random
+from django.conf import settings
+
+# Detection of the near-duplicate search results, e.g. the copies of an article syndicated on several sites
+# Every item is summarized by a MinHash signature of the word shingles of its normalized title and snippet.
+# The signature is computed by one-permutation hashing: every shingle is hashed once and falls into one of
+# NUMHASHES bins, each bin keeping its minimum, and the empty bins borrow the minimum of the next bin (densification).
+# The signatures are cut into bands and the items sharing a band are the candidates (locality-sensitive hashing),
+# so that only the similar items are compared with each other instead of all the pairs of the items.
+# A candidate pair is merged when the estimated Jaccard similarity of their shingles reaches the threshold.
+
+# Number of the bins of the MinHash signature, and the bands of the signature for LSH
+# With 8 bands of 4 bins, the pairs of the similarity above 0.6 become candidates in most cases
+NUMHASHES = 32
+NUMBANDS = 8
+ROWSPERBAND = NUMHASHES // NUMBANDS
+# Number of the consecutive words of a shingle
+SHINGLESIZE = 3
+DEFAULTTHRESHOLD = 0.8
+# Parameters of the hash function h(x) = (a * x + b) mod MERSENNEPRIME, fixed so that the signatures are stable
+MERSENNEPRIME = (1 << 61) - 1
+HASHSEED = 20201015
+
+def make_hash_parameters(seed: int) -> tuple:
+    generator = random.Random(seed)
+    return (generator.randrange(1, MERSENNEPRIME), generator.randrange(0, MERSENNEPRIME))
+
+HASHPARAMETERS = make_hash_parameters(HASHSEED)
+# Offset added per bin to the minimum borrowed by an empty bin, larger than any minimum of a bin
+DENSIFICATIONOFFSET = MERSENNEPRIME
+
+WORD = re.compile(r"\w+")
+# Name of the site appended to the title, e.g. "Article title - Reuters" or "Article title | Yahoo News"
+TITLE_SITE_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—]{1,40}$")
+
+def normalize_title(title: str) -> str:
+    # Remove the name of the site appended to the title, as long as the title itself remains
+    stripped: str = TITLE_SITE_SUFFIX.sub("", title)
+    return stripped if len(WORD.findall(stripped)) >= SHINGLESIZE else title
+
+def get_shingles(title: str, snippet: str) -> set:
+    '''
+    Parameters
+    ----------
+    title : str
+        title of the search result item
+        ex. "Putin, Macron call for ceasefire - Reuters"
+    snippet : str
+        snippet of the search result item
+        ex. "Russian President Vladimir Putin and French President ..."
+
+    Returns
+    ----------
+    shingles : set
+        The hashes of the sequences of SHINGLESIZE words of the normalized (lower case, without punctuation) texts
+    '''
+    words: list = WORD.findall((normalize_title(title) + " " + snippet).lower())
+    if len(words) < SHINGLESIZE:
+        return set(zlib.crc32(word.encode("utf-8")) for word in words)
+    return set(
+        zlib.crc32(" ".join(words[i:i + SHINGLESIZE]).encode("utf-8"))
+        for i in range(len(words) - SHINGLESIZE + 1)
+    )
+
+def get_signature(shingles: set) -> tuple:
+    '''
+    Parameters
+    ----------
+    shingles : set
+        hashes of the shingles of an item, not empty
+        ex. {3725092387, 118273645, ...}
+
+    Returns
+    ----------
+    signature : tuple
+        NUMHASHES minimums of the hashes of the shingles, one per bin
+        Two signatures agree on a bin with the probability of the Jaccard similarity of their shingles
+    '''
+    a, b = HASHPARAMETERS
+    bins: list = [None] * NUMHASHES
+    for shingle in shingles:
+        value: int = (a * shingle + b) % MERSENNEPRIME
+        index: int = value % NUMHASHES
+        value = value // NUMHASHES
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    # The empty bins borrow the minimum of the next non-empty bin, offset by the distance to it
+    signature: list = list(bins)
+    for index in range(NUMHASHES):
+        if bins[index] is not None:
+            continue
+        distance: int = 1
+        while bins[(index + distance) % NUMHASHES] is None:
+            distance = distance + 1
+        signature[index] = bins[(index + distance) % NUMHASHES] + distance * DENSIFICATIONOFFSET
+    return tuple(signature)
+
+def estimate_similarity(signature: tuple, another_signature: tuple) -> float:
+    # Estimated Jaccard similarity of the shingles: the ratio of the bins having the same minimum
+    same: int = 0
+    for value, another_value in zip(signature, another_signature):
+        if value == another_value:
+            same = same + 1
+    return same / NUMHASHES
+
+def get_text_of(item) -> tuple:
+    try:
+        snippet: str = item.get_abstract() or ""
+    except AttributeError:
+        # The abstract isn't set for the item
+        snippet = ""
+    return (item.get_title(), snippet)
+
+def find_near_duplicate_clusters(items: list, threshold: float = DEFAULTTHRESHOLD) -> list:
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem
+        ex. [ResultItem1, ResultItem2, ...]
+    threshold : float
+        minimum estimated Jaccard similarity of the shingles of two items to merge them
+        ex. 0.8
+
+    Returns
+    ----------
+    clusters : list
+        List of the lists of the indices of the near-duplicate items, in the order of the given list
+        Every item belongs to exactly one cluster
+        ex. [[0, 3], [1], [2, 4, 5], ...]
+    '''
+    signatures: list = []
+    for item in items:
+        shingles: set = get_shingles(*get_text_of(item))
+        # The items without any text are never merged
+        signatures.append(get_signature(shingles) if len(shingles) > 0 else None)
+
+    # Union-find over the indices of the items, the root of a cluster is the index of its first item
+    parents: list = list(range(len(items)))
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    # (band, hashes of the band) -> indices of the items having the same hashes in the band
+    buckets: dict = {}
+    # Pairs of the indices already compared, a pair may share several bands
+    compared: set = set()
+    for i, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for band in range(NUMBANDS):
+            key: tuple = (band, signature[band * ROWSPERBAND:(band + 1) * ROWSPERBAND])
+            bucket: list = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [i]
+                continue
+            for j in bucket:
+                root_i, root_j = find(i), find(j)
+                if root_i == root_j or (j, i) in compared:
+                    continue
+                compared.add((j, i))
+                if estimate_similarity(signatures[i], signatures[j]) >= threshold:
+                    parents[max(root_i, root_j)] = min(root_i, root_j)
+            bucket.append(i)
+
+    clusters: dict = {}
+    for i in range(len(items)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+def remove_near_duplicates(items: list, threshold: float = DEFAULTTHRESHOLD) -> list:
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem without the exact duplication
+        ex. [ResultItem1, ResultItem2, ...]
+    threshold : float
+        minimum estimated Jaccard similarity of the shingles of two items to merge them
+        ex. 0.8
+
+    Returns
+    ----------
+    unique_items : list
+        List of the first item of every cluster of the near-duplicate items, in the order of the given list
+        The first item inherits the search engines and the highest and lowest ranks of the rest of the cluster
+    '''
+    unique_items: list = []
+    for cluster in find_near_duplicate_clusters(items, threshold):
+        unique_item = items[cluster[0]]
+        for i in cluster[1:]:
+            unique_item.merge(items[i])
+        unique_items.append(unique_item)
+    return unique_items
+
+def remove_near_duplicates_if_enabled(items: list) -> list:
+    # The near-duplicate stage configured by settings.METASEARCH_NEAR_DUPLICATES_ENABLED and METASEARCH_NEAR_DUPLICATES_THRESHOLD
+    if not getattr(settings, "METASEARCH_NEAR_DUPLICATES_ENABLED", False):
+        return items
+    return remove_near_duplicates(items, getattr(settings, "METASEARCH_NEAR_DUPLICATES_THRESHOLD", DEFAULTTHRESHOLD))
@@ -0,0 +1,274 @@
+import os
+import sys
+import hmac
+import time
+import marshal
+import pstats
+import cProfile
+import tempfile
+import threading
+import contextlib
+import contextvars
+from django.conf import settings
+from django.http import HttpResponse
+
+# Profiling of a single search request on demand, without restarting the server
+# A search request is profiled when the profiling is enabled by settings.METASEARCH_PROFILING_ENABLED, it carries
+# the token of settings.METASEARCH_PROFILING_TOKEN in the X-Metasearch-Profile-Token header, and asks for a profiler:
+# ex. curl -H "X-Metasearch-Profile-Token: ..." "http://localhost:8000/metasearch/search/?query=hello&profile=sampling"
+# The token is never read from the URL, which is written to the access logs.
+#
+# profile=cprofile
+#     Every function call of the request thread and of the search engine calls on the thread pool is measured by cProfile.
+#     The profile is a pstats file: python -m pstats search-....pstats
+# profile=sampling
+#     The stacks of the same threads are sampled every settings.METASEARCH_PROFILING_SAMPLE_INTERVAL seconds.
+#     The overhead is lower, and the time spent waiting for the network shows in the stacks.
+#     The profile is a collapsed-stack file (one "frame;frame;... count" line per stack) for flamegraph.pl or speedscope.
+#
+# With profile_output=save, the profile is written to settings.METASEARCH_PROFILES_DIR and its file name is sent back
+# in the X-Metasearch-Profile header of the search results, otherwise the profile is downloaded instead of the results.
+# The cache of the selected results is skipped for the profiled request, so that the whole search is profiled.
+
+CPROFILE = "cprofile"
+SAMPLING = "sampling"
+PROFILERS = (CPROFILE, SAMPLING)
+DOWNLOAD = "download"
+SAVE = "save"
+TOKENHEADER = "X-Metasearch-Profile-Token"
+DEFAULTSAMPLEINTERVAL = 0.005
+
+class SamplingProfiler:
+    '''
+    Counts the stacks of the registered threads, sampled by a background thread
+    ex. {"MainThread;search (views.py:847);metasearch (views.py:72);...": 12, ...}
+    '''
+    def __init__(self, interval: float = DEFAULTSAMPLEINTERVAL):
+        self.interval: float = interval
+        # ident of the thread -> number of the blocks of the thread being profiled
+        self.thread_idents: dict = {}
+        # collapsed stack -> number of the samples
+        self.stacks: dict = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="metasearch-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def add_thread(self, ident: int):
+        with self.lock:
+            self.thread_idents[ident] = self.thread_idents.get(ident, 0) + 1
+
+    def remove_thread(self, ident: int):
+        with self.lock:
+            if self.thread_idents.get(ident, 0) <= 1:
+                self.thread_idents.pop(ident, None)
+            else:
+                self.thread_idents[ident] = self.thread_idents[ident] - 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frames: dict = sys._current_frames()
+        thread_names: dict = {thread.ident: thread.name for thread in threading.enumerate()}
+        with self.lock:
+            thread_idents: list = list(self.thread_idents)
+        for ident in thread_idents:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            # The frames from the innermost one, the root of the stack is the name of the thread
+            stack: list = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(getattr(code, "co_qualname", code.co_name) + " (" + os.path.basename(code.co_filename) + ":" + str(code.co_firstlineno) + ")")
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, str(ident)))
+            collapsed_stack: str = ";".join(reversed(stack))
+            with self.lock:
+                self.stacks[collapsed_stack] = self.stacks.get(collapsed_stack, 0) + 1
+
+    def get_collapsed_stacks(self) -> str:
+        with self.lock:
+            stacks: list = sorted(self.stacks.items())
+        return "".join(stack + " " + str(count) + "\n" for stack, count in stacks)
+
+class RequestProfile:
+    '''
+    Profile of a search request, the block of a with statement is profiled:
+    ex.
+        with RequestProfile("sampling", "download") as request_profile:
+            results = metasearch(query, use_cache=False)
+        return request_profile.get_response(response)
+    The search engine calls run on the threads of the pool, they are profiled in the block of profile_thread
+    '''
+    def __init__(self, profiler: str, output: str = DOWNLOAD):
+        self.profiler: str = profiler
+        self.output: str = output
+        # cProfile.Profile of every finished block of a thread
+        self.profiles: list = []
+        self.sampler: SamplingProfiler = None
+        if profiler == SAMPLING:
+            self.sampler = SamplingProfiler(getattr(settings, "METASEARCH_PROFILING_SAMPLE_INTERVAL", DEFAULTSAMPLEINTERVAL))
+        self.lock = threading.Lock()
+        # Block of the request thread, and the token to restore the profile of the context
+        self.request_thread = None
+        self.token = None
+
+    def __enter__(self):
+        self.token = current_request_profile.set(self)
+        if self.sampler is not None:
+            self.sampler.start()
+        self.request_thread = self.in_thread()
+        self.request_thread.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.request_thread.__exit__(exc_type, exc_value, traceback)
+        if self.sampler is not None:
+            self.sampler.stop()
+        current_request_profile.reset(self.token)
+        return False
+
+    @contextlib.contextmanager
+    def in_thread(self):
+        # Profile the current thread in the block
+        if self.sampler is not None:
+            ident: int = threading.get_ident()
+            self.sampler.add_thread(ident)
+            try:
+                yield
+            finally:
+                self.sampler.remove_thread(ident)
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Since Python 3.12 only one cProfile is enabled at once, and the one of the request sees all the threads
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            # The calls still running when the request is answered (e.g. the search engines timed out) are left out
+            with self.lock:
+                self.profiles.append(profile)
+
+    def get_file_name(self) -> str:
+        # ex. "search-20201015-123456-4242.pstats"
+        extension: str = ".pstats" if self.profiler == CPROFILE else ".collapsed"
+        return "search-" + time.strftime("%Y%m%d-%H%M%S") + "-" + str(os.getpid()) + extension
+
+    def get_content(self) -> bytes:
+        '''
+        Returns
+        ----------
+        content : bytes
+            The profile of the request: the marshalled statistics as pstats.Stats.dump_stats writes them for cProfile,
+            the collapsed stacks for the sampling profiler
+        '''
+        if self.sampler is not None:
+            return self.sampler.get_collapsed_stacks().encode("utf-8")
+        with self.lock:
+            profiles: list = list(self.profiles)
+        # The statistics of all the threads are summed, the profile of the request thread is always among them
+        stats = pstats.Stats(*profiles)
+        return marshal.dumps(stats.stats)
+
+    def get_response(self, response: HttpResponse) -> HttpResponse:
+        '''
+        Parameters
+        ----------
+        response : HttpResponse
+            response of the profiled search request
+
+        Returns
+        ----------
+        response : HttpResponse
+            The profile as a file to download, or the given response with the name of the file saved in
+            settings.METASEARCH_PROFILES_DIR in the X-Metasearch-Profile header
+        '''
+        file_name: str = self.get_file_name()
+        content: bytes = self.get_content()
+        if self.output == SAVE:
+            save_profile(file_name, content)
+            response["X-Metasearch-Profile"] = file_name
+            return response
+        profile_response = HttpResponse(
+            content, content_type="application/octet-stream" if self.profiler == CPROFILE else "text/plain; charset=utf-8"
+        )
+        profile_response["Content-Disposition"] = 'attachment; filename="' + file_name + '"'
+        return profile_response
+
+def save_profile(file_name: str, content: bytes):
+    # Write the profile into settings.METASEARCH_PROFILES_DIR at once, so that it's never read half-written
+    directory: str = getattr(settings, "METASEARCH_PROFILES_DIR", None)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, mode='wb') as f:
+            f.write(content)
+        os.replace(temporary_path, os.path.join(directory, file_name))
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+def is_profiling_allowed(request) -> bool:
+    # The profiling is enabled and the request carries the token
+    if not getattr(settings, "METASEARCH_PROFILING_ENABLED", False):
+        return False
+    token: str = getattr(settings, "METASEARCH_PROFILING_TOKEN", None)
+    if not token:
+        print("[ERROR LOG] In is_profiling_allowed, the profiling is enabled but settings.METASEARCH_PROFILING_TOKEN is not set.")
+        return False
+    return hmac.compare_digest(request.headers.get(TOKENHEADER, "").encode("utf-8"), token.encode("utf-8"))
+
+def get_requested_profile(request) -> RequestProfile:
+    '''
+    Parameters
+    ----------
+    request : HttpRequest
+        search request, profiled if its "profile" parameter is "cprofile" or "sampling"
+        and its "profile_output" parameter is "download" (default) or "save"
+
+    Returns
+    ----------
+    request_profile : RequestProfile
+        The profile to run the request under, None if the request isn't profiled
+        A request asking for a profile without the permission is served as usual
+    '''
+    profiler: str = request.GET.get('profile')
+    if profiler is None:
+        return None
+    if profiler not in PROFILERS:
+        print("[ERROR LOG] In get_requested_profile, unknown profiler: " + profiler)
+        return None
+    if not is_profiling_allowed(request):
+        print("[ERROR LOG] In get_requested_profile, a profile was asked without the permission.")
+        return None
+    output: str = SAVE if request.GET.get('profile_output') == SAVE else DOWNLOAD
+    return RequestProfile(profiler, output)
+
+def profile_thread(request_profile: RequestProfile):
+    # Context manager profiling the current thread for the request, nothing if the request isn't profiled
+    if request_profile is None:
+        return contextlib.nullcontext()
+    return request_profile.in_thread()
+
+# Profile of the request served in the current thread or task, passed to the thread pool as the timings are
+current_request_profile: contextvars.ContextVar = contextvars.ContextVar("current_request_profile", default=None)
+
+def get_request_profile() -> RequestProfile:
+    return current_request_profile.get()
@@ -0,0 +1,177 @@
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+class ResultCache:
+    '''
+    In-process LRU cache of the selected search results with a TTL, keyed on the normalized query
+    The size of the cache is bounded by the estimated number of bytes of the cached results
+    '''
+    DEFAULTTTL = 300
+    DEFAULTPARTIALTTL = 30
+    DEFAULTMAXBYTES = 16 * 1024 * 1024
+
+    def __init__(self, ttl: float = DEFAULTTTL, max_bytes: int = DEFAULTMAXBYTES, enabled: bool = True, partial_ttl: float = DEFAULTPARTIALTTL):
+        # Seconds a cached result stays valid
+        self.ttl: float = ttl
+        # Seconds the results without some search engines stay valid, so that the engines are asked again soon
+        self.partial_ttl: float = partial_ttl
+        # Maximum number of (estimated) bytes of the cached results
+        self.max_bytes: int = max_bytes
+        # When disabled, nothing is stored and every lookup is a miss
+        self.enabled: bool = enabled
+        # normalized query -> (expiration time, estimated size, results, names of the dropped search engines),
+        # ordered from the least recently used
+        self.entries: OrderedDict = OrderedDict()
+        self.current_bytes: int = 0
+        self.lock = threading.Lock()
+        # Counters
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Ignore the differences of cases and spaces between the queries
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    def get(self, query: str, dropped_engines: list = None) -> list:
+        '''
+        Parameters
+        ----------
+        query : str
+            search query string
+            ex. "hello world"
+        dropped_engines : list
+            if a list is given, the names of the search engines whose results were not included in the cached results are appended to it
+            ex. ["Yandex"]
+
+        Returns
+        ----------
+        results : list
+            copy of the list of ResultItem cached for the query, or None if it's not cached or already expired
+        '''
+        if not self.enabled:
+            return None
+        key: str = ResultCache.normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses = self.misses + 1
+                return None
+            expires_at, size, results, engines_not_included = entry
+            if expires_at <= time.monotonic():
+                # Expired: remove it and handle it as a miss
+                self.remove_entry(key)
+                self.expirations = self.expirations + 1
+                self.misses = self.misses + 1
+                return None
+            # Mark it as the most recently used
+            self.entries.move_to_end(key)
+            self.hits = self.hits + 1
+            if dropped_engines is not None:
+                dropped_engines.extend(engines_not_included)
+            return list(results)
+
+    def put(self, query: str, results: list, ttl: float = None, dropped_engines: list = None):
+        '''
+        Parameters
+        ----------
+        query : str
+            search query string
+            ex. "hello world"
+        results : list
+            list of ResultItem to cache for the query
+            It's not cached if it's larger than the whole byte budget
+        ttl : float
+            seconds the results stay valid, self.ttl if None
+            ex. 30
+        dropped_engines : list
+            names of the search engines whose results are not included, returned with the results by get
+            ex. ["Yandex"]
+        '''
+        if not self.enabled:
+            return
+        key: str = ResultCache.normalize_query(query)
+        size: int = estimate_size_of(key, results)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove_entry(key)
+            self.entries[key] = (
+                time.monotonic() + (self.ttl if ttl is None else ttl), size, list(results), list(dropped_engines or [])
+            )
+            self.current_bytes = self.current_bytes + size
+            # Evict the least recently used entries until it fits in the byte budget
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self.remove_entry(oldest_key)
+                self.evictions = self.evictions + 1
+
+    def remove_entry(self, key: str):
+        # The lock must be held by the caller
+        expires_at, size, results, engines_not_included = self.entries.pop(key)
+        self.current_bytes = self.current_bytes - size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+# Attributes of ResultItem counted in the estimation of the size of a cache entry
+RESULT_ITEM_ATTRIBUTES = ("title", "url", "engine", "abstract", "highest_rank", "lowest_rank")
+
+# Estimate the number of bytes used by a cache entry
+def estimate_size_of(key: str, results: list) -> int:
+    size: int = sys.getsizeof(key) + sys.getsizeof(results)
+    for item in results:
+        size = size + sys.getsizeof(item)
+        for attribute in RESULT_ITEM_ATTRIBUTES:
+            value = getattr(item, attribute, None)
+            size = size + sys.getsizeof(value)
+            if isinstance(value, list):
+                for element in value:
+                    size = size + sys.getsizeof(element)
+    return size
+
+# Cache shared by all requests handled by this process
+result_cache: ResultCache = None
+result_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    '''
+    Returns
+    ----------
+    result_cache : ResultCache
+        The cache shared in the process, configured by
+        settings.METASEARCH_RESULT_CACHE_ENABLED, METASEARCH_RESULT_CACHE_TTL, METASEARCH_RESULT_CACHE_PARTIAL_TTL
+        and METASEARCH_RESULT_CACHE_MAX_BYTES
+    '''
+    global result_cache
+    with result_cache_lock:
+        if result_cache is None:
+            result_cache = ResultCache(
+                ttl=getattr(settings, "METASEARCH_RESULT_CACHE_TTL", ResultCache.DEFAULTTTL),
+                max_bytes=getattr(settings, "METASEARCH_RESULT_CACHE_MAX_BYTES", ResultCache.DEFAULTMAXBYTES),
+                enabled=getattr(settings, "METASEARCH_RESULT_CACHE_ENABLED", True),
+                partial_ttl=getattr(settings, "METASEARCH_RESULT_CACHE_PARTIAL_TTL", ResultCache.DEFAULTPARTIALTTL)
+            )
+    return result_cache
@@ -0,0 +1,232 @@
+import numpy as np
+from metasearch.models import ResultItem, ENGINENAMES, canonicalize_url, normalize_title
+from metasearch import domain_categories
+
+# Columnar form of the search result items for the filtering of the search results
+# Every attribute the filtering looks at is held in a NumPy array with one entry per item: the domain as an index
+# in the domains of the set, the engines as a bitmask and the highest and lowest ranks, and the category is read
+# from the category of every domain. The removal of the duplication, the classification, the grouping and the
+# selection of the highest and lowest-ranked items are done on the arrays instead of calling the getters of the items.
+# The ResultItem objects are only kept to be returned to the template once the items are selected.
+
+class ResultSet:
+    '''
+    Search result items held as columns, an instance is never modified: the filtering steps return new sets
+    The sets made from the same set share its domains and the categories of the domains.
+    '''
+    __slots__ = (
+        "items", "domains", "domain_category_codes", "domain_removed",
+        "duplicate_codes", "domain_codes", "engine_masks", "highest_ranks", "lowest_ranks"
+    )
+
+    def __init__(self, items, domains: list, domain_category_codes, domain_removed, duplicate_codes, domain_codes, engine_masks, highest_ranks, lowest_ranks):
+        # ResultItem objects, numpy array of objects
+        self.items = items
+        # Domains of the items, and the category symbol of every domain and whether its items are removed
+        self.domains: list = domains
+        self.domain_category_codes = domain_category_codes
+        self.domain_removed = domain_removed
+        # Index of the first item pointing to the same page as every item (its canonical URL or its normalized title)
+        self.duplicate_codes = duplicate_codes
+        # Index in self.domains of the domain of every item
+        self.domain_codes = domain_codes
+        # Bitmask of the search engines of every item, see SearchEngine of metasearch.models
+        self.engine_masks = engine_masks
+        self.highest_ranks = highest_ranks
+        self.lowest_ranks = lowest_ranks
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def take(self, indices):
+        # The set of the items at the given indices, in the given order
+        return ResultSet(
+            self.items[indices], self.domains, self.domain_category_codes, self.domain_removed,
+            self.duplicate_codes[indices], self.domain_codes[indices], self.engine_masks[indices], self.highest_ranks[indices], self.lowest_ranks[indices]
+        )
+
+    def get_category_codes(self):
+        # Category symbol (CATEGORIES of metasearch.views) of every item, found by its domain
+        return self.domain_category_codes[self.domain_codes]
+
+    def to_items(self) -> list:
+        '''
+        Returns
+        ----------
+        items : list
+            List of the ResultItem of the set, in the order of the set
+            The search engines and the ranks inherited from the removed duplication are written to the items
+        '''
+        items: list = self.items.tolist()
+        for item, engine_mask, highest_rank, lowest_rank in zip(items, self.engine_masks.tolist(), self.highest_ranks.tolist(), self.lowest_ranks.tolist()):
+            if engine_mask != item.get_engine_mask():
+                item.set_engine_mask(engine_mask)
+            if highest_rank != item.get_highest_rank():
+                item.set_rank(highest_rank)
+            if lowest_rank != item.get_lowest_rank():
+                item.set_rank(lowest_rank)
+        return items
+
+    def count_engines(self) -> dict:
+        # name of the search engine -> number of the items of the set retrieved from it, as count_engines of metasearch.models
+        counts: dict = {}
+        for name, bit in ENGINENAMES:
+            counts[name] = int(np.count_nonzero(self.engine_masks & bit))
+        return counts
+
+    def remove_duplicates(self):
+        '''
+        Returns
+        ----------
+        result_set : ResultSet
+            The set without the items pointing to the same page as an item before them, same as
+            remove_result_item_duplication of metasearch.views: the items having the same canonical URL or the same
+            normalized title are merged into the first one, which inherits their search engines and their highest and lowest ranks
+        '''
+        # The first item of every page, and the index of the kept item of every item
+        duplicate_codes, first_indices, inverse = np.unique(self.duplicate_codes, return_index=True, return_inverse=True)
+        if len(duplicate_codes) == len(self):
+            return self
+        # Keep the first items in the order of the given set
+        order = np.argsort(first_indices)
+        first_indices = first_indices[order]
+        inverse = np.argsort(order)[inverse]
+        result_set = self.take(first_indices)
+        result_set.highest_ranks = np.full(len(duplicate_codes), ResultItem.LOWESTRANK, dtype=self.highest_ranks.dtype)
+        np.minimum.at(result_set.highest_ranks, inverse, self.highest_ranks)
+        result_set.lowest_ranks = np.full(len(duplicate_codes), ResultItem.HIGHESTRANK, dtype=self.lowest_ranks.dtype)
+        np.maximum.at(result_set.lowest_ranks, inverse, self.lowest_ranks)
+        result_set.engine_masks = np.zeros(len(duplicate_codes), dtype=self.engine_masks.dtype)
+        np.bitwise_or.at(result_set.engine_masks, inverse, self.engine_masks)
+        return result_set
+
+    def remove_movie_contents(self):
+        # The set without the items of the domains removed from the search results
+        return self.take(np.flatnonzero(~self.domain_removed[self.domain_codes]))
+
+    def select_for_general_computers(self, generator=None, category_codes=None):
+        '''
+        Parameters
+        ----------
+        generator : numpy.random.Generator
+            generator of the random numbers breaking the ties, a new one if None
+        category_codes : numpy.ndarray
+            category symbol of every item as get_category_codes returns, found by the domains if None
+
+        Returns
+        ----------
+        result_set : ResultSet
+            The items selected as selection_for_general_computers of metasearch.views does, listed by the category:
+            one of the items of Encyclopedia, then for every other category, the highest and lowest-ranked items
+            of the highest and lowest-ranked items of every domain (all the items of a group of 2 items or less)
+        '''
+        if generator is None:
+            generator = np.random.default_rng()
+        if category_codes is None:
+            category_codes = self.get_category_codes()
+        selected_indices: list = []
+
+        # Pick only 1 item randomly from Encyclopedia
+        encyclopedia_indices = np.flatnonzero(category_codes == domain_categories.ENCYCLOPEDIA)
+        if len(encyclopedia_indices) > 0:
+            selected_indices.append(encyclopedia_indices[[generator.integers(len(encyclopedia_indices))]])
+
+        # Pick the highest and lowest-ranked items of every domain of every category
+        indices = np.flatnonzero(category_codes != domain_categories.ENCYCLOPEDIA)
+        group_keys = category_codes[indices].astype(np.int64) * len(self.domains) + self.domain_codes[indices]
+        indices = indices[self.pick_extremes(indices, np.unique(group_keys, return_inverse=True)[1], generator)]
+        # Then the highest and lowest-ranked items of every category among them
+        indices = indices[self.pick_extremes(indices, np.unique(category_codes[indices], return_inverse=True)[1], generator)]
+        selected_indices.append(indices[np.argsort(category_codes[indices], kind="stable")])
+
+        return self.take(np.concatenate(selected_indices))
+
+    def pick_extremes(self, indices, groups, generator):
+        '''
+        Parameters
+        ----------
+        indices : numpy.ndarray
+            indices of the items in the set
+        groups : numpy.ndarray
+            number of the group of every item of indices, from 0 to the number of the groups - 1
+        generator : numpy.random.Generator
+            generator of the random numbers breaking the ties
+
+        Returns
+        ----------
+        picked : numpy.ndarray
+            Mask of the items of indices picked: all the items of a group of 2 items or less, otherwise the item having
+            the highest rank and the item having the lowest rank among the rest of the group
+            Every item having the same rank is picked with the same probability
+        '''
+        if len(indices) == 0:
+            return np.zeros(0, dtype=bool)
+        # Random numbers ordering the items having the same rank
+        random_keys = generator.random(len(indices))
+        # Sort the items by the group, then from the highest rank, and take the first item of every group
+        order = np.lexsort((random_keys, self.highest_ranks[indices], groups))
+        sorted_groups = groups[order]
+        firsts = np.empty(len(order), dtype=bool)
+        firsts[0] = True
+        firsts[1:] = sorted_groups[1:] != sorted_groups[:-1]
+        is_highest = np.zeros(len(indices), dtype=bool)
+        is_highest[order[firsts]] = True
+        # Sort the items by the group, then the items except the highest one from the lowest rank
+        # The groups are in the same places, so the first item of every group is at the same positions
+        order = np.lexsort((random_keys, -self.lowest_ranks[indices].astype(np.int32), is_highest, groups))
+        is_lowest = np.zeros(len(indices), dtype=bool)
+        is_lowest[order[firsts]] = True
+        return (np.bincount(groups)[groups] <= 2) | is_highest | is_lowest
+
+def build_result_set(items: list, categories: domain_categories.DomainCategories = None) -> ResultSet:
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem
+        ex. [ResultItem1, ResultItem2, ...]
+    categories : DomainCategories
+        Domains of the categories, the current contents of the data file if None
+
+    Returns
+    ----------
+    result_set : ResultSet
+        The columns of the items, in the order of the given list
+    '''
+    if categories is None:
+        categories = domain_categories.get_domain_categories()
+    # canonical URL and normalized title -> index of the first item having it, as remove_result_item_duplication
+    # of metasearch.views finds the duplication, and domain -> index of the domain
+    # The domains are classified once however many items they have
+    url_indices: dict = {}
+    title_indices: dict = {}
+    domain_indices: dict = {}
+    duplicate_codes: list = []
+    for index, item in enumerate(items):
+        canonical_url: str = canonicalize_url(item.get_url())
+        title: str = normalize_title(item.get_title())
+        first_index: int = url_indices.get(canonical_url)
+        if first_index is None and title:
+            first_index = title_indices.get(title)
+        if first_index is None:
+            first_index = index
+        duplicate_codes.append(first_index)
+        url_indices.setdefault(canonical_url, first_index)
+        if title:
+            title_indices.setdefault(title, first_index)
+    domain_codes: list = [domain_indices.setdefault(item.get_domain(), len(domain_indices)) for item in items]
+    domains: list = list(domain_indices)
+
+    item_array = np.empty(len(items), dtype=object)
+    item_array[:] = items
+    return ResultSet(
+        item_array,
+        domains,
+        np.array([categories.classify(domain) for domain in domains], dtype=np.int8),
+        np.array([categories.is_removed(domain) for domain in domains], dtype=bool),
+        np.array(duplicate_codes, dtype=np.int32),
+        np.array(domain_codes, dtype=np.int32),
+        np.array([item.get_engine_mask() for item in items], dtype=np.uint8),
+        np.array([item.get_highest_rank() for item in items], dtype=np.int16),
+        np.array([item.get_lowest_rank() for item in items], dtype=np.int16)
+    )
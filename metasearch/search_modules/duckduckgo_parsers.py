@@ -0,0 +1,230 @@
+from html.parser import HTMLParser
+
+# lxml is optional, the "lxml" parser falls back to the "tokenizer" parser without it
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Classes of the div elements of the search result items, any of them marks a result item
+# (the same set as pick_result_item_parts in duckduckgo_search_module)
+RESULTCLASSES = frozenset(["result", "result_links", "result_links_deep", "web-result"])
+TITLEHEADINGCLASS = "result__title"
+TITLECLASS = "result__a"
+URLCLASS = "result__url"
+SNIPPETCLASS = "result__snippet"
+# Number of the characters of the page fed to the parsers at once, they stop reading when enough results are picked
+CHUNKSIZE = 8192
+
+# Fast parsers of the DuckDuckGo result page, alternatives to building the whole BeautifulSoup tree
+# Every parser returns the list of the contents of the result items as tuples of (title, url, snippet),
+# picked the same way as pick_title_from, pick_url_from and pick_snippet_from:
+#     title : text of the first a.result__a in the first h2.result__title of the item
+#     url : href of the first a.result__url of the item
+#     snippet : text of the first element of class result__snippet in the item
+# The items lacking any of them are skipped.
+# Given max_results, the parsers stop reading the page as soon as that number of the items are picked.
+
+class ResultItemTokenizer(HTMLParser):
+    '''
+    Reads the result page as a stream of tags and texts, and only keeps the texts and attributes of the result items
+    No tree of the page is built
+    As find_all of BeautifulSoup does, a result item nested in another one is picked on its own too,
+    and the items are listed in the order of their start tags
+    '''
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Contents of the completed result items
+        self.contents: list = []
+        # Result items being read, the innermost one last
+        self.items: list = []
+        # Result items not added to the contents yet, in the order of their start tags
+        # (an item completed inside another one waits for the outer one)
+        self.pending: list = []
+
+    def handle_starttag(self, tag: str, attrs: list):
+        classes: list = []
+        for name, value in attrs:
+            if name == "class" and value is not None:
+                classes = value.split()
+        # The tag is a descendant of all the result items being read
+        for item in self.items:
+            self.read_starttag(item, tag, attrs, classes)
+        if tag == "div" and not RESULTCLASSES.isdisjoint(classes):
+            item: dict = {
+                "title": None, "url": None, "snippet": None,
+                # True after the first a.result__url of the item is read, even if it has no href
+                "url_picked": False,
+                # Number of the div elements open in the item, including the item itself
+                "depth": 1,
+                # True while the first h2.result__title of the item is open, and None after it's closed
+                "in_title_heading": False,
+                # Elements whose texts are being collected, as lists of [field, tag, depth of the tag, texts]
+                "captures": [],
+                # True after the item is closed
+                "finished": False
+            }
+            self.items.append(item)
+            self.pending.append(item)
+
+    def read_starttag(self, item: dict, tag: str, attrs: list, classes: list):
+        if tag == "div":
+            item["depth"] = item["depth"] + 1
+        for capture in item["captures"]:
+            if capture[1] == tag:
+                capture[2] = capture[2] + 1
+        if tag == "h2" and item["in_title_heading"] is False and TITLEHEADINGCLASS in classes:
+            item["in_title_heading"] = True
+        elif tag == "a" and item["in_title_heading"] is True and TITLECLASS in classes and item["title"] is None:
+            self.start_capture(item, "title", tag)
+        if tag == "a" and URLCLASS in classes and not item["url_picked"]:
+            item["url"] = dict(attrs).get("href")
+            item["url_picked"] = True
+        if SNIPPETCLASS in classes and item["snippet"] is None:
+            self.start_capture(item, "snippet", tag)
+
+    def handle_startendtag(self, tag: str, attrs: list):
+        # Self-closing tags (e.g. <img ... />) contain no texts, only their attributes are read
+        if tag != "div":
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def start_capture(self, item: dict, field: str, tag: str):
+        # The empty text marks the field as picked even if the element contains no text
+        item[field] = ""
+        item["captures"].append([field, tag, 1, []])
+
+    def handle_data(self, data: str):
+        for item in self.items:
+            for capture in item["captures"]:
+                capture[3].append(data)
+
+    def handle_comment(self, data: str):
+        # Comments are not part of the texts
+        pass
+
+    def handle_endtag(self, tag: str):
+        for item in list(self.items):
+            self.read_endtag(item, tag)
+
+    def read_endtag(self, item: dict, tag: str):
+        for capture in list(item["captures"]):
+            if capture[1] == tag:
+                capture[2] = capture[2] - 1
+                if capture[2] == 0:
+                    item[capture[0]] = "".join(capture[3])
+                    item["captures"].remove(capture)
+        if tag == "h2" and item["in_title_heading"] is True:
+            # Only the first h2.result__title of the item is looked into
+            item["in_title_heading"] = None
+        if tag == "div":
+            item["depth"] = item["depth"] - 1
+            if item["depth"] == 0:
+                self.finish_item(item)
+
+    def finish_item(self, item: dict):
+        for capture in item["captures"]:
+            item[capture[0]] = "".join(capture[3])
+        item["finished"] = True
+        self.items.remove(item)
+        # Add the completed items to the contents in the order of their start tags
+        while len(self.pending) > 0 and self.pending[0]["finished"]:
+            completed: dict = self.pending.pop(0)
+            if completed["title"] is not None and completed["url"] is not None and completed["snippet"] is not None:
+                self.contents.append((completed["title"], completed["url"], completed["snippet"]))
+
+    def close(self):
+        super().close()
+        # The result items left open at the end of a truncated page end there, as BeautifulSoup closes them
+        while len(self.items) > 0:
+            self.finish_item(self.items[-1])
+
+def parse_with_tokenizer(page: str, max_results: int = None) -> list:
+    '''
+    Parameters
+    ----------
+    page : str
+        DuckDuckGo result HTML page
+        ex. "<!DOCTYPE html PUBLIC "-//W3C...</body></html>"
+    max_results : int
+        maximum number of the result items to pick, all of them if None
+        ex. 10
+
+    Returns
+    ----------
+    contents : list
+        The list of the contents of the result items
+        ex. [("Nagorno-Karabakh conflict - Wikipedia", "https://en.wikipedia.org/wiki/Nagorno-Karabakh_conflict", "The Nagorno-Karabakh conflict is ..."), ...]
+    '''
+    tokenizer = ResultItemTokenizer()
+    for start in range(0, len(page), CHUNKSIZE):
+        tokenizer.feed(page[start:start + CHUNKSIZE])
+        if max_results is not None and len(tokenizer.contents) >= max_results:
+            return tokenizer.contents[:max_results]
+    tokenizer.close()
+    return tokenizer.contents[:max_results]
+
+def get_classes_of(element) -> list:
+    return (element.get("class") or "").split()
+
+def find_first_descendant(element, tag: str, class_name: str):
+    # The first element (of the tag if given) having the class among the descendants, in the document order
+    for descendant in element.iterdescendants(tag):
+        if class_name in get_classes_of(descendant):
+            return descendant
+    return None
+
+def parse_with_lxml(page: str, max_results: int = None) -> list:
+    '''
+    Same as parse_with_tokenizer, but builds the tree of the page with lxml (libxml2)
+    The tree is built incrementally and every result item is picked as soon as its div element is closed
+    Falls back to parse_with_tokenizer if lxml isn't installed
+    '''
+    if lxml is None:
+        return parse_with_tokenizer(page, max_results)
+    parser = lxml.etree.HTMLPullParser(events=("start", "end"), tag="div")
+    # Build the elements of lxml.html, which have text_content()
+    parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+    contents: list = []
+    # Result items not added to the contents yet as [element, contents or None, True if it's closed], in the order of their start tags
+    # (a result item nested in another one is closed first, but is listed after it as find_all of BeautifulSoup does)
+    pending: list = []
+    for start in range(0, len(page), CHUNKSIZE):
+        parser.feed(page[start:start + CHUNKSIZE])
+        read_result_items(parser, pending, contents)
+        if max_results is not None and len(contents) >= max_results:
+            return contents[:max_results]
+    # The result items left open at the end of a truncated page are closed here
+    parser.close()
+    read_result_items(parser, pending, contents)
+    return contents[:max_results]
+
+def read_result_items(parser, pending: list, contents: list):
+    # Pick the contents of the result items closed in the events read by the parser,
+    # and append the ones completed before all the items started earlier to the list
+    for event, element in parser.read_events():
+        if RESULTCLASSES.isdisjoint(get_classes_of(element)):
+            continue
+        if event == "start":
+            pending.append([element, None, False])
+            continue
+        for entry in pending:
+            if entry[0] is element:
+                entry[1] = pick_contents_from(element)
+                entry[2] = True
+        while len(pending) > 0 and pending[0][2]:
+            element, item_contents, closed = pending.pop(0)
+            if item_contents is not None:
+                contents.append(item_contents)
+
+def pick_contents_from(item) -> tuple:
+    # Contents of the result item as (title, url, snippet), None if it's not complete
+    title_heading = find_first_descendant(item, "h2", TITLEHEADINGCLASS)
+    title_part = find_first_descendant(title_heading, "a", TITLECLASS) if title_heading is not None else None
+    url_part = find_first_descendant(item, "a", URLCLASS)
+    snippet_part = find_first_descendant(item, None, SNIPPETCLASS)
+    if title_part is None or url_part is None or url_part.get("href") is None or snippet_part is None:
+        return None
+    return (title_part.text_content(), url_part.get("href"), snippet_part.text_content())
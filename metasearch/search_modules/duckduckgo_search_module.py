@@ -1,11 +1,16 @@
 import sys
 import json
-from urllib import request
-from urllib import parse
+import asyncio
+import aiohttp
 from bs4 import BeautifulSoup
+from django.conf import settings
 from metasearch.models import ResultItem
+from metasearch.search_modules import duckduckgo_parsers
+from metasearch.search_modules.response_cache import get_response_cache
+from metasearch.search_modules.rate_limiter import get_rate_limiter
+from metasearch.search_modules.http_transport import get_http_session
 
-def retrieve_result_page(query: str) -> str:
+def retrieve_result_page(query: str, timeout: float = None) -> str:
     '''
     Parameters
     ----------
@@ -13,6 +18,9 @@ def retrieve_result_page(query: str) -> str:
         search query string to be sent to DuckDuckGo
         can contain space character and no need to concatenate with '+'
         ex. "hello world"
+    timeout : float
+        timeout in seconds for the blocking operations of the request, no timeout if None
+        ex. 5.0
 
     Returns
     ----------
@@ -20,33 +28,62 @@ def retrieve_result_page(query: str) -> str:
         obtained HTML result page in string
         ex. "<!DOCTYPE html PUBLIC "-//W3C...</body></html>"
     '''
-    # Put the query into the form data (post parameter) and it should be encoded binary
-    # Look at "Data" section on the page https://docs.python.org/3.7/howto/urllib2.html
-    data = parse.urlencode({
+    # Put the query into the form data (post parameter)
+    data = {
         "q": query,
-    }).encode('ascii')
+    }
 
     # To access their result without using web browser just use html version of their page
     url = "https://html.duckduckgo.com/html/"
 
+    # Wait only if the requests to DuckDuckGo are thrown faster than the rate limit
+    get_rate_limiter("DuckDuckGo").acquire(timeout=timeout)
+
     # Method should be POST to retrieve their result page correctly
-    request_to_throw = request.Request(url, data, method="POST")
+    response = get_http_session().post(url, data=data, timeout=timeout)
+    response.raise_for_status()
+
+    return response.content.decode('utf-8')
 
-    # In case it fails to retrieve the result, return an empty string
-    result_page = ""
+async def retrieve_result_page_async(query: str, session: aiohttp.ClientSession, timeout: float = None) -> str:
+    '''
+    Asynchronous version of retrieve_result_page, the request is thrown through the given aiohttp session
 
-    with request.urlopen(request_to_throw) as response:
-        result_page = response.read().decode('utf-8')
+    Parameters
+    ----------
+    query : str
+        search query string to be sent to DuckDuckGo
+        ex. "hello world"
+    session : aiohttp.ClientSession
+        session used to throw the request
+    timeout : float
+        timeout in seconds for the whole request, no timeout if None
+        ex. 5.0
 
+    Returns
+    ----------
+    result_page : str
+        obtained HTML result page in string
+        ex. "<!DOCTYPE html PUBLIC "-//W3C...</body></html>"
+    '''
+    url = "https://html.duckduckgo.com/html/"
+    await get_rate_limiter("DuckDuckGo").acquire_async(timeout=timeout)
+    async with session.post(url, data={"q": query}, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        # An error page must fail the search instead of being cached as 0 results, as retrieve_result_page does
+        response.raise_for_status()
+        result_page = await response.text(encoding='utf-8')
     return result_page
 
-def push_into_ResultItems(page: str) -> list:
+def push_into_ResultItems(page: str, max_results: int = None) -> list:
     '''
     Parameters
     ----------
     page : str
         DuckDuckGo result HTML page which contains the information about the search results
         ex. "<!DOCTYPE html PUBLIC "-//W3C...</body></html>"
+    max_results : int
+        maximum number of the search results to return, the parser stops reading the page when it's reached
+        ex. 10
     
     Returns
     ----------
@@ -54,25 +91,51 @@ def push_into_ResultItems(page: str) -> list:
         The list of search results summarized in the ResultItem objects
         ex. [ResultItem1, ResultItem2, ResultItem3, ...]
     '''
+    # Pick the contents of the search results with the parser selected in the settings
+    contents: list = get_result_page_parser()(page, max_results)
+    results: list = []
+    rank_count: int = 1
+    for title, url, snippet in contents:
+        rank: int = rank_count
+        rank_count = rank_count + 1
+        result: ResultItem = ResultItem(title, url, "DuckDuckGo")
+        result.set_abstract(snippet)
+        result.set_rank(rank)
+        results.append(result)
+    return results
+
+def parse_with_beautifulsoup(page: str, max_results: int = None) -> list:
+    '''
+    Parser of the result page building the whole BeautifulSoup tree
+    Returns the list of the contents of the result items as tuples of (title, url, snippet)
+    '''
     # Retrieve the necessary results using BeautifulSoup
     soup: BeautifulSoup = BeautifulSoup(page, "html.parser")
     search_results: list = pick_result_item_parts(soup)
-    results: list = []
-    rank_count: int = 1
+    contents: list = []
     for item in search_results:
+        if max_results is not None and len(contents) >= max_results:
+            break
         try:
             title = pick_title_from(item)
             url: str = pick_url_from(item)
             snippet: str = pick_snippet_from(item)
-            rank: int = rank_count
-            rank_count = rank_count + 1
-            result: ResultItem = ResultItem(title, url, "DuckDuckGo")
-            result.set_abstract(snippet)
-            result.set_rank(rank)
-            results.append(result)
-        except AttributeError:
+            contents.append((title, url, snippet))
+        except (AttributeError, TypeError, KeyError, IndexError):
+            # Skip the item lacking the title, the URL or the snippet
             continue
-    return results
+    return contents
+
+# Parsers of the result page selectable by settings.METASEARCH_DUCKDUCKGO_PARSER, all of them pick the same contents
+RESULT_PAGE_PARSERS: dict = {
+    "beautifulsoup": parse_with_beautifulsoup,
+    "tokenizer": duckduckgo_parsers.parse_with_tokenizer,
+    "lxml": duckduckgo_parsers.parse_with_lxml,
+}
+
+def get_result_page_parser():
+    # The parser function selected in the settings, the tokenizer if it's not set
+    return RESULT_PAGE_PARSERS[getattr(settings, "METASEARCH_DUCKDUCKGO_PARSER", "tokenizer")]
 
 def pick_snippet_from(item: BeautifulSoup) -> str:
     '''
@@ -302,14 +365,25 @@ def pick_result_item_parts(page: BeautifulSoup) -> list:
     result_item_parts: list = page.find_all("div", attrs={"result", "result_links", "result_links_deep", "web-result"})
     return result_item_parts
 
-def duckduckgoSearch(query: str):
-    # Get the DuckDuckGo search result page for the query
-    page: str = retrieve_result_page(query)
+def duckduckgoSearch(query: str, timeout: float = None, max_results: int = None):
+    # Get the DuckDuckGo search result page for the query, or the page cached a while ago
+    payload, encoding = get_response_cache().fetch(
+        "DuckDuckGo", query, {}, lambda: (retrieve_result_page(query, timeout).encode('utf-8'), 'utf-8')
+    )
+    page: str = payload.decode(encoding)
     # Prepare a list for returning the search results
-    results: list = push_into_ResultItems(page)
+    results: list = push_into_ResultItems(page, max_results)
     # Return the result list
     return results
 
+async def duckduckgoSearchAsync(query: str, session: aiohttp.ClientSession, timeout: float = None, max_results: int = None):
+    # Get the DuckDuckGo search result page for the query through the given session, or the page cached a while ago
+    async def retrieve() -> tuple:
+        return ((await retrieve_result_page_async(query, session, timeout)).encode('utf-8'), 'utf-8')
+    payload, encoding = await get_response_cache().fetch_async("DuckDuckGo", query, {}, retrieve)
+    # Parsing the page takes the CPU for a while, so it's done on the default executor not to block the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, push_into_ResultItems, payload.decode(encoding), max_results)
+
 # Main Function
 if __name__ == "__main__":
     # Prepare query variable
@@ -1,10 +1,19 @@
 import os
 import datetime
 import json
+import asyncio
+import aiohttp
+import functools
+import threading
 
-from time import sleep
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from googleapiclient.discovery import build, build_from_document
 from metasearch.models import ResultItem
+from metasearch.search_modules.response_cache import get_response_cache
+from metasearch.search_modules.rate_limiter import get_rate_limiter, get_time_left
+from metasearch.search_modules.http_transport import get_http_session
+from metasearch.search_modules.quota_ledger import get_quota_ledger
 from metasearch.search_modules.api_keys.google_api_info import api_key, api_id
 
 GOOGLE_API_KEY = api_key
@@ -12,54 +21,259 @@ CUSTOM_SEARCH_ENGINE_ID = api_id
 
 DATA_DIR = 'data'
 
+# Discovery document of the Custom Search JSON API (revision 20200917) bundled with this module,
+# so that the client is built without fetching it through the network
+DISCOVERY_DOCUMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discovery_documents', 'customsearch.v1.json')
+
+# The API never returns more than 100 results for a query
+GOOGLEMAXRESULTS = 100
+
+# Thread pool to retrieve the pages of the search results in parallel, created at the first use
+page_executor: ThreadPoolExecutor = None
+page_executor_lock = threading.Lock()
+
+# Client of the API built once and shared by all the threads of this process
+# It only composes the requests, which are thrown through the HTTP transport shared by the search modules
+google_service = None
+google_service_lock = threading.Lock()
+
 def makeDir(path):
     if not os.path.isdir(path):
         os.mkdir(path)
 
-def googleSearch(query):
-    # build the request to the custom search api
-    service = build("customsearch", "v1", developerKey=GOOGLE_API_KEY)
-    # number of pages to get the search results
-    page_limit = 1
-    # get from the first search result
-    start_index = 1
-    # number of search results to return
-    num_results = 10
-    # variable to save the result retrieved through the API
-    result = []
-    # variable to save the response
-    response = []
+def build_google_service():
+    # Parse the bundled discovery document, or fall back to fetching it if it can't be read
+    try:
+        with open(DISCOVERY_DOCUMENT_PATH, mode='r') as f:
+            return build_from_document(f.read(), developerKey=GOOGLE_API_KEY)
+    except (OSError, ValueError) as e:
+        print("[ERROR LOG] In build_google_service, failed to read the bundled discovery document: " + repr(e))
+        return build("customsearch", "v1", developerKey=GOOGLE_API_KEY, cache_discovery=False)
 
-    # look through the results page by page
-    # for n_page in range(0, page_limit):
-    for n_page in range(page_limit):
-        # print("before try \n")
-        try:
-            sleep(1)
-            result.append(service.cse().list(
-                # Input the query
-                q=query,
-                # The programmable search engine ID to use for this request
-                cx=CUSTOM_SEARCH_ENGINE_ID,
-                # Restricts the search to documents written in a particular language (e.g., lr=lang_ja)
-                # lr='lang_ja',
-                # Number of search results to return
-                num=num_results,
-                # The index of the first result to return
-                start=start_index
-            ).execute())
-            if(n_page != 0):
-                start_index = response[n_page].get("queries").get("nextPage")[0].get("startIndex")
+def get_google_service():
+    '''
+    Returns
+    ----------
+    google_service : googleapiclient.discovery.Resource
+        The client of the Custom Search JSON API shared in the process, used to compose the URI of the requests
+    '''
+    global google_service
+    with google_service_lock:
+        if google_service is None:
+            google_service = build_google_service()
+    return google_service
 
+async def get_google_service_async():
+    # Same as get_google_service, but the client is built on a thread of the default executor
+    # Parsing the discovery document takes a while, so it must not block the event loop at the first search
+    if google_service is not None:
+        return google_service
+    return await asyncio.get_running_loop().run_in_executor(None, get_google_service)
+
+def retrieve_result_page(query, num_results: int, start_index: int, timeout: float = None) -> dict:
+    # The raw JSON response of the API is cached per (query, num, start) to avoid spending the quota
+    def retrieve() -> tuple:
+        # Wait only if the requests to the API are thrown faster than the rate limit,
+        # and give up if the request couldn't be answered within the timeout after waiting
+        waited: float = get_rate_limiter("Google").acquire(timeout=timeout)
+        # Then reserve a query from the daily quota shared by the workers, QuotaExceeded is raised near the limit
+        # No query is spent on a request given up while waiting, and the ledger waits for the other workers only for the time left
+        get_quota_ledger().reserve_or_raise("Google", timeout=get_time_left(timeout, waited))
+        # build the request to the custom search api
+        api_request = get_google_service().cse().list(
+            # Input the query
+            q=query,
+            # The programmable search engine ID to use for this request
+            cx=CUSTOM_SEARCH_ENGINE_ID,
+            # Restricts the search to documents written in a particular language (e.g., lr=lang_ja)
+            # lr='lang_ja',
+            # Number of search results to return
+            num=num_results,
+            # The index of the first result to return
+            start=start_index
+        )
+        # only use the URI of the request composed by the API client and throw it through the shared transport
+        # The request is not retried, since every request spends a query of the quota
+        api_response = get_http_session(retry=False).get(api_request.uri, timeout=timeout)
+        api_response.raise_for_status()
+        return (api_response.content, 'utf-8')
+    payload, encoding = get_response_cache().fetch("Google", query, {"num": num_results, "start": start_index}, retrieve)
+    return json.loads(payload.decode(encoding))
+
+async def retrieve_result_page_async(query, num_results: int, start_index: int, session: aiohttp.ClientSession, timeout: float = None) -> dict:
+    # Asynchronous version of retrieve_result_page, the request is thrown through the given session
+    async def retrieve() -> tuple:
+        # Wait for the rate limit first, no query is spent on a request given up while waiting
+        waited: float = await get_rate_limiter("Google").acquire_async(timeout=timeout)
+        # The ledger may wait for the other workers holding the database, so it's called on the default executor
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(get_quota_ledger().reserve_or_raise, "Google", timeout=get_time_left(timeout, waited))
+        )
+        # only use the URI of the request composed by the API client and throw it through the given session
+        service = await get_google_service_async()
+        api_request = service.cse().list(q=query, cx=CUSTOM_SEARCH_ENGINE_ID, num=num_results, start=start_index)
+        async with session.get(api_request.uri, timeout=aiohttp.ClientTimeout(total=timeout)) as api_response:
+            api_response.raise_for_status()
+            return (await api_response.read(), 'utf-8')
+    payload, encoding = await get_response_cache().fetch_async("Google", query, {"num": num_results, "start": start_index}, retrieve)
+    return json.loads(payload.decode(encoding))
+
+def googleSearch(query, timeout: float = None, max_results: int = None):
+    # number of search results to return per page
+    num_results = 10
+    # All the pages are retrieved at once, the first one on this thread and the following ones on the pool,
+    # and the pages past the total number of the results of the query are dropped afterwards
+    start_indices: list = get_start_indices(num_results, get_page_depth(num_results, max_results))
+    futures: list = [
+        get_page_executor().submit(retrieve_result_page, query, num_results, start_index, timeout)
+        for start_index in start_indices[1:]
+    ]
+    try:
+        result_pages: list = [retrieve_result_page(query, num_results, start_indices[0], timeout)]
+    except Exception:
+        # The search fails without the first page, the following pages not started yet are not retrieved
+        for future in futures:
+            future.cancel()
+        raise
+    for start_index, future in zip(start_indices[1:], futures):
+        try:
+            result_pages.append(future.result())
         except Exception as e:
-            print(e)
+            # Return the pages retrieved so far (e.g. the daily quota is used up in the middle)
+            print("[ERROR LOG] In googleSearch, failed to retrieve the page starting from " + str(start_index) + ": " + repr(e))
             break
+    result_pages = drop_pages_past_total_results(result_pages, start_indices)
+    return push_pages_into_ResultItems(result_pages, num_results)[:max_results]
 
-    for i in range(0, num_results, 1):
-        json_item = result[0]['items'][i]
+async def googleSearchAsync(query, session: aiohttp.ClientSession, timeout: float = None, max_results: int = None):
+    # number of search results to return per page
+    num_results = 10
+    # All the pages are retrieved at once as googleSearch does
+    start_indices: list = get_start_indices(num_results, get_page_depth(num_results, max_results))
+    pages: list = await asyncio.gather(
+        *[retrieve_result_page_async(query, num_results, start_index, session, timeout) for start_index in start_indices],
+        return_exceptions=True
+    )
+    # The search fails without the first page
+    if isinstance(pages[0], BaseException):
+        raise pages[0]
+    result_pages: list = [pages[0]]
+    for start_index, result_page in zip(start_indices[1:], pages[1:]):
+        if isinstance(result_page, BaseException):
+            print("[ERROR LOG] In googleSearchAsync, failed to retrieve the page starting from " + str(start_index) + ": " + repr(result_page))
+            break
+        result_pages.append(result_page)
+    result_pages = drop_pages_past_total_results(result_pages, start_indices)
+    # The items are made on the default executor not to block the event loop, as the other search modules do
+    result_items: list = await asyncio.get_running_loop().run_in_executor(None, push_pages_into_ResultItems, result_pages, num_results)
+    return result_items[:max_results]
+
+def get_page_depth(num_results: int, max_results: int = None) -> int:
+    # Number of the pages of the search results to retrieve for a query, no more than needed for max_results
+    page_depth: int = max(getattr(settings, "METASEARCH_GOOGLE_PAGE_DEPTH", 1), 1)
+    if max_results is not None:
+        page_depth = min(page_depth, max(-(-max_results // num_results), 1))
+    return page_depth
+
+def get_start_indices(num_results: int, page_depth: int) -> list:
+    '''
+    Parameters
+    ----------
+    num_results : int
+        number of the search results per page
+        ex. 10
+    page_depth : int
+        number of the pages to retrieve including the first page
+        ex. 3
+
+    Returns
+    ----------
+    start_indices : list
+        The "start" parameters of the pages to retrieve, starting from the first page,
+        stopping at the maximum number of the results the API returns
+        ex. [1, 11, 21]
+    '''
+    start_indices: list = [1]
+    for n_page in range(1, page_depth):
+        start_index: int = 1 + num_results * n_page
+        if start_index + num_results - 1 > GOOGLEMAXRESULTS:
+            break
+        start_indices.append(start_index)
+    return start_indices
+
+def drop_pages_past_total_results(result_pages: list, start_indices: list) -> list:
+    '''
+    Parameters
+    ----------
+    result_pages : list
+        JSON responses of the Custom Search JSON API for the pages retrieved, starting from the first page
+    start_indices : list
+        The "start" parameters the pages were retrieved with
+        ex. [1, 11, 21]
+
+    Returns
+    ----------
+    result_pages : list
+        The pages within the total number of the results of the query, told by the first page
+        The first page alone if it has no next page
+    '''
+    next_page: list = result_pages[0].get("queries", {}).get("nextPage")
+    if not next_page:
+        return result_pages[:1]
+    total_results: int = int(next_page[0].get("totalResults", GOOGLEMAXRESULTS))
+    return [result_page for result_page, start_index in zip(result_pages, start_indices) if start_index <= total_results]
+
+def get_page_executor() -> ThreadPoolExecutor:
+    # The thread pool shared by all the searches to retrieve the pages following the first page in parallel
+    global page_executor
+    with page_executor_lock:
+        if page_executor is None:
+            page_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "METASEARCH_ENGINE_WORKERS", 8),
+                thread_name_prefix="metasearch-google-page"
+            )
+    return page_executor
+
+def push_pages_into_ResultItems(result_pages: list, num_results: int) -> list:
+    # The results are ranked through the pages by the index of the first result of each page,
+    # e.g. the first result of the second page is ranked 11th even if the first page has less than 10 results
+    response: list = []
+    for result_page in result_pages:
+        response.extend(push_into_ResultItems(result_page, num_results, get_start_index_of(result_page, len(response) + 1)))
+    return response
+
+def get_start_index_of(result_page: dict, default: int) -> int:
+    # Index of the first result of the page told by the API (queries.request[0].startIndex), the default if it's missing
+    request: list = result_page.get("queries", {}).get("request")
+    if not request:
+        return default
+    return int(request[0].get("startIndex", default))
+
+def push_into_ResultItems(result_page: dict, num_results: int, first_rank: int = 1) -> list:
+    '''
+    Parameters
+    ----------
+    result_page : dict
+        JSON response of the Custom Search JSON API for a page of the search results
+        ex. {"kind": "customsearch#search", ..., "items": [{"title": "...", "link": "...", "snippet": "..."}, ...]}
+    num_results : int
+        maximum number of the search results to pick from the page
+        ex. 10
+    first_rank : int
+        rank of the first search result in the page
+        ex. 11
+
+    Returns
+    ----------
+    response : list
+        The list of search results summarized in the ResultItem objects
+        ex. [ResultItem1, ResultItem2, ResultItem3, ...]
+    '''
+    response = []
+    for i, json_item in enumerate(result_page.get('items', [])[:num_results]):
         r_item = ResultItem(json_item['title'], json_item['link'], "Google")
-        r_item.set_rank(i+1)
-        r_item.set_abstract(json_item['snippet'])
+        r_item.set_rank(first_rank+i)
+        r_item.set_abstract(json_item.get('snippet', ""))
         response.append(r_item)
     return response
         
@@ -0,0 +1,111 @@
+import asyncio
+import weakref
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+# HTTP transport shared by all the search modules
+# The connections to each host are pooled and kept alive across the searches,
+# so that a search doesn't pay the DNS lookup, TCP handshake and TLS handshake again for every search engine.
+# The responses are negotiated to be compressed with gzip or deflate and decompressed transparently.
+
+DEFAULTPOOLCONNECTIONS = 8
+DEFAULTPOOLMAXSIZE = 16
+DEFAULTRETRIES = 2
+DEFAULTBACKOFFFACTOR = 0.2
+# Status codes of the responses retried, the errors of the servers which may be temporary
+RETRYSTATUSES = (500, 502, 503, 504)
+
+def build_http_session(retries: int = None) -> requests.Session:
+    '''
+    Parameters
+    ----------
+    retries : int
+        number of the retries of a request, settings.METASEARCH_HTTP_RETRIES if None
+        ex. 0
+
+    Returns
+    ----------
+    http_session : requests.Session
+        Session with the connection pools and the retry policy configured by
+        settings.METASEARCH_HTTP_POOL_CONNECTIONS, METASEARCH_HTTP_POOL_MAXSIZE,
+        METASEARCH_HTTP_RETRIES and METASEARCH_HTTP_BACKOFF_FACTOR
+    '''
+    if retries is None:
+        retries = getattr(settings, "METASEARCH_HTTP_RETRIES", DEFAULTRETRIES)
+    # Only the idempotent requests (e.g. GET) are retried, on connection errors and on the statuses in RETRYSTATUSES
+    # After the last retry the response is returned as is, so that the caller handles the error status
+    retry = Retry(
+        total=retries,
+        backoff_factor=getattr(settings, "METASEARCH_HTTP_BACKOFF_FACTOR", DEFAULTBACKOFFFACTOR),
+        status_forcelist=RETRYSTATUSES,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        # Number of the hosts to keep the pools for
+        pool_connections=getattr(settings, "METASEARCH_HTTP_POOL_CONNECTIONS", DEFAULTPOOLCONNECTIONS),
+        # Number of the connections kept alive for a host, i.e. the number of the concurrent requests to the host
+        pool_maxsize=getattr(settings, "METASEARCH_HTTP_POOL_MAXSIZE", DEFAULTPOOLMAXSIZE),
+        max_retries=retry
+    )
+    http_session = requests.Session()
+    http_session.mount("https://", adapter)
+    http_session.mount("http://", adapter)
+    # Ask for the compressed responses only in the encodings requests always decompresses
+    http_session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return http_session
+
+# Sessions shared by the threads of this process, created at the first use
+# True -> session retrying the requests, False -> session without the retries
+http_sessions: dict = {}
+http_session_lock = threading.Lock()
+
+def get_http_session(retry: bool = True) -> requests.Session:
+    '''
+    Parameters
+    ----------
+    retry : bool
+        False for the APIs spending the daily quota on every request (Google, Yandex),
+        since a retried request would spend a query not reserved in the quota ledger
+
+    Returns
+    ----------
+    http_session : requests.Session
+        The session shared by all the search modules in this process
+        The timeout must be given to every request, e.g. get_http_session().get(url, timeout=5.0)
+    '''
+    with http_session_lock:
+        if retry not in http_sessions:
+            http_sessions[retry] = build_http_session(None if retry else 0)
+        return http_sessions[retry]
+
+# event loop -> aiohttp.ClientSession shared by the coroutines running on the loop
+async_http_sessions = weakref.WeakKeyDictionary()
+
+def get_async_http_session() -> aiohttp.ClientSession:
+    '''
+    Returns
+    ----------
+    async_http_session : aiohttp.ClientSession
+        The session shared by the searches running on the current event loop,
+        with the same limit of the connections kept alive for a host as the synchronous session
+        It must be called from a coroutine, and must not be closed by the caller
+    '''
+    loop = asyncio.get_running_loop()
+    async_http_session: aiohttp.ClientSession = async_http_sessions.get(loop)
+    if async_http_session is None or async_http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=getattr(settings, "METASEARCH_HTTP_POOL_MAXSIZE", DEFAULTPOOLMAXSIZE)
+        )
+        async_http_session = aiohttp.ClientSession(connector=connector)
+        async_http_sessions[loop] = async_http_session
+    return async_http_session
+
+async def close_async_http_session():
+    # Close the session of the current event loop and its connections kept alive, e.g. when the ASGI server shuts down
+    async_http_session: aiohttp.ClientSession = async_http_sessions.pop(asyncio.get_running_loop(), None)
+    if async_http_session is not None and not async_http_session.closed:
+        await async_http_session.close()
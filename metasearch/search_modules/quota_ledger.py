@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from django.conf import settings
+
+class QuotaExceeded(Exception):
+    # Raised when a search engine has (almost) used up its daily quota
+    def __init__(self, engine: str, remaining: int):
+        super().__init__(engine + " is skipped to keep its daily quota, remaining: " + str(remaining))
+        self.engine: str = engine
+        self.remaining: int = remaining
+
+class QuotaLedger:
+    '''
+    Daily usage of the quota-limited search engine APIs, shared by all the worker processes through an SQLite database
+    The engine modules reserve a query from the ledger before throwing a request to the API.
+    The reservation is refused when the remaining quota of the day would fall below the margin,
+    so that the quota is not used up before the end of the day.
+    The days are counted in UTC.
+    '''
+    DEFAULTMARGIN = 0
+    # Seconds to wait for the other workers holding the database, when the caller gives no timeout
+    DEFAULTBUSYTIMEOUT = 5.0
+
+    def __init__(self, path: str, limits: dict, margin: int = DEFAULTMARGIN, enabled: bool = True):
+        # Path of the SQLite database file
+        self.path: str = path
+        # engine name -> number of queries allowed per day, the engines not in it are not limited
+        self.limits: dict = limits
+        # Number of queries kept unused at the end of the day
+        self.margin: int = margin
+        # When disabled, every reservation is accepted and nothing is recorded
+        self.enabled: bool = enabled
+        self.initialized: bool = False
+        self.lock = threading.Lock()
+
+    def connect(self, timeout: float = None) -> sqlite3.Connection:
+        # The directory of the database file must exist before SQLite opens it
+        with self.lock:
+            if not self.initialized:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Transactions are controlled explicitly, wait for the other workers holding the database up to the timeout
+        if timeout is None:
+            timeout = self.DEFAULTBUSYTIMEOUT
+        connection = sqlite3.connect(self.path, timeout=max(timeout, 0.0), isolation_level=None)
+        with self.lock:
+            if not self.initialized:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS quota_usage (engine TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (engine, day))"
+                )
+                self.initialized = True
+        return connection
+
+    def get_day(self) -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def reserve(self, engine: str, amount: int = 1, timeout: float = None) -> bool:
+        '''
+        Parameters
+        ----------
+        engine : str
+            name of the search engine
+            ex. "Google"
+        amount : int
+            number of queries to throw
+            ex. 1
+        timeout : float
+            seconds to wait for the other workers holding the database, DEFAULTBUSYTIMEOUT if None
+            sqlite3.OperationalError is raised if the database is still locked after that
+            ex. 1.5
+
+        Returns
+        ----------
+        reserved : bool
+            True if the queries are recorded as used, False if they would exceed the limit of the day minus the margin
+        '''
+        if not self.enabled or engine not in self.limits:
+            return True
+        connection: sqlite3.Connection = self.connect(timeout)
+        try:
+            # Lock the database for writing so that the check and the update are atomic among the workers
+            connection.execute("BEGIN IMMEDIATE")
+            day: str = self.get_day()
+            used: int = self.select_used(connection, engine, day)
+            if used + amount > self.limits[engine] - self.margin:
+                connection.execute("ROLLBACK")
+                return False
+            connection.execute(
+                "INSERT INTO quota_usage (engine, day, used) VALUES (?, ?, ?) ON CONFLICT (engine, day) DO UPDATE SET used = used + excluded.used",
+                (engine, day, amount)
+            )
+            connection.execute("COMMIT")
+            return True
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def reserve_or_raise(self, engine: str, amount: int = 1, timeout: float = None):
+        # Same as reserve, but raises QuotaExceeded if the queries can't be reserved
+        if not self.reserve(engine, amount, timeout):
+            raise QuotaExceeded(engine, self.get_remaining(engine))
+
+    def select_used(self, connection: sqlite3.Connection, engine: str, day: str) -> int:
+        row = connection.execute("SELECT used FROM quota_usage WHERE engine = ? AND day = ?", (engine, day)).fetchone()
+        if row is None:
+            return 0
+        return row[0]
+
+    def get_used(self, engine: str) -> int:
+        if not self.enabled:
+            return 0
+        connection: sqlite3.Connection = self.connect()
+        try:
+            return self.select_used(connection, engine, self.get_day())
+        finally:
+            connection.close()
+
+    def get_remaining(self, engine: str) -> int:
+        '''
+        Returns
+        ----------
+        remaining : int
+            number of queries the engine can still throw today, or None if the engine is not limited
+        '''
+        if engine not in self.limits:
+            return None
+        return max(self.limits[engine] - self.get_used(engine), 0)
+
+    def get_stats(self) -> dict:
+        # engine name -> usage of the quota of the day
+        stats: dict = {}
+        for engine in self.limits.keys():
+            used: int = self.get_used(engine)
+            stats[engine] = {
+                "limit": self.limits[engine],
+                "used": used,
+                "remaining": max(self.limits[engine] - used, 0),
+            }
+        return stats
+
+# Ledger shared by all the search modules in this process (and through the database file, by all the workers)
+quota_ledger: QuotaLedger = None
+quota_ledger_lock = threading.Lock()
+
+def get_quota_ledger() -> QuotaLedger:
+    '''
+    Returns
+    ----------
+    quota_ledger : QuotaLedger
+        The ledger configured by settings.METASEARCH_QUOTA_ENABLED, METASEARCH_QUOTA_LEDGER_PATH,
+        METASEARCH_QUOTA_LIMITS and METASEARCH_QUOTA_MARGIN
+    '''
+    global quota_ledger
+    with quota_ledger_lock:
+        if quota_ledger is None:
+            quota_ledger = QuotaLedger(
+                getattr(settings, "METASEARCH_QUOTA_LEDGER_PATH", os.path.join(settings.BASE_DIR, "quota_ledger.sqlite3")),
+                getattr(settings, "METASEARCH_QUOTA_LIMITS", {}),
+                margin=getattr(settings, "METASEARCH_QUOTA_MARGIN", QuotaLedger.DEFAULTMARGIN),
+                enabled=getattr(settings, "METASEARCH_QUOTA_ENABLED", True)
+            )
+    return quota_ledger
@@ -0,0 +1,137 @@
+import time
+import asyncio
+import threading
+from django.conf import settings
+
+class RateLimitExceeded(Exception):
+    # Raised when the request would have to wait for the rate limit longer than the time it's given
+    def __init__(self, wait: float, timeout: float):
+        super().__init__("the rate limit needs a wait of " + "{:.2f}".format(wait) + " seconds, longer than the timeout of " + str(timeout) + " seconds")
+        self.wait: float = wait
+        self.timeout: float = timeout
+
+class TokenBucket:
+    '''
+    Token-bucket rate limiter of the requests thrown to a search engine, shared by the threads of this process
+    The bucket holds up to `burst` tokens and is refilled by `rate` tokens per second.
+    A request takes a token, and only waits when the bucket is empty.
+    The tokens are reserved in the order of the calls, so the waiting callers are served first come, first served.
+    '''
+    DEFAULTBURST = 1
+
+    def __init__(self, rate: float = None, burst: int = DEFAULTBURST):
+        # Tokens refilled per second, None for no limit
+        self.rate: float = rate
+        # Maximum number of the tokens held by the bucket, i.e. the number of requests thrown at once without waiting
+        self.burst: int = burst
+        self.tokens: float = burst
+        self.updated_at: float = time.monotonic()
+        self.lock = threading.Lock()
+        # Counters
+        self.acquired: int = 0
+        self.waited: int = 0
+        self.refused: int = 0
+        self.total_wait_seconds: float = 0.0
+        self.max_wait_seconds: float = 0.0
+
+    def reserve(self, amount: int = 1, timeout: float = None) -> float:
+        '''
+        Parameters
+        ----------
+        amount : int
+            number of the tokens to take
+            ex. 1
+        timeout : float
+            maximum seconds the caller can wait, no maximum if None
+            ex. 5.0
+
+        Returns
+        ----------
+        wait : float
+            seconds the caller has to wait before throwing the request, 0.0 if the bucket wasn't empty
+            The tokens are taken even if the caller has to wait, but not if the wait is longer than the timeout:
+            RateLimitExceeded is raised instead, so that the request is skipped without delaying the next callers
+        '''
+        with self.lock:
+            if self.rate is None:
+                self.acquired = self.acquired + 1
+                return 0.0
+            now: float = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, self.burst)
+            self.updated_at = now
+            # The bucket may go negative, which is the debt paid by the waiting callers
+            wait: float = max(-(self.tokens - amount) / self.rate, 0.0)
+            if timeout is not None and wait > timeout:
+                self.refused = self.refused + 1
+                raise RateLimitExceeded(wait, timeout)
+            self.acquired = self.acquired + 1
+            self.tokens = self.tokens - amount
+            if wait > 0.0:
+                self.waited = self.waited + 1
+                self.total_wait_seconds = self.total_wait_seconds + wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def acquire(self, amount: int = 1, timeout: float = None) -> float:
+        # Take the tokens and sleep until the request can be thrown, returns the seconds waited
+        # RateLimitExceeded is raised at once if the wait would be longer than the timeout
+        wait: float = self.reserve(amount, timeout)
+        if wait > 0.0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, amount: int = 1, timeout: float = None) -> float:
+        # Asynchronous version of acquire, the event loop keeps running while waiting
+        wait: float = self.reserve(amount, timeout)
+        if wait > 0.0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "refused": self.refused,
+                "total_wait_seconds": self.total_wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+def get_time_left(timeout: float, waited: float) -> float:
+    # Seconds left of the timeout after waiting for the rate limit for the seconds returned by acquire, None without the timeout
+    if timeout is None:
+        return None
+    return timeout - waited
+
+# engine name -> TokenBucket shared by all the search modules in this process
+rate_limiters: dict = {}
+rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(engine: str) -> TokenBucket:
+    '''
+    Parameters
+    ----------
+    engine : str
+        name of the search engine
+        ex. "Google"
+
+    Returns
+    ----------
+    rate_limiter : TokenBucket
+        The limiter of the engine configured by settings.METASEARCH_RATE_LIMITS
+        ex. {"Google": {"rate": 1.0, "burst": 5}}
+        The engines not in it are not limited
+    '''
+    with rate_limiters_lock:
+        if engine not in rate_limiters:
+            limit: dict = getattr(settings, "METASEARCH_RATE_LIMITS", {}).get(engine, {})
+            rate_limiters[engine] = TokenBucket(limit.get("rate"), limit.get("burst", TokenBucket.DEFAULTBURST))
+        return rate_limiters[engine]
+
+def get_rate_limiter_stats() -> dict:
+    # engine name -> stats of the limiter, including the time the callers waited
+    with rate_limiters_lock:
+        limiters: dict = dict(rate_limiters)
+    return {engine: limiter.get_stats() for engine, limiter in limiters.items()}
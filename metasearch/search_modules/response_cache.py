@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from django.conf import settings
+
+class ResponseCache:
+    '''
+    Cache of the raw responses of the search engines before they are parsed
+    (Google CSE JSON, Yahoo! HTML, DuckDuckGo HTML and Yandex XML)
+
+    Entries are keyed by (engine, normalized query, request parameters) and expire after the TTL of the engine.
+    Each entry is persisted as a file under the cache directory so that it survives restarts and is shared by the workers.
+    A file consists of a JSON header line followed by the raw payload:
+        {"engine": "Yandex", "query": "hello world", "params": {...}, "encoding": "utf-8", "stored_at": 1600000000.0}
+        <?xml version="1.0" encoding="utf-8"?>...
+    '''
+    DEFAULTTTL = 600
+    # Seconds between the purges of the expired entries from the disk
+    DEFAULTPURGEINTERVAL = 3600
+
+    def __init__(self, directory: str, ttls: dict = None, enabled: bool = True, purge_interval: float = DEFAULTPURGEINTERVAL):
+        # Directory the entries are stored in
+        self.directory: str = directory
+        # engine name -> seconds an entry of the engine stays valid, DEFAULTTTL is used for the engines not in it
+        self.ttls: dict = ttls if ttls is not None else {}
+        # When disabled, nothing is stored and every lookup is a miss
+        self.enabled: bool = enabled
+        self.lock = threading.Lock()
+        # The expired entries are purged on a background thread at most once per purge_interval seconds,
+        # never if it's None (e.g. when "manage.py purge_response_cache" is run periodically instead)
+        self.purge_interval: float = purge_interval
+        self.next_purge_at: float = time.monotonic() + (purge_interval or 0)
+        self.purging: bool = False
+        # Counters
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Ignore the differences of cases and spaces between the queries
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    def get_ttl(self, engine: str) -> float:
+        return self.ttls.get(engine, ResponseCache.DEFAULTTTL)
+
+    def get_path(self, engine: str, query: str, params: dict) -> str:
+        key: str = json.dumps([engine, ResponseCache.normalize_query(query), params], sort_keys=True)
+        engine_directory: str = re.sub(r"[^a-z0-9]", "", engine.lower())
+        return os.path.join(self.directory, engine_directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".cache")
+
+    def get(self, engine: str, query: str, params: dict) -> tuple:
+        '''
+        Parameters
+        ----------
+        engine : str
+            name of the search engine
+            ex. "Yandex"
+        query : str
+            search query string sent to the search engine
+            ex. "hello world"
+        params : dict
+            the other parameters of the request which change the response
+            ex. {"num": 10, "start": 1}
+
+        Returns
+        ----------
+        response : tuple
+            (raw payload in bytes, its encoding) or None if it's not cached or already expired
+            ex. (b'<?xml version="1.0" encoding="utf-8"?>...', "utf-8")
+        '''
+        if not self.enabled:
+            return None
+        entry: tuple = read_entry(self.get_path(engine, query, params))
+        if entry is None or entry[0]["stored_at"] + self.get_ttl(engine) <= time.time():
+            with self.lock:
+                self.misses = self.misses + 1
+            return None
+        with self.lock:
+            self.hits = self.hits + 1
+        header, payload = entry
+        return (payload, header["encoding"])
+
+    def put(self, engine: str, query: str, params: dict, payload: bytes, encoding: str):
+        '''
+        Parameters
+        ----------
+        engine, query, params :
+            same as get
+        payload : bytes
+            raw response of the search engine
+        encoding : str
+            encoding of the payload
+            ex. "utf-8"
+        '''
+        if not self.enabled:
+            return
+        header: dict = {
+            "engine": engine,
+            "query": ResponseCache.normalize_query(query),
+            "params": params,
+            "encoding": encoding,
+            "stored_at": time.time()
+        }
+        write_entry(self.get_path(engine, query, params), header, payload)
+        with self.lock:
+            purge: bool = self.purge_interval is not None and not self.purging and time.monotonic() >= self.next_purge_at
+            if purge:
+                self.purging = True
+                self.next_purge_at = time.monotonic() + self.purge_interval
+        if purge:
+            # The request storing the entry doesn't wait for the purge
+            threading.Thread(target=self.purge_expired_in_background, name="metasearch-response-cache-purge", daemon=True).start()
+
+    def fetch(self, engine: str, query: str, params: dict, retrieve) -> tuple:
+        '''
+        Returns the cached response, or calls retrieve() to get (payload, encoding) and caches it
+        '''
+        response: tuple = self.get(engine, query, params)
+        if response is None:
+            response = retrieve()
+            self.put(engine, query, params, response[0], response[1])
+        return response
+
+    async def fetch_async(self, engine: str, query: str, params: dict, retrieve) -> tuple:
+        '''
+        Asynchronous version of fetch, retrieve is a coroutine function returning (payload, encoding)
+        The entry files are read and written on the default executor, so that the event loop isn't blocked by the disk
+        '''
+        loop = asyncio.get_running_loop()
+        response: tuple = await loop.run_in_executor(None, self.get, engine, query, params)
+        if response is None:
+            response = await retrieve()
+            await loop.run_in_executor(None, self.put, engine, query, params, response[0], response[1])
+        return response
+
+    def entries(self, engine: str = None):
+        '''
+        Iterates over the cached entries, including the expired ones which are not purged yet,
+        so that the parsers can be run again over the cached responses without sending any request
+        Yields tuples of (header dict, raw payload in bytes)
+        '''
+        if not os.path.isdir(self.directory):
+            return
+        for engine_directory in sorted(os.listdir(self.directory)):
+            if engine is not None and engine_directory != re.sub(r"[^a-z0-9]", "", engine.lower()):
+                continue
+            for file_name in sorted(os.listdir(os.path.join(self.directory, engine_directory))):
+                if not file_name.endswith(".cache"):
+                    continue
+                entry: tuple = read_entry(os.path.join(self.directory, engine_directory, file_name))
+                if entry is not None:
+                    yield entry
+
+    def purge_expired(self) -> int:
+        '''
+        Returns
+        ----------
+        removed : int
+            Number of the files of the expired entries removed
+            Only the header line of every file is read, not the payload
+        '''
+        removed: int = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for engine_directory in os.listdir(self.directory):
+            directory: str = os.path.join(self.directory, engine_directory)
+            if not os.path.isdir(directory):
+                continue
+            for file_name in os.listdir(directory):
+                if not file_name.endswith(".cache"):
+                    continue
+                path: str = os.path.join(directory, file_name)
+                header: dict = read_header(path)
+                if header is None or header["stored_at"] + self.get_ttl(header["engine"]) > time.time():
+                    continue
+                try:
+                    os.remove(path)
+                    removed = removed + 1
+                except OSError:
+                    # Already removed by another worker
+                    pass
+        return removed
+
+    def purge_expired_in_background(self):
+        try:
+            self.purge_expired()
+        except OSError as e:
+            print("[ERROR LOG] In ResponseCache.purge_expired_in_background, failed to purge the expired entries: " + repr(e))
+        finally:
+            with self.lock:
+                self.purging = False
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+def read_entry(path: str) -> tuple:
+    # Returns (header dict, payload bytes) of the entry file, or None if it doesn't exist or is broken
+    try:
+        with open(path, mode='rb') as f:
+            header: dict = json.loads(f.readline().decode('utf-8'))
+            payload: bytes = f.read()
+    except (OSError, ValueError):
+        return None
+    return (header, payload)
+
+def read_header(path: str) -> dict:
+    # Returns the header dict of the entry file without reading the payload, or None if it doesn't exist or is broken
+    try:
+        with open(path, mode='rb') as f:
+            return json.loads(f.readline().decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def write_entry(path: str, header: dict, payload: bytes):
+    # Write into a temporary file and rename it, so that the other workers never read a half-written entry
+    temporary_path: str = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(descriptor, mode='wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            f.write(payload)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        print("[ERROR LOG] In write_entry, failed to write the response cache entry: " + repr(e))
+        if temporary_path is not None and os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+# Cache shared by all the search modules in this process
+response_cache: ResponseCache = None
+response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    '''
+    Returns
+    ----------
+    response_cache : ResponseCache
+        The cache shared in the process, configured by
+        settings.METASEARCH_RESPONSE_CACHE_ENABLED, METASEARCH_RESPONSE_CACHE_DIR, METASEARCH_RESPONSE_CACHE_TTL
+        and METASEARCH_RESPONSE_CACHE_PURGE_INTERVAL
+    '''
+    global response_cache
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache(
+                getattr(settings, "METASEARCH_RESPONSE_CACHE_DIR", os.path.join(settings.BASE_DIR, "response_cache")),
+                ttls=getattr(settings, "METASEARCH_RESPONSE_CACHE_TTL", {}),
+                enabled=getattr(settings, "METASEARCH_RESPONSE_CACHE_ENABLED", True),
+                purge_interval=getattr(settings, "METASEARCH_RESPONSE_CACHE_PURGE_INTERVAL", ResponseCache.DEFAULTPURGEINTERVAL)
+            )
+    return response_cache
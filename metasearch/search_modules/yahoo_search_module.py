@@ -1,24 +1,85 @@
-import requests
+import re
+import asyncio
+import aiohttp
 import sys
 from bs4 import BeautifulSoup
 from metasearch.models import ResultItem
+from metasearch.search_modules.response_cache import get_response_cache
+from metasearch.search_modules.rate_limiter import get_rate_limiter
+from metasearch.search_modules.http_transport import get_http_session
 
-def retrieve_result_page(query: str):
-    return requests.get('https://search.yahoo.com/search?p='+query)
+# Start tags of the div elements with their class attribute, to find the search result items without parsing the page
+DIV_START_TAG = re.compile(rb'<div\s[^>]*?class\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+# Classes of the div elements of the search result items, all of them are required ("div.dd.algo.algo-sr.relsrch")
+RESULT_ITEM_CLASSES = frozenset([b"dd", b"algo", b"algo-sr", b"relsrch"])
 
-def yahooSearch(query: str):
-    # Get the Yahoo search result page for the query
-    page = retrieve_result_page(query)
+def retrieve_result_page(query: str, timeout: float = None):
+    # Wait only if the requests to Yahoo! are thrown faster than the rate limit
+    get_rate_limiter("Yahoo!").acquire(timeout=timeout)
+    page = get_http_session().get('https://search.yahoo.com/search?p='+query, timeout=timeout)
+    # An error page (e.g. 503 after the retries, 429) must fail the search instead of being cached as 0 results
+    page.raise_for_status()
+    return page
+
+async def retrieve_result_page_async(query: str, session: aiohttp.ClientSession, timeout: float = None):
+    # Returns the content of the result page in bytes and its encoding
+    await get_rate_limiter("Yahoo!").acquire_async(timeout=timeout)
+    async with session.get('https://search.yahoo.com/search?p='+query, timeout=aiohttp.ClientTimeout(total=timeout)) as page:
+        page.raise_for_status()
+        return await page.read(), page.charset
+
+def yahooSearch(query: str, timeout: float = None, max_results: int = None):
+    # Get the Yahoo search result page for the query, or its raw content cached a while ago
+    def retrieve() -> tuple:
+        page = retrieve_result_page(query, timeout)
+        # Check the result page encoding to use it in BeautifulSoup composition
+        return (page.content, page.encoding)
+    content, encoding = get_response_cache().fetch("Yahoo!", query, {}, retrieve)
+    return push_into_ResultItems(content, encoding, max_results)
+
+async def yahooSearchAsync(query: str, session: aiohttp.ClientSession, timeout: float = None, max_results: int = None):
+    # Get the Yahoo search result page for the query through the given session, or its raw content cached a while ago
+    content, encoding = await get_response_cache().fetch_async(
+        "Yahoo!", query, {}, lambda: retrieve_result_page_async(query, session, timeout)
+    )
+    # Parsing the page takes the CPU for a while, so it's done on the default executor not to block the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, push_into_ResultItems, content, encoding, max_results)
+
+def cut_after_result_items(content: bytes, max_results: int) -> bytes:
+    '''
+    Parameters
+    ----------
+    content : bytes
+        Yahoo! result HTML page in an ASCII-compatible encoding (e.g. UTF-8)
+    max_results : int
+        number of the search result items to keep, all of them if None
+        ex. 10
+
+    Returns
+    ----------
+    content : bytes
+        The page cut just before the start tag of the (max_results + 1)-th search result item,
+        so that the rest of the page is never parsed
+    '''
+    if max_results is None:
+        return content
+    count: int = 0
+    for match in DIV_START_TAG.finditer(content):
+        if RESULT_ITEM_CLASSES.issubset(match.group(1).split()):
+            count = count + 1
+            if count > max_results:
+                return content[:match.start()]
+    return content
+
+def push_into_ResultItems(content: bytes, encoding: str, max_results: int = None) -> list:
     # Prepare a list for returning the search results
     result = list()
-    # Check the result page encoding to use it in BeautifulSoup composition
-    encoding = page.encoding
-    # Analyse the result page using BeautifulSoup
-    soup = BeautifulSoup(page.content, "html.parser", from_encoding = encoding)
+    # Analyse the result page using BeautifulSoup, only up to the last search result to return
+    soup = BeautifulSoup(cut_after_result_items(content, max_results), "html.parser", from_encoding = encoding)
     # Obtain topics and abstract element by the BeautifulSoup function
     # Put the results in the list to be returned
     rank = 1
-    result_items = soup.select("div.dd.algo.algo-sr.relsrch")
+    result_items = soup.select("div.dd.algo.algo-sr.relsrch", limit=max_results if max_results is not None else 0)
     for item in result_items:
         # Retrieve title and URL
         title_section = item.find("h3", attrs={"title"})
@@ -1,10 +1,17 @@
 import os
+import re
 import datetime
-import urllib
+import asyncio
+import aiohttp
+import functools
 import xml.etree.ElementTree
 
-from time import sleep
+from html.entities import name2codepoint
 from metasearch.models import ResultItem
+from metasearch.search_modules.response_cache import get_response_cache
+from metasearch.search_modules.rate_limiter import get_rate_limiter, get_time_left
+from metasearch.search_modules.http_transport import get_http_session
+from metasearch.search_modules.quota_ledger import get_quota_ledger
 from metasearch.search_modules.api_keys.yandex_api_info import user_name, api_key
 
 YANDEX_USER_NAME_TO_USE = user_name
@@ -22,6 +29,14 @@ FILTER = {
     "Moderate": "moderate"
 }
 
+# Number of the bytes of the response fed to the XML parser at once
+CHUNKSIZE = 16384
+# "&" which doesn't start a valid XML reference (the predefined entities and the character references),
+# optionally followed by the name of another entity ended by ";"
+INVALID_ENTITY_REFERENCE = re.compile(rb'&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#[xX][0-9a-fA-F]+);)(?:([A-Za-z][A-Za-z0-9]{0,31});)?')
+# Maximum length of a reference, used to find the one split between two chunks
+MAXENTITYLENGTH = 40
+
 def build_url(query: str, lang: str, sortby: str, filter: str, maxpassages: int, result_num: int) -> str:
     '''
     For the detailed structure of the request URL to Yandex search engine, access
@@ -47,44 +62,174 @@ def build_url(query: str, lang: str, sortby: str, filter: str, maxpassages: int,
     url = url + "groupby=" + "attr%3D%22%22.mode%3Dflat.groups-on-page%3D" + str(result_num) + ".docs-in-group%3D1"
     return url
 
-def request_get(url: str) -> str:
+def request_get_content(url: str, timeout: float = None) -> bytes:
+    '''
+    This function throw a request to the given URL and return the body of the response in bytes
+    timeout (seconds) is applied to the blocking operations of the request, no timeout if None
+    The caller waits for the rate limit of Yandex before calling it
+    The request is not retried, since every request spends a query of the daily quota
+    '''
+    res = get_http_session(retry=False).get(url, timeout=timeout)
+    res.raise_for_status()
+    return res.content
+
+def request_get(url: str, timeout: float = None) -> str:
     '''
     This function throw a request to the given URL and return the result of reading the response
+    timeout (seconds) is applied to the blocking operations of the request, no timeout if None
+    '''
+    return request_get_content(url, timeout).decode('utf-8')
+
+async def request_get_content_async(url: str, session: aiohttp.ClientSession, timeout: float = None) -> bytes:
+    '''
+    Asynchronous version of request_get_content, the request is thrown through the given aiohttp session
+    '''
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+        res.raise_for_status()
+        return await res.read()
+
+async def request_get_async(url: str, session: aiohttp.ClientSession, timeout: float = None) -> str:
     '''
-    req = urllib.request.Request(url)
-    res = urllib.request.urlopen(req)
-    data = res.read()
-    return data.decode('utf-8')
-
-def analyze_xml(xml_data: str):
-    return xml.etree.ElementTree.fromstring(xml_data)
-
-def push_into_ResultItems(tree_root, num_results: int) -> list:
-    # List of ResultItem to return
-    results: list = []
-    doc_count: int = 1
-    for doc in tree_root.iter('doc'):
-        try:
-            passage: str = ''.join(doc.iter('passages').__next__().itertext())
-        except StopIteration:
-            try:
-                passage: str = ''.join(doc.iter('headline').__next__().itertext())
-            except StopIteration:
-                passage: str = ""
-        passage = passage.replace('<passage>', '')
-        passage = passage.replace('</passage>', '<br/>')
+    Asynchronous version of request_get, the request is thrown through the given aiohttp session
+    '''
+    return (await request_get_content_async(url, session, timeout)).decode('utf-8')
+
+def iterate_chunks(payload: bytes, chunk_size: int = CHUNKSIZE):
+    # Slices of the payload to feed the XML parser with, without copying the whole payload
+    view = memoryview(payload)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+def escape_entity_reference(match) -> bytes:
+    name: bytes = match.group(1)
+    if name is None:
+        # A bare "&" which isn't a part of any reference
+        return b"&amp;"
+    codepoint: int = name2codepoint.get(name.decode('ascii'))
+    if codepoint is None:
+        # Keep the unknown entity reference as text
+        return b"&amp;" + name + b";"
+    # HTML entities (e.g. &nbsp;) aren't defined in XML, replace them with the character references
+    return b"&#" + str(codepoint).encode('ascii') + b";"
+
+def escape_ampersands(chunks):
+    '''
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of the XML response in bytes (UTF-8)
+
+    Yields
+    ----------
+    chunk : bytes
+        The chunk where every "&" which doesn't start a valid XML reference is escaped to "&amp;"
+        A reference split between two chunks is carried over to the next chunk
+    '''
+    carried: bytes = b""
+    for chunk in chunks:
+        chunk = carried + bytes(chunk)
+        carried = b""
+        ampersand: int = chunk.rfind(b"&")
+        if ampersand != -1 and len(chunk) - ampersand <= MAXENTITYLENGTH and chunk.find(b";", ampersand) == -1:
+            # The last reference may continue in the next chunk
+            carried = chunk[ampersand:]
+            chunk = chunk[:ampersand]
+        yield INVALID_ENTITY_REFERENCE.sub(escape_entity_reference, chunk)
+    if carried:
+        yield INVALID_ENTITY_REFERENCE.sub(escape_entity_reference, carried)
+
+class YandexResponseTarget:
+    '''
+    Target of xml.etree.ElementTree.XMLParser receiving the XML response of Yandex as a stream of events
+    No tree is built, only the texts of the fields of the doc element being read are kept,
+    and a ResultItem is built every time a doc element is closed
+    '''
+    # Elements of a doc whose texts are read, the first one of each in the doc is used
+    FIELDS = frozenset(["url", "title", "modtime", "headline", "passages", "lang"])
+
+    def __init__(self):
+        # ResultItems built from the doc elements closed since the last pop_results
+        self.results: list = []
+        self.rank: int = 1
+        # field name -> text of the doc being read, None outside of the doc elements
+        self.doc: dict = None
+        # Field being read and its texts
+        self.field: str = None
+        self.texts: list = []
+
+    def start(self, tag: str, attrib: dict):
+        if tag == "doc":
+            self.doc = {}
+        elif self.doc is not None and self.field is None and tag in YandexResponseTarget.FIELDS and tag not in self.doc:
+            self.field = tag
+            self.texts = []
+
+    def data(self, data: str):
+        if self.field is not None:
+            self.texts.append(data)
+
+    def end(self, tag: str):
+        if tag == self.field:
+            self.doc[tag] = "".join(self.texts)
+            self.field = None
+        elif tag == "doc" and self.doc is not None:
+            self.finish_doc(self.doc)
+            self.doc = None
+
+    def finish_doc(self, doc: dict):
+        # The docs without the title or the URL are skipped
+        if "title" not in doc or "url" not in doc:
+            return
+        # Use the passages, or the headline if the doc has no passages
+        passage: str = doc["passages"] if "passages" in doc else doc.get("headline", "")
         item: ResultItem = create_ResultItem(
-            ''.join(doc.iter('title').__next__().itertext()).replace('\n', '').replace('  ', '').replace('&', '&amp;'),
-            doc.iter('url').__next__().text.replace('\n', ''),
-            doc.iter('modtime').__next__().text,
-            replace_and_from(passage),
-            doc[8][1].text,
-            doc_count
+            doc["title"].replace('\n', '').replace('  ', ''),
+            doc["url"].replace('\n', ''),
+            doc.get("modtime"),
+            passage,
+            doc.get("lang"),
+            self.rank
         )
-        doc_count = doc_count + 1
-        results.append(item)
+        self.rank = self.rank + 1
+        self.results.append(item)
+
+    def pop_results(self) -> list:
+        results: list = self.results
+        self.results = []
+        return results
 
-    return results
+    def close(self):
+        return None
+
+def read_result_items(chunks, max_results: int = None):
+    '''
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of the XML response of Yandex in bytes
+        ex. iterate_chunks(b'<?xml version="1.0" encoding="utf-8"?><yandexsearch version="1.0">...</yandexsearch>')
+    max_results : int
+        maximum number of the search results to read, the rest of the response isn't parsed
+        ex. 10
+
+    Yields
+    ----------
+    item : ResultItem
+        The search result of every doc element, as soon as the element is closed
+    '''
+    target = YandexResponseTarget()
+    parser = xml.etree.ElementTree.XMLParser(target=target)
+    count: int = 0
+    for chunk in escape_ampersands(chunks):
+        parser.feed(chunk)
+        for item in target.pop_results():
+            yield item
+            count = count + 1
+            if max_results is not None and count >= max_results:
+                return
+    parser.close()
+    for item in target.pop_results()[:None if max_results is None else max_results - count]:
+        yield item
 
 def create_ResultItem(title: str, url: str, modtime: str, passages: str, lang: str, rank: int) -> ResultItem:
     item: ResultItem = ResultItem(title, url, "Yandex")
@@ -92,16 +237,43 @@ def create_ResultItem(title: str, url: str, modtime: str, passages: str, lang: s
     item.set_abstract(passages)
     return item
 
-def replace_and_from(item: str) -> str:
-    return item.replace('&', '&amp;')
+def yandexSearch(query: str, timeout: float = None, max_results: int = None) -> list:
+    # number of search results to return
+    num_results = 10
+    # get the xml response from the API in bytes, or the response cached a while ago
+    def retrieve() -> tuple:
+        # Wait only if the requests to Yandex are thrown faster than the rate limit,
+        # and give up if the request couldn't be answered within the timeout after waiting
+        waited: float = get_rate_limiter("Yandex").acquire(timeout=timeout)
+        # Then reserve a query from the daily quota shared by the workers, QuotaExceeded is raised near the limit
+        # No query is spent on a request given up while waiting, and the ledger waits for the other workers only for the time left
+        get_quota_ledger().reserve_or_raise("Yandex", timeout=get_time_left(timeout, waited))
+        return (request_get_content(build_search_url(query, num_results), timeout), 'utf-8')
+    payload, encoding = get_response_cache().fetch("Yandex", query, {"groups": num_results}, retrieve)
+    # read the response chunk by chunk and summarize every doc as ResultItem
+    return list(read_result_items(iterate_chunks(payload), max_results))
 
-def yandexSearch(query: str) -> list:
+async def yandexSearchAsync(query: str, session: aiohttp.ClientSession, timeout: float = None, max_results: int = None) -> list:
     # number of search results to return
     num_results = 10
+    # get the xml response from the API through the given session, or the response cached a while ago
+    async def retrieve() -> tuple:
+        # Wait for the rate limit first, no query is spent on a request given up while waiting
+        waited: float = await get_rate_limiter("Yandex").acquire_async(timeout=timeout)
+        # The ledger may wait for the other workers holding the database, so it's called on the default executor
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(get_quota_ledger().reserve_or_raise, "Yandex", timeout=get_time_left(timeout, waited))
+        )
+        return (await request_get_content_async(build_search_url(query, num_results), session, timeout), 'utf-8')
+    payload, encoding = await get_response_cache().fetch_async("Yandex", query, {"groups": num_results}, retrieve)
+    # read the response chunk by chunk and summarize every doc as ResultItem, on the default executor not to block the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: list(read_result_items(iterate_chunks(payload), max_results)))
+
+def build_search_url(query: str, num_results: int) -> str:
     # adjust the query if it contains space in the string
     query = query.replace(' ', '+')
     # construct the url to make a request
-    url_to_access: str = build_url(
+    return build_url(
         query,
         LANG["English"],
         SORTBY["relevancy"],
@@ -109,14 +281,6 @@ def yandexSearch(query: str) -> list:
         5,
         num_results
     )
-    # get the xml response from the API in string
-    xml_data: str = replace_and_from(request_get(url_to_access))
-    # build the xml tree by analyzing its structure
-    xml_tree_root = analyze_xml(xml_data)
-    # summarize the result as ResultItem and build the list of results
-    response: list = push_into_ResultItems(xml_tree_root, num_results)
-
-    return response
         
         
 if __name__ == '__main__':
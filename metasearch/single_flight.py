@@ -0,0 +1,291 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from django.conf import settings
+
+# File locks are used to coalesce the searches across the worker processes, only available on POSIX
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Number of the lock files the keys are spread over
+DEFAULTLOCKSTRIPES = 256
+
+class SingleFlightCall:
+    # A call in flight shared by the threads asking for the same key
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception: Exception = None
+
+class SingleFlight:
+    '''
+    Coalesces the identical calls in flight in this process:
+    while a call for a key is running, the other callers for the same key wait for it and get the same result
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> SingleFlightCall for the calls from threads
+        self.calls: dict = {}
+        # (event loop, key) -> asyncio.Task for the calls from coroutines
+        self.tasks: dict = {}
+        # Counters
+        self.leaders: int = 0
+        self.followers: int = 0
+
+    def do(self, key: str, function):
+        '''
+        Parameters
+        ----------
+        key : str
+            key identifying the identical calls
+            ex. "hello world"
+        function : function
+            function without arguments to call if no call for the key is in flight
+
+        Returns
+        ----------
+        result :
+            the value returned by the function called by the first caller for the key
+            The exception raised by the function is raised for all the callers
+        '''
+        with self.lock:
+            call: SingleFlightCall = self.calls.get(key)
+            is_leader: bool = call is None
+            if is_leader:
+                call = SingleFlightCall()
+                self.calls[key] = call
+                self.leaders = self.leaders + 1
+            else:
+                self.followers = self.followers + 1
+
+        if not is_leader:
+            # Wait for the call made by the first caller
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: str, coroutine_function):
+        '''
+        Asynchronous version of do, coroutine_function is a coroutine function without arguments
+        The calls are coalesced among the coroutines running on the same event loop
+        '''
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            task: asyncio.Task = self.tasks.get((loop, key))
+            if task is None:
+                task = loop.create_task(coroutine_function())
+                self.tasks[(loop, key)] = task
+                task.add_done_callback(lambda done_task: self.forget_task(loop, key))
+                self.leaders = self.leaders + 1
+            else:
+                self.followers = self.followers + 1
+        # Shield the shared task so that a cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(task)
+
+    def forget_task(self, loop, key: str):
+        with self.lock:
+            del self.tasks[(loop, key)]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "in_flight": len(self.calls) + len(self.tasks),
+                "leaders": self.leaders,
+                "followers": self.followers,
+            }
+
+class WorkerLockFiles:
+    '''
+    Fixed set of lock files shared by the worker processes, opened once per process
+    A key is locked through the file of its stripe, so the directory never holds more than `stripes` files
+    however many queries are searched, and the files can be kept forever.
+    The keys of a stripe share the lock: a worker may wait for a search of another query having the same stripe,
+    which is rare with enough stripes. The threads of a process share the open files, so a stripe is locked
+    by the process while any of its threads holds it (the identical searches in a process are coalesced by SingleFlight)
+    '''
+
+    def __init__(self, directory: str, stripes: int = DEFAULTLOCKSTRIPES):
+        self.directory: str = directory
+        self.stripes: int = stripes
+        self.lock = threading.Lock()
+        # Process which opened the files, the files inherited by a forked process are opened again
+        self.pid: int = None
+        # stripe -> file object, and stripe -> number of the threads of this process holding it
+        self.files: dict = {}
+        self.holders: dict = {}
+
+    def get_stripe(self, key: str) -> int:
+        # The same in every process, unlike hash() which is salted per process
+        return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], "big") % self.stripes
+
+    def get_path(self, stripe: int) -> str:
+        return os.path.join(self.directory, str(stripe) + ".lock")
+
+    def try_acquire(self, stripe: int) -> bool:
+        '''
+        Returns
+        ----------
+        acquired : bool
+            True if the stripe is locked by this process, False if another worker holds it
+            None if the lock can't be used (without fcntl, or if the file can't be opened), the search goes on without it
+        '''
+        if fcntl is None:
+            return None
+        with self.lock:
+            if self.pid != os.getpid():
+                # The locks of the files opened by the parent process would be shared with it
+                for file in self.files.values():
+                    file.close()
+                self.files = {}
+                self.holders = {}
+                self.pid = os.getpid()
+            if self.holders.get(stripe, 0) > 0:
+                self.holders[stripe] = self.holders[stripe] + 1
+                return True
+            file = self.files.get(stripe)
+            if file is None:
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    file = open(self.get_path(stripe), mode='a')
+                except OSError as e:
+                    print("[ERROR LOG] In WorkerLockFiles, failed to open the lock file: " + repr(e))
+                    return None
+                self.files[stripe] = file
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.holders[stripe] = 1
+            return True
+
+    def release(self, stripe: int):
+        with self.lock:
+            if self.holders.get(stripe, 0) == 0:
+                return
+            self.holders[stripe] = self.holders[stripe] - 1
+            if self.holders[stripe] == 0:
+                # The file stays open for the next search of the stripe
+                fcntl.flock(self.files[stripe].fileno(), fcntl.LOCK_UN)
+
+class WorkerLock:
+    '''
+    Exclusive lock for a key shared by the worker processes, held on the file of its stripe (see WorkerLockFiles)
+    While a worker holds it, the other workers wait (up to the timeout) before making the same search,
+    so that they find the raw responses in the response cache on the disk instead of throwing the same requests again
+    Without fcntl (non-POSIX systems), it's always acquired immediately
+    '''
+    POLLINTERVAL = 0.02
+    # Seconds given to the search after waiting for the lock, enough to read the responses cached by the other worker
+    MINIMUMBUDGET = 0.1
+
+    def __init__(self, lock_files: WorkerLockFiles, key: str, timeout: float = None):
+        self.lock_files: WorkerLockFiles = lock_files
+        self.stripe: int = lock_files.get_stripe(key)
+        self.path: str = lock_files.get_path(self.stripe)
+        self.timeout: float = timeout
+        self.locked: bool = False
+
+    def try_acquire(self) -> bool:
+        # Returns True if the lock is acquired (or can't be used), False if another worker holds it
+        if self.locked:
+            return True
+        acquired: bool = self.lock_files.try_acquire(self.stripe)
+        if acquired is None:
+            return True
+        self.locked = acquired
+        return acquired
+
+    def is_timed_out(self, started_at: float) -> bool:
+        return self.timeout is not None and time.monotonic() - started_at >= self.timeout
+
+    def acquire(self) -> float:
+        '''
+        Returns
+        ----------
+        remaining : float
+            The seconds left of the timeout after waiting, so that the search doesn't take another whole budget,
+            at least MINIMUMBUDGET, None without the timeout
+            It gives up waiting after the timeout and continues without the lock
+        '''
+        started_at: float = time.monotonic()
+        while not self.try_acquire() and not self.is_timed_out(started_at):
+            time.sleep(WorkerLock.POLLINTERVAL)
+        return self.get_remaining(started_at)
+
+    async def acquire_async(self) -> float:
+        started_at: float = time.monotonic()
+        while not self.try_acquire() and not self.is_timed_out(started_at):
+            await asyncio.sleep(WorkerLock.POLLINTERVAL)
+        return self.get_remaining(started_at)
+
+    def get_remaining(self, started_at: float) -> float:
+        if self.timeout is None:
+            return None
+        return max(self.timeout - (time.monotonic() - started_at), WorkerLock.MINIMUMBUDGET)
+
+    def release(self):
+        # Only a holder unlocks the stripe, a waiter which gave up leaves it to the holder
+        if not self.locked:
+            return
+        self.lock_files.release(self.stripe)
+        self.locked = False
+
+# Coalescing of the searches shared by all requests handled by this process
+single_flight: SingleFlight = SingleFlight()
+
+def get_single_flight() -> SingleFlight:
+    return single_flight
+
+# Lock files of this process by the lock directory
+worker_lock_files: dict = {}
+worker_lock_files_lock = threading.Lock()
+
+def get_worker_lock_files(directory: str) -> WorkerLockFiles:
+    with worker_lock_files_lock:
+        lock_files: WorkerLockFiles = worker_lock_files.get(directory)
+        if lock_files is None:
+            lock_files = WorkerLockFiles(directory, getattr(settings, "METASEARCH_SINGLE_FLIGHT_LOCK_STRIPES", DEFAULTLOCKSTRIPES))
+            worker_lock_files[directory] = lock_files
+        return lock_files
+
+def get_worker_lock(key: str) -> WorkerLock:
+    '''
+    Parameters
+    ----------
+    key : str
+        key identifying the identical searches
+        ex. "hello world"
+
+    Returns
+    ----------
+    worker_lock : WorkerLock
+        lock shared by the workers for the key, waiting up to settings.METASEARCH_REQUEST_TIMEOUT
+        or None if the coalescing across the workers is disabled by settings.METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS
+        or if the response cache (which the waiting workers read) is disabled
+    '''
+    if not getattr(settings, "METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS", True):
+        return None
+    if not getattr(settings, "METASEARCH_RESPONSE_CACHE_ENABLED", True):
+        return None
+    return WorkerLock(
+        get_worker_lock_files(getattr(settings, "METASEARCH_SINGLE_FLIGHT_LOCK_DIR", os.path.join(settings.BASE_DIR, "response_cache", "locks"))),
+        key,
+        getattr(settings, "METASEARCH_REQUEST_TIMEOUT", None)
+    )
@@ -1,2 +1,12 @@
 from metasearch.tests.unit_test.model import ResultItemModelTests
 from metasearch.tests.unit_test.view import *
+from metasearch.tests.unit_test.cache import *
+from metasearch.tests.unit_test.concurrency import *
+from metasearch.tests.unit_test.quota import *
+from metasearch.tests.unit_test.transport import *
+from metasearch.tests.unit_test.classification import *
+from metasearch.tests.unit_test.deduplication import *
+from metasearch.tests.unit_test.result_set import *
+from metasearch.tests.unit_test.timing import *
+from metasearch.tests.unit_test.metrics import *
+from metasearch.tests.unit_test.profiling import *
\ No newline at end of file
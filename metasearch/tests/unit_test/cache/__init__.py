@@ -0,0 +1,2 @@
+from metasearch.tests.unit_test.cache.result_cache import ResultCacheTests
+from metasearch.tests.unit_test.cache.response_cache import ResponseCacheTests
\ No newline at end of file
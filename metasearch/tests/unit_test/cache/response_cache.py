@@ -0,0 +1,165 @@
+import time
+import asyncio
+import tempfile
+import threading
+import aiohttp
+import requests
+from unittest.mock import Mock, patch
+from django.test import TestCase
+from metasearch.search_modules.response_cache import ResponseCache
+from metasearch.search_modules.duckduckgo_search_module import duckduckgoSearch, duckduckgoSearchAsync
+from metasearch.search_modules.yahoo_search_module import yahooSearch, yahooSearchAsync
+
+TEST_DATA_DIR = 'metasearch/tests/unit_test/view/scraping_modules/duckduckgo/test_data/'
+
+def make_error_response(status: int):
+  # requests.Response of an error page, as returned after the retries of the transport
+  response = requests.Response()
+  response.status_code = status
+  response.url = "https://search.yahoo.com/search?p=query"
+  response._content = b"<html>Service Unavailable</html>"
+  return response
+
+class MockAsyncResponse:
+  # Response of an aiohttp session with the given status
+  def __init__(self, status: int):
+    self.status: int = status
+    self.charset: str = "utf-8"
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    return False
+
+  def raise_for_status(self):
+    if self.status >= 400:
+      raise aiohttp.ClientResponseError(Mock(), (), status=self.status)
+
+  async def read(self) -> bytes:
+    return b"<html>Service Unavailable</html>"
+
+  async def text(self, encoding: str = None) -> str:
+    return "<html>Service Unavailable</html>"
+
+class ResponseCacheTests(TestCase):
+
+  def setUp(self):
+    self.cache_dir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.cache_dir.cleanup()
+
+  def test_cached_response_persists_across_instances(self):
+    cache = ResponseCache(self.cache_dir.name)
+    self.assertEqual(None, cache.get("Yandex", "hello world", {"groups": 10}))
+    cache.put("Yandex", "hello world", {"groups": 10}, b"<yandexsearch/>", "utf-8")
+    # Another instance (e.g. after a restart or in another worker) reads the same entry from the disk
+    restarted_cache = ResponseCache(self.cache_dir.name)
+    self.assertEqual((b"<yandexsearch/>", "utf-8"), restarted_cache.get("Yandex", "Hello  World", {"groups": 10}))
+    # The entries are separated by the engine and the parameters
+    self.assertEqual(None, restarted_cache.get("Google", "hello world", {"groups": 10}))
+    self.assertEqual(None, restarted_cache.get("Yandex", "hello world", {"groups": 20}))
+
+  def test_cached_response_expires_by_ttl_of_engine(self):
+    cache = ResponseCache(self.cache_dir.name, ttls={"Yahoo!": 0.05, "DuckDuckGo": 60})
+    cache.put("Yahoo!", "query", {}, b"<html/>", None)
+    cache.put("DuckDuckGo", "query", {}, b"<html/>", "utf-8")
+    time.sleep(0.1)
+    self.assertEqual(None, cache.get("Yahoo!", "query", {}))
+    self.assertEqual((b"<html/>", "utf-8"), cache.get("DuckDuckGo", "query", {}))
+    # Expired entries are removed from the disk by purging
+    cache.purge_expired()
+    self.assertEqual(["DuckDuckGo"], [header["engine"] for header, payload in cache.entries()])
+
+  def test_fetch_retrieves_only_when_not_cached(self):
+    cache = ResponseCache(self.cache_dir.name)
+    retrieved: list = []
+    def retrieve() -> tuple:
+      retrieved.append(1)
+      return (b"{}", "utf-8")
+    self.assertEqual((b"{}", "utf-8"), cache.fetch("Google", "query", {"num": 10, "start": 1}, retrieve))
+    self.assertEqual((b"{}", "utf-8"), cache.fetch("Google", "query", {"num": 10, "start": 1}, retrieve))
+    self.assertEqual(1, len(retrieved))
+    self.assertEqual({"enabled": True, "hits": 1, "misses": 1}, cache.get_stats())
+
+  def test_search_module_parses_cached_response_without_request(self):
+    cache = ResponseCache(self.cache_dir.name)
+    with open(TEST_DATA_DIR + 'sample_page_01.html', mode='r') as f:
+      cache.put("DuckDuckGo", "nagorno-karabakh conflict", {}, f.read().encode('utf-8'), "utf-8")
+    with patch('metasearch.search_modules.duckduckgo_search_module.get_response_cache', return_value=cache):
+      with patch('metasearch.search_modules.duckduckgo_search_module.retrieve_result_page', side_effect=AssertionError("request thrown")):
+        results: list = duckduckgoSearch("Nagorno-Karabakh conflict")
+    self.assertEqual(10, len(results))
+    self.assertEqual("https://en.wikipedia.org/wiki/Nagorno-Karabakh_conflict", results[0].get_url())
+
+  def test_purge_reads_only_the_headers(self):
+    cache = ResponseCache(self.cache_dir.name, ttls={"Yahoo!": 0.05, "DuckDuckGo": 60})
+    cache.put("Yahoo!", "query", {}, b"<html/>" * 1000, "utf-8")
+    cache.put("DuckDuckGo", "query", {}, b"<html/>", "utf-8")
+    time.sleep(0.1)
+    with patch('metasearch.search_modules.response_cache.read_entry', side_effect=AssertionError("payload read")):
+      self.assertEqual(1, cache.purge_expired())
+    self.assertEqual(["DuckDuckGo"], [header["engine"] for header, payload in cache.entries()])
+
+  def test_purge_runs_in_the_background_after_the_interval(self):
+    cache = ResponseCache(self.cache_dir.name, ttls={"Yahoo!": 0.05}, purge_interval=0.1)
+    cache.put("Yahoo!", "query 1", {}, b"<html/>", "utf-8")
+    purge_threads: list = []
+    purged = threading.Event()
+    def purge_expired() -> int:
+      purge_threads.append(threading.get_ident())
+      purged.set()
+      return 0
+    time.sleep(0.15)
+    with patch.object(cache, 'purge_expired', purge_expired):
+      cache.put("Yahoo!", "query 2", {}, b"<html/>", "utf-8")
+      self.assertTrue(purged.wait(1.0))
+      # the next purge waits for the interval
+      cache.put("Yahoo!", "query 3", {}, b"<html/>", "utf-8")
+    self.assertEqual(1, len(purge_threads))
+    self.assertNotEqual(threading.get_ident(), purge_threads[0])
+
+  def test_fetch_async_reads_and_writes_off_the_event_loop(self):
+    cache = ResponseCache(self.cache_dir.name)
+    file_threads: list = []
+    get, put = cache.get, cache.put
+    def get_on_thread(*args):
+      file_threads.append(threading.get_ident())
+      return get(*args)
+    def put_on_thread(*args):
+      file_threads.append(threading.get_ident())
+      return put(*args)
+    async def retrieve() -> tuple:
+      return (b"{}", "utf-8")
+    async def fetch() -> tuple:
+      return (threading.get_ident(), await cache.fetch_async("Google", "query", {"num": 10, "start": 1}, retrieve))
+    with patch.object(cache, 'get', get_on_thread), patch.object(cache, 'put', put_on_thread):
+      loop_thread, response = asyncio.run(fetch())
+    self.assertEqual((b"{}", "utf-8"), response)
+    self.assertEqual(2, len(file_threads))
+    self.assertNotIn(loop_thread, file_threads)
+
+  def test_error_page_is_not_cached(self):
+    # A 503 page fails the search, so that the engine is reported as dropped and the page is retrieved again next time
+    cache = ResponseCache(self.cache_dir.name)
+    session = Mock()
+    session.get.return_value = make_error_response(503)
+    with patch('metasearch.search_modules.yahoo_search_module.get_response_cache', return_value=cache), \
+      patch('metasearch.search_modules.yahoo_search_module.get_http_session', return_value=session):
+      with self.assertRaises(requests.HTTPError):
+        yahooSearch("query")
+    self.assertEqual(None, cache.get("Yahoo!", "query", {}))
+
+    async_session = Mock()
+    async_session.get.return_value = MockAsyncResponse(503)
+    async_session.post.return_value = MockAsyncResponse(503)
+    with patch('metasearch.search_modules.yahoo_search_module.get_response_cache', return_value=cache), \
+      patch('metasearch.search_modules.duckduckgo_search_module.get_response_cache', return_value=cache):
+      with self.assertRaises(aiohttp.ClientResponseError):
+        asyncio.run(yahooSearchAsync("query", async_session))
+      with self.assertRaises(aiohttp.ClientResponseError):
+        asyncio.run(duckduckgoSearchAsync("query", async_session))
+    self.assertEqual(None, cache.get("Yahoo!", "query", {}))
+    self.assertEqual(None, cache.get("DuckDuckGo", "query", {}))
+    self.assertEqual([], list(cache.entries()))
\ No newline at end of file
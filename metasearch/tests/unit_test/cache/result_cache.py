@@ -0,0 +1,90 @@
+import time
+from unittest.mock import patch
+from django.test import TestCase
+from metasearch.models import ResultItem
+from metasearch.result_cache import ResultCache, estimate_size_of
+from concurrent.futures import Future
+from metasearch.search_modules.quota_ledger import QuotaExceeded
+from metasearch.views import cache_search_results, merge_search_results_of_engines
+
+class ResultCacheTests(TestCase):
+
+  def test_get_returns_cached_results_for_normalized_query(self):
+    cache = ResultCache()
+    results = [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)]
+    # [Miss] nothing is cached yet
+    self.assertEqual(None, cache.get("Hello World"))
+    cache.put("Hello World", results)
+    # [Hit] the same query with the different cases and spaces
+    self.assertEqual(results, cache.get("  hello   world "))
+    self.assertEqual(1, cache.get_stats()["hits"])
+    self.assertEqual(1, cache.get_stats()["misses"])
+
+  def test_get_does_not_return_expired_results(self):
+    cache = ResultCache(ttl=0.05)
+    cache.put("query", [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)])
+    time.sleep(0.1)
+    self.assertEqual(None, cache.get("query"))
+    self.assertEqual(1, cache.get_stats()["expirations"])
+    self.assertEqual(0, cache.get_stats()["entries"])
+
+  def test_put_evicts_least_recently_used_results_over_byte_budget(self):
+    items = [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)]
+    # Room for exactly 2 entries of the same size
+    cache = ResultCache(max_bytes=estimate_size_of("query 1", items) * 2)
+    cache.put("query 1", items)
+    cache.put("query 2", items)
+    # Use "query 1" so that "query 2" becomes the least recently used one
+    cache.get("query 1")
+    cache.put("query 3", items)
+    self.assertNotEqual(None, cache.get("query 1"))
+    self.assertEqual(None, cache.get("query 2"))
+    self.assertNotEqual(None, cache.get("query 3"))
+    self.assertEqual(1, cache.get_stats()["evictions"])
+    self.assertLessEqual(cache.get_stats()["bytes"], cache.get_stats()["max_bytes"])
+
+  def test_disabled_cache_does_not_store_results(self):
+    cache = ResultCache(enabled=False)
+    cache.put("query", [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)])
+    self.assertEqual(None, cache.get("query"))
+    self.assertEqual(0, cache.get_stats()["entries"])
+
+  def test_put_keeps_the_dropped_engines_with_the_results(self):
+    cache = ResultCache()
+    results = [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)]
+    cache.put("query", results, ttl=0.05, dropped_engines=["Yandex"])
+    dropped_engines: list = []
+    self.assertEqual(results, cache.get("query", dropped_engines))
+    self.assertEqual(["Yandex"], dropped_engines)
+    # the given TTL is used instead of the TTL of the cache
+    time.sleep(0.1)
+    self.assertEqual(None, cache.get("query"))
+
+  def test_partial_results_are_cached_for_a_short_while(self):
+    cache = ResultCache(ttl=300, partial_ttl=0.05)
+    results = [ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)]
+    with patch('metasearch.views.get_result_cache', return_value=cache):
+      # Yahoo! failed, so it's asked again soon
+      cache_search_results("query 1", results, ["Yahoo!"], [])
+      # Google is out of its daily quota, it can't answer until the quota is reset
+      cache_search_results("query 2", results, ["Google"], ["Google"])
+      cache_search_results("query 3", results, [], [])
+    time.sleep(0.1)
+    self.assertEqual(None, cache.get("query 1"))
+    dropped_engines: list = []
+    self.assertEqual(results, cache.get("query 2", dropped_engines))
+    self.assertEqual(["Google"], dropped_engines)
+    self.assertEqual(results, cache.get("query 3"))
+
+  def test_engines_out_of_quota_are_told_apart_from_the_failures(self):
+    futures: list = [Future() for i in range(4)]
+    futures[0].set_result([ResultItem("Article 1", "http://www.example1.com/example", "Google", 1)])
+    futures[1].set_exception(ConnectionError("mock connection error"))
+    futures[2].set_result([])
+    futures[3].set_exception(QuotaExceeded("Yandex", 0))
+    dropped_engines: list = []
+    exhausted_engines: list = []
+    results: list = merge_search_results_of_engines(futures, 1.0, dropped_engines, exhausted_engines)
+    self.assertEqual(1, len(results))
+    self.assertEqual(["Yahoo!", "Yandex"], dropped_engines)
+    self.assertEqual(["Yandex"], exhausted_engines)
\ No newline at end of file
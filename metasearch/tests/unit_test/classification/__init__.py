@@ -0,0 +1 @@
+from metasearch.tests.unit_test.classification.domain_categories import DomainCategoryRegistryTests
\ No newline at end of file
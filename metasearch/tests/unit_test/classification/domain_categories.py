@@ -0,0 +1,108 @@
+import os
+import json
+import tempfile
+import threading
+from django.test import TestCase
+from metasearch.domain_categories import (
+  DEFAULTPATH,
+  ENCYCLOPEDIA,
+  FAMOUS_NEWS_AGENCIES,
+  ONLINE_NEWS_AGENCIES,
+  PORTALS_AND_BLOGS,
+  DomainCategoryRegistry,
+  compile_domain_categories,
+  load_domain_categories
+)
+
+def make_data(version: int, encyclopedia_domains: list) -> dict:
+  return {
+    "version": version,
+    "categories": [
+      {"name": "Encyclopedia", "domains": encyclopedia_domains},
+      {"name": "Famous News Agencies", "domains": ["reuters.com", "example.org"]}
+    ],
+    "removed_domains": ["youtube.com"]
+  }
+
+class DomainCategoryRegistryTests(TestCase):
+
+  def setUp(self):
+    self.data_dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.data_dir.name, "domain_categories.json")
+
+  def tearDown(self):
+    self.data_dir.cleanup()
+
+  def write_data(self, data):
+    # Replace the file at once, as a deployment would
+    with open(self.path + ".tmp", mode='w') as f:
+      f.write(data if isinstance(data, str) else json.dumps(data))
+    os.replace(self.path + ".tmp", self.path)
+
+  def test_bundled_data_file(self):
+    categories = load_domain_categories(DEFAULTPATH)
+    self.assertEqual(ENCYCLOPEDIA, categories.classify("wikipedia.org"))
+    self.assertEqual(FAMOUS_NEWS_AGENCIES, categories.classify("akipress.com"))
+    self.assertEqual(ONLINE_NEWS_AGENCIES, categories.classify("inquirer.net"))
+    self.assertEqual(PORTALS_AND_BLOGS, categories.classify("example.com"))
+    self.assertTrue(categories.is_removed("youtube.com"))
+    # The data file has no domain listed twice
+    with open(DEFAULTPATH, mode='r', encoding='utf-8') as f:
+      data: dict = json.load(f)
+    for category in data["categories"]:
+      self.assertEqual(len(category["domains"]), len(set(category["domains"])), category["name"])
+
+  def test_compile_removes_duplicates(self):
+    categories = compile_domain_categories(make_data(1, ["wikipedia.org", "example.org", "Wikipedia.org"]))
+    self.assertEqual(("wikipedia.org", "example.org"), categories.get_domains(ENCYCLOPEDIA))
+    # A domain listed in several categories belongs to the first one
+    self.assertEqual(ENCYCLOPEDIA, categories.classify("example.org"))
+    self.assertEqual(FAMOUS_NEWS_AGENCIES, categories.classify("reuters.com"))
+    with self.assertRaises(ValueError):
+      compile_domain_categories({"version": 1, "categories": [{"name": "Unknown", "domains": []}]})
+    with self.assertRaises(ValueError):
+      compile_domain_categories({"categories": []})
+
+  def test_reload_when_file_changes(self):
+    self.write_data(make_data(1, ["wikipedia.org"]))
+    registry = DomainCategoryRegistry(self.path, check_interval=0.0)
+    first = registry.get()
+    self.assertEqual(1, first.version)
+    self.write_data(make_data(2, ["wikipedia.org", "britannica.com"]))
+    second = registry.get()
+    self.assertEqual(2, second.version)
+    self.assertEqual(ENCYCLOPEDIA, second.classify("britannica.com"))
+    # The contents held by a search in flight are not modified
+    self.assertEqual(PORTALS_AND_BLOGS, first.classify("britannica.com"))
+    # Not reloaded while the file is unchanged
+    self.assertIs(second, registry.get())
+
+  def test_broken_file_is_ignored(self):
+    self.write_data(make_data(1, ["wikipedia.org"]))
+    registry = DomainCategoryRegistry(self.path, check_interval=0.0)
+    self.write_data('{"version": 2, "categories": [')
+    self.assertEqual(1, registry.get().version)
+    self.write_data(make_data(3, ["wikipedia.org"]))
+    self.assertEqual(3, registry.get().version)
+
+  def test_check_interval(self):
+    self.write_data(make_data(1, ["wikipedia.org"]))
+    registry = DomainCategoryRegistry(self.path, check_interval=3600.0)
+    self.write_data(make_data(2, ["wikipedia.org"]))
+    self.assertEqual(1, registry.get().version)
+
+  def test_searches_do_not_wait_for_reload(self):
+    self.write_data(make_data(1, ["wikipedia.org"]))
+    registry = DomainCategoryRegistry(self.path, check_interval=0.0)
+    self.write_data(make_data(2, ["wikipedia.org"]))
+    # While another thread is checking the file, the current contents are returned at once
+    registry.reload_lock.acquire()
+    try:
+      results: list = []
+      thread = threading.Thread(target=lambda: results.append(registry.get().version))
+      thread.start()
+      thread.join(timeout=5.0)
+      self.assertEqual([1], results)
+    finally:
+      registry.reload_lock.release()
+    self.assertEqual(2, registry.get().version)
@@ -0,0 +1 @@
+from metasearch.tests.unit_test.concurrency.single_flight import SingleFlightTests
\ No newline at end of file
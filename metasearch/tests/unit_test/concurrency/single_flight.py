@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from metasearch.models import ResultItem
+from metasearch.single_flight import SingleFlight, WorkerLock, WorkerLockFiles
+from metasearch.views import metasearch, run_metasearch
+
+class MockCountingSearchModule:
+  calls: list = []
+
+  def mock_slow_search(self, timeout: float = None, max_results: int = None) -> list:
+    MockCountingSearchModule.calls.append(self)
+    time.sleep(0.2)
+    return [ResultItem("Article 01", "https://www.example1.com", "Google", 1)]
+
+class SingleFlightTests(TestCase):
+
+  def test_do_calls_function_once_for_concurrent_identical_keys(self):
+    single_flight = SingleFlight()
+    calls: list = []
+    def function() -> list:
+      calls.append(1)
+      time.sleep(0.2)
+      return ["result"]
+    results: list = []
+    threads: list = [threading.Thread(target=lambda: results.append(single_flight.do("key", function))) for i in range(0, 5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(1, len(calls))
+    self.assertEqual([["result"]] * 5, results)
+    self.assertEqual({"in_flight": 0, "leaders": 1, "followers": 4}, single_flight.get_stats())
+
+  def test_do_raises_exception_of_function(self):
+    single_flight = SingleFlight()
+    def function():
+      raise ConnectionError("mock connection error")
+    with self.assertRaises(ConnectionError):
+      single_flight.do("key", function)
+    # The failed call is not kept
+    self.assertEqual(0, single_flight.get_stats()["in_flight"])
+
+  def test_do_async_calls_coroutine_function_once_for_concurrent_identical_keys(self):
+    single_flight = SingleFlight()
+    calls: list = []
+    async def coroutine_function() -> str:
+      calls.append(1)
+      await asyncio.sleep(0.1)
+      return "result"
+    async def search_concurrently() -> list:
+      return await asyncio.gather(*[single_flight.do_async("key", coroutine_function) for i in range(0, 5)])
+    results: list = async_to_sync(search_concurrently)()
+    self.assertEqual(1, len(calls))
+    self.assertEqual(["result"] * 5, results)
+
+  def test_worker_lock_waits_for_another_holder_until_timeout(self):
+    with tempfile.TemporaryDirectory() as lock_dir:
+      # The lock files opened by two worker processes
+      holder_files, waiter_files = WorkerLockFiles(lock_dir), WorkerLockFiles(lock_dir)
+      holder = WorkerLock(holder_files, "key")
+      self.assertTrue(holder.try_acquire())
+      waiter = WorkerLock(waiter_files, "key", timeout=0.1)
+      self.assertFalse(waiter.try_acquire())
+      # Another key is not blocked
+      self.assertTrue(WorkerLock(waiter_files, "another key").try_acquire())
+      # It gives up waiting after the timeout, leaving only the minimum budget to the search
+      started_at: float = time.monotonic()
+      self.assertEqual(WorkerLock.MINIMUMBUDGET, waiter.acquire())
+      self.assertGreaterEqual(time.monotonic() - started_at, 0.1)
+      # The waiter which gave up doesn't remove the lock of the holder
+      waiter.release()
+      self.assertFalse(WorkerLock(waiter_files, "key").try_acquire())
+      holder.release()
+      self.assertTrue(WorkerLock(waiter_files, "key").try_acquire())
+
+  @override_settings(METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=False)
+  @patch('metasearch.search_modules.google_search_module.googleSearch', MockCountingSearchModule.mock_slow_search)
+  @patch('metasearch.search_modules.yahoo_search_module.yahooSearch', MockCountingSearchModule.mock_slow_search)
+  @patch('metasearch.search_modules.duckduckgo_search_module.duckduckgoSearch', MockCountingSearchModule.mock_slow_search)
+  @patch('metasearch.search_modules.yandex_search_module.yandexSearch', MockCountingSearchModule.mock_slow_search)
+  def test_metasearch_coalesces_identical_concurrent_searches(self):
+    MockCountingSearchModule.calls = []
+    results: list = []
+    threads: list = [threading.Thread(target=lambda: results.append(metasearch("single flight test query"))) for i in range(0, 5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    # Only one fan-out to the 4 search engines happened
+    self.assertEqual(4, len(MockCountingSearchModule.calls))
+    self.assertEqual(5, len(results))
+    for result in results:
+      self.assertEqual([str(item) for item in results[0]], [str(item) for item in result])
+
+  def test_worker_lock_file_is_kept_for_the_waiting_workers(self):
+    with tempfile.TemporaryDirectory() as lock_dir:
+      holder_files, waiter_files = WorkerLockFiles(lock_dir), WorkerLockFiles(lock_dir)
+      holder = WorkerLock(holder_files, "key")
+      self.assertTrue(holder.try_acquire())
+      # a worker starts waiting on the file of the holder
+      waiter = WorkerLock(waiter_files, "key", timeout=1.0)
+      self.assertFalse(waiter.try_acquire())
+      holder.release()
+      self.assertTrue(os.path.exists(holder.path))
+      remaining: float = waiter.acquire()
+      self.assertGreater(remaining, 0.5)
+      self.assertLessEqual(remaining, 1.0)
+      # a worker arriving now waits for the same lock
+      self.assertFalse(WorkerLock(holder_files, "key").try_acquire())
+      waiter.release()
+
+  def test_worker_lock_files_are_bounded_by_the_stripes(self):
+    with tempfile.TemporaryDirectory() as lock_dir:
+      lock_files = WorkerLockFiles(lock_dir, stripes=8)
+      for i in range(0, 100):
+        worker_lock = WorkerLock(lock_files, "query " + str(i))
+        self.assertTrue(worker_lock.try_acquire())
+        worker_lock.release()
+      self.assertLessEqual(len(os.listdir(lock_dir)), 8)
+      # the files are opened once by the process
+      self.assertEqual(len(os.listdir(lock_dir)), len(lock_files.files))
+      # the threads of a process share the stripe, another process waits until the last of them releases it
+      first, second = WorkerLock(lock_files, "query 1"), WorkerLock(lock_files, "query 1")
+      self.assertTrue(first.try_acquire())
+      self.assertTrue(second.try_acquire())
+      other_worker = WorkerLock(WorkerLockFiles(lock_dir, stripes=8), "query 1")
+      first.release()
+      self.assertFalse(other_worker.try_acquire())
+      second.release()
+      self.assertTrue(other_worker.try_acquire())
+      other_worker.release()
+
+  @patch('metasearch.views.filter_search_results', lambda results: results)
+  @patch('metasearch.views.cache_search_results', lambda *args: None)
+  def test_search_after_waiting_gets_the_rest_of_the_budget(self):
+    timeouts: list = []
+    def collect(query: str, timeout: float = None, dropped_engines: list = None, exhausted_engines: list = None) -> list:
+      timeouts.append(timeout)
+      return []
+    with tempfile.TemporaryDirectory() as lock_dir:
+      with override_settings(METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=True, METASEARCH_SINGLE_FLIGHT_LOCK_DIR=lock_dir, METASEARCH_REQUEST_TIMEOUT=0.5):
+        # another worker process holds the lock
+        holder = WorkerLock(WorkerLockFiles(lock_dir), "budget test query")
+        self.assertTrue(holder.try_acquire())
+        releaser = threading.Timer(0.2, holder.release)
+        releaser.start()
+        with patch('metasearch.views.collect_search_results_from_multiple_search_engines', collect):
+          run_metasearch("budget test query")
+        releaser.join()
+    self.assertEqual(1, len(timeouts))
+    self.assertLess(timeouts[0], 0.35)
+    self.assertGreater(timeouts[0], 0.1)
\ No newline at end of file
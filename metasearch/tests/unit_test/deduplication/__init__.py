@@ -0,0 +1 @@
+from metasearch.tests.unit_test.deduplication.near_duplicates import NearDuplicateTests
\ No newline at end of file
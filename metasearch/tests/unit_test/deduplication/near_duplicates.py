@@ -0,0 +1,75 @@
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from metasearch.models import ResultItem
+from metasearch import near_duplicates
+from metasearch.near_duplicates import (
+  get_shingles,
+  find_near_duplicate_clusters,
+  remove_near_duplicates,
+  remove_near_duplicates_if_enabled
+)
+
+SNIPPET: str = "Russian President Vladimir Putin and French President Emmanuel Macron on Thursday called for a ceasefire in the fighting between Azerbaijan and Armenia over the Nagorno-Karabakh region."
+
+def make_item(title: str, url: str, engine: str, rank: int, snippet: str) -> ResultItem:
+  item = ResultItem(title, url, engine, rank)
+  item.set_abstract(snippet)
+  return item
+
+class NearDuplicateTests(TestCase):
+
+  def test_syndicated_copies_are_merged(self):
+    items: list = [
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire - Reuters", "https://www.reuters.com/article/putin-macron", "Google", 4, SNIPPET),
+      make_item("Election 2020 - Forbes", "https://www.forbes.com/election-2020/", "Google", 2, "The latest news and analysis of the 2020 presidential election."),
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire | Yahoo News", "https://news.yahoo.com/putin-macron-call-ceasefire", "Yahoo!", 1, SNIPPET),
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire", "https://www.usnews.com/news/world/articles/putin-macron", "Yandex", 9, SNIPPET + " ...")
+    ]
+    self.assertEqual([[0, 2, 3], [1]], find_near_duplicate_clusters(items))
+    unique_items: list = remove_near_duplicates(items)
+    self.assertEqual(["https://www.reuters.com/article/putin-macron", "https://www.forbes.com/election-2020/"], [item.get_url() for item in unique_items])
+    # The first item of the cluster keeps the union of the engines and the range of the ranks
+    self.assertEqual(["Google", "Yahoo!", "Yandex"], unique_items[0].get_engine())
+    self.assertEqual(1, unique_items[0].get_highest_rank())
+    self.assertEqual(9, unique_items[0].get_lowest_rank())
+    self.assertEqual(["Google"], unique_items[1].get_engine())
+
+  def test_different_articles_are_not_merged(self):
+    items: list = [
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire", "https://www.reuters.com/a", "Google", 1, SNIPPET),
+      make_item("EU prepares for standoff over Turkish sanctions", "https://www.aljazeera.com/b", "Google", 2, "European Union leaders prepare for a standoff with Cyprus over sanctions on Turkey."),
+      # Same title, but a different snippet
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire", "https://www.example.com/c", "Yahoo!", 3, "Armenia says Azerbaijani forces shelled the regional capital overnight as the fighting entered a fifth day."),
+      # Items without any text are never merged
+      ResultItem("", "https://www.example.org/d", "Yandex", 4),
+      ResultItem("", "https://www.example.org/e", "Yandex", 5)
+    ]
+    self.assertEqual(5, len(remove_near_duplicates(items)))
+
+  def test_shingles_ignore_case_punctuation_and_site_name(self):
+    self.assertEqual(
+      get_shingles("Putin, Macron call for ceasefire - Reuters", "Talks in Moscow."),
+      get_shingles("PUTIN MACRON CALL FOR CEASEFIRE | Yahoo News", "talks in moscow")
+    )
+    # The title too short to lose its suffix is kept as it is
+    self.assertNotEqual(get_shingles("Hello - World", ""), get_shingles("Hello", ""))
+
+  def test_only_candidates_are_compared(self):
+    # Distinct items fall into different buckets and are not compared pair by pair
+    items: list = [
+      make_item("Article number " + str(i) + " about topic " + str(i * 7), "https://www.example" + str(i) + ".com/", "Google", 1, "snippet " + str(i) + " with the words " + str(i * 13) + " and " + str(i * 17))
+      for i in range(200)
+    ]
+    with patch('metasearch.near_duplicates.estimate_similarity', wraps=near_duplicates.estimate_similarity) as estimate_similarity:
+      self.assertEqual(200, len(remove_near_duplicates(items)))
+    self.assertLess(estimate_similarity.call_count, 200 * 199 // 2 // 10)
+
+  def test_stage_is_optional(self):
+    items: list = [
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire", "https://www.reuters.com/a", "Google", 1, SNIPPET),
+      make_item("Putin, Macron call for Nagorno-Karabakh ceasefire", "https://news.yahoo.com/b", "Yahoo!", 2, SNIPPET)
+    ]
+    with override_settings(METASEARCH_NEAR_DUPLICATES_ENABLED=False):
+      self.assertEqual(2, len(remove_near_duplicates_if_enabled(list(items))))
+    with override_settings(METASEARCH_NEAR_DUPLICATES_ENABLED=True):
+      self.assertEqual(1, len(remove_near_duplicates_if_enabled(list(items))))
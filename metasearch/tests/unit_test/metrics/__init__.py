@@ -0,0 +1 @@
+from metasearch.tests.unit_test.metrics.prometheus_metrics import PrometheusMetricsTests
\ No newline at end of file
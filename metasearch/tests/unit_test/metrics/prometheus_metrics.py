@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import tempfile
+from unittest.mock import patch
+from django.test import TestCase, RequestFactory, override_settings
+from django.http import Http404
+from metasearch import views
+from metasearch.result_cache import get_result_cache
+from metasearch.metrics import (
+  MetricsRegistry,
+  MetricsStore,
+  merge_snapshots,
+  render_metrics,
+  collect_metrics,
+  flush_metrics,
+  get_metrics_registry
+)
+from metasearch.tests.unit_test.view.mock_search_engines import mock_search_engines, failing_search
+
+def read_sample(text: str, sample: str) -> float:
+  # Value of the sample (name with the labels) in the Prometheus text, 0 if it's not exposed yet
+  for line in text.splitlines():
+    if line.startswith(sample + " "):
+      return float(line.split(" ")[-1])
+  return 0.0
+
+def make_snapshot(pid: int, requests: int, counts: list) -> dict:
+  registry = MetricsRegistry()
+  registry.increment("metasearch_engine_requests_total", (("engine", "Google"),), requests)
+  snapshot: dict = registry.snapshot()
+  snapshot["histograms"].append(["metasearch_result_set_size", [["stage", "selected"]], {"bounds": [10, 20], "counts": counts, "count": sum(counts), "sum": 15.0}])
+  snapshot["gauges"] = [["metasearch_result_cache_entries", [], 3]]
+  snapshot["pid"] = pid
+  return snapshot
+
+class PrometheusMetricsTests(TestCase):
+
+  def test_registry_counts_by_labels(self):
+    registry = MetricsRegistry()
+    registry.increment("metasearch_engine_requests_total", (("engine", "Google"),))
+    registry.increment("metasearch_engine_requests_total", (("engine", "Google"),))
+    registry.increment("metasearch_engine_requests_total", (("engine", "Bing"),))
+    registry.observe("metasearch_result_set_size", 12, (("stage", "collected"),), (10, 20))
+    snapshot: dict = registry.snapshot()
+    self.assertIn(["metasearch_engine_requests_total", [["engine", "Google"]], 2], snapshot["counters"])
+    self.assertIn(["metasearch_engine_requests_total", [["engine", "Bing"]], 1], snapshot["counters"])
+    self.assertEqual([0, 1, 0], snapshot["histograms"][0][2]["counts"])
+    # the snapshot is written to the files as JSON
+    self.assertEqual(snapshot["counters"], json.loads(json.dumps(snapshot))["counters"])
+
+  def test_render_in_the_prometheus_text_format(self):
+    counters, gauges, histograms = merge_snapshots([make_snapshot(os.getpid(), 4, [1, 2, 1])])
+    text: str = render_metrics(counters, gauges, histograms)
+    self.assertIn("# TYPE metasearch_engine_requests_total counter\n", text)
+    self.assertIn('metasearch_engine_requests_total{engine="Google"} 4\n', text)
+    self.assertIn("# TYPE metasearch_result_cache_entries gauge\nmetasearch_result_cache_entries 3\n", text)
+    # the buckets of a histogram are cumulative
+    self.assertIn('metasearch_result_set_size_bucket{stage="selected",le="10"} 1\n', text)
+    self.assertIn('metasearch_result_set_size_bucket{stage="selected",le="20"} 3\n', text)
+    self.assertIn('metasearch_result_set_size_bucket{stage="selected",le="+Inf"} 4\n', text)
+    self.assertIn('metasearch_result_set_size_sum{stage="selected"} 15.0\n', text)
+    self.assertIn('metasearch_result_set_size_count{stage="selected"} 4\n', text)
+
+  def test_metrics_are_summed_over_the_workers(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # snapshots of another worker which is running and of a worker which stopped
+      with open(os.path.join(directory, "worker-1-0.json"), mode='w', encoding='utf-8') as f:
+        json.dump(make_snapshot(1, 5, [1, 0, 0]), f)
+      with open(os.path.join(directory, "worker-2-0.json"), mode='w', encoding='utf-8') as f:
+        json.dump(make_snapshot(2, 7, [0, 1, 0]), f)
+      self.assertEqual(2, len(MetricsStore(directory).read_all()))
+      with patch('metasearch.metrics.is_process_alive', lambda pid: pid != 2):
+        with override_settings(METASEARCH_METRICS_DIR=directory):
+          text: str = collect_metrics()
+      # the file of this worker is added, and the file of the stopped worker is folded into retired.json
+      file_names: list = sorted(os.listdir(directory))
+      self.assertEqual(2, len([file_name for file_name in file_names if file_name.startswith("worker-")]))
+      self.assertIn("worker-1-0.json", file_names)
+      self.assertIn("retired.json", file_names)
+    own_requests: int = sum(
+      value for (name, labels), value in merge_snapshots([get_metrics_registry().snapshot()])[0].items()
+      if name == "metasearch_engine_requests_total" and labels == (("engine", "Google"),)
+    )
+    self.assertIn('metasearch_engine_requests_total{engine="Google"} ' + str(own_requests + 12) + "\n", text)
+    self.assertIn('metasearch_result_set_size_bucket{stage="selected",le="20"} 2\n', text)
+    # the gauges of the stopped worker are left out
+    own_entries: int = get_result_cache().get_stats()["entries"]
+    self.assertIn("\nmetasearch_result_cache_entries " + str(own_entries + 3) + "\n", text)
+
+  def test_stopped_workers_are_folded_into_a_single_file(self):
+    with tempfile.TemporaryDirectory() as directory:
+      metrics_store = MetricsStore(directory)
+      for pid, requests in [(1, 5), (2, 7), (3, 11)]:
+        with open(os.path.join(directory, "worker-" + str(pid) + "-0.json"), mode='w', encoding='utf-8') as f:
+          json.dump(make_snapshot(pid, requests, [1, 0, 0]), f)
+      with patch('metasearch.metrics.is_process_alive', lambda pid: pid == 1):
+        self.assertEqual(2, metrics_store.compact())
+        self.assertEqual(["compact.lock", "retired.json", "worker-1-0.json"], sorted(os.listdir(directory)))
+        # the worker 1 stops and another one is started
+        with open(os.path.join(directory, "worker-4-0.json"), mode='w', encoding='utf-8') as f:
+          json.dump(make_snapshot(4, 13, [0, 1, 0]), f)
+      with patch('metasearch.metrics.is_process_alive', lambda pid: pid == 4):
+        self.assertEqual(1, metrics_store.compact())
+        self.assertEqual(0, metrics_store.compact())
+        self.assertEqual(["compact.lock", "retired.json", "worker-4-0.json"], sorted(os.listdir(directory)))
+        counters, gauges, histograms = merge_snapshots(metrics_store.read_all())
+    # the counters and the histograms never go back, the gauges of the stopped workers are left out
+    self.assertEqual(5 + 7 + 11 + 13, counters[("metasearch_engine_requests_total", (("engine", "Google"),))])
+    self.assertEqual([3, 1, 0], histograms[("metasearch_result_set_size", (("stage", "selected"),))]["counts"])
+    self.assertEqual(3, gauges[("metasearch_result_cache_entries", ())])
+
+  def test_last_increments_are_written_after_the_interval(self):
+    with tempfile.TemporaryDirectory() as directory:
+      metrics_store = MetricsStore(directory, write_interval=0.1)
+      metrics_store.write_if_due(lambda: make_snapshot(os.getpid(), 1, [1, 0, 0]))
+      # the increments of the last search before the interval passed are written later without another search
+      metrics_store.write_if_due(lambda: make_snapshot(os.getpid(), 2, [1, 0, 0]))
+      self.assertEqual(1, merge_snapshots(metrics_store.read_all())[0][("metasearch_engine_requests_total", (("engine", "Google"),))])
+      time.sleep(0.3)
+      self.assertEqual(2, merge_snapshots(metrics_store.read_all())[0][("metasearch_engine_requests_total", (("engine", "Google"),))])
+
+  @override_settings(METASEARCH_METRICS_ENABLED=True)
+  def test_metrics_are_flushed_when_the_worker_exits(self):
+    with tempfile.TemporaryDirectory() as directory:
+      with override_settings(METASEARCH_METRICS_DIR=directory):
+        flush_metrics()
+      self.assertEqual(1, len(os.listdir(directory)))
+      self.assertEqual(os.getpid(), MetricsStore(directory).read_all()[0]["pid"])
+
+  @override_settings(METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=False, METASEARCH_METRICS_DIR=None, METASEARCH_METRICS_ENABLED=True)
+  def test_metrics_view_reports_the_searches(self):
+    # The counters are shared by the tests in the process, so the increments by the search are checked
+    text_before: str = views.metrics(RequestFactory().get('/metasearch/metrics')).content.decode("utf-8")
+    with mock_search_engines(searches={"DuckDuckGo": failing_search}):
+      views.search(RequestFactory().get('/metasearch/search/', {'query': 'prometheus metrics test'}))
+    response = views.metrics(RequestFactory().get('/metasearch/metrics'))
+    self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+    text: str = response.content.decode("utf-8")
+    # The mock search engines return 5 results each
+    for sample, increment in [
+      ('metasearch_engine_results_total{engine="Yandex"}', 5),
+      ('metasearch_engine_duration_seconds_count{engine="Google"}', 1),
+      ('metasearch_engine_failures_total{engine="DuckDuckGo",exception="ConnectionError"}', 1)
+    ]:
+      self.assertEqual(increment, read_sample(text, sample) - read_sample(text_before, sample), sample)
+    self.assertIn('metasearch_engine_failures_total{engine="DuckDuckGo",exception="ConnectionError"} ', text)
+    self.assertIn('metasearch_engine_dropped_total{engine="DuckDuckGo",reason="failure"} ', text)
+    self.assertIn('metasearch_engine_duration_seconds_count{engine="Google"} ', text)
+    self.assertIn('metasearch_engine_results_total{engine="Yandex"} ', text)
+    for stage in ["collected", "deduplicated", "selected"]:
+      self.assertIn('metasearch_result_set_size_count{stage="' + stage + '"} ', text)
+    self.assertIn('metasearch_stage_duration_seconds_count{stage="collect"} ', text)
+    self.assertIn("metasearch_result_cache_misses_total ", text)
+
+  @override_settings(METASEARCH_METRICS_ENABLED=False)
+  def test_metrics_view_is_disabled_by_the_settings(self):
+    with self.assertRaises(Http404):
+      views.metrics(RequestFactory().get('/metasearch/metrics'))
+
+  def test_metrics_view_is_disabled_by_default(self):
+    # the endpoint has no authentication
+    with self.settings():
+      from django.conf import settings
+      del settings.METASEARCH_METRICS_ENABLED
+      with self.assertRaises(Http404):
+        views.metrics(RequestFactory().get('/metasearch/metrics'))
\ No newline at end of file
@@ -1,6 +1,10 @@
+import copy
+from unittest.mock import patch
+from tld import get_tld
 from django.test import TestCase
+from django.template.loader import render_to_string
 from metasearch.tests.test_utils import TestUtils
-from metasearch.models import ResultItem
+from metasearch.models import ResultItem, SearchEngine, canonicalize_url, normalize_title, count_engines
 
 class ResultItemModelTests(TestCase):
 
@@ -31,6 +35,72 @@ class ResultItemModelTests(TestCase):
     item = ResultItem("Test Article 6", "http://ja.example.com", "Google")
     self.assertEqual("example.com", item.get_domain())
 
+  # Check if the URL without a known top level domain has no domain, instead of raising as get_tld does
+  def test_get_domain_of_url_without_known_top_level_domain(self):
+
+    # [Success] URL with an IP address as the host
+    item = ResultItem("Test Article 1", "http://192.168.0.1/page", "Google")
+    self.assertEqual(None, item.get_domain())
+
+    # [Success] URL with a top level domain not in the list of the public suffixes
+    item = ResultItem("Test Article 2", "https://intranet.notatld/page", "Google")
+    self.assertEqual(None, item.get_domain())
+
+    # [Success] The domain is given again when the URL is changed to a known top level domain
+    self.assertTrue(item.set_url("https://www.example.com/page"))
+    self.assertEqual("example.com", item.get_domain())
+
+  # Check if the domain is computed once when the URL is set
+  def test_domain_is_computed_when_the_url_is_set(self):
+    with patch('metasearch.models.get_tld', wraps=get_tld) as counted_get_tld:
+      item = ResultItem("Test Article 1", "https://www.example.co.jp/index.html", "Google")
+      self.assertEqual("example.co.jp", item.get_domain())
+      self.assertEqual("example.co.jp", item.get_domain())
+      self.assertEqual(1, counted_get_tld.call_count)
+    # The domain follows the URL set later
+    self.assertTrue(item.set_url("https://news.example.org/"))
+    self.assertEqual("example.org", item.get_domain())
+    # [Fail] The domain and the URL are kept if the given URL is wrong
+    self.assertFalse(item.set_url("ftp://example.com"))
+    self.assertEqual("example.org", item.get_domain())
+    # None if the URL has no known top level domain
+    item = ResultItem("Test Article 2", "http://localhost/index.html", "Google")
+    self.assertIsNone(item.get_domain())
+
+  # Check if the item holds its attributes in the slots
+  def test_result_item_is_slotted(self):
+    item = ResultItem("Test Article 1", "https://example.com/news/", "Google", 3)
+    item.set_abstract("sample snippet")
+    self.assertFalse(hasattr(item, "__dict__"))
+    with self.assertRaises(AttributeError):
+      item.unknown_attribute = 1
+    # The copies keep all the attributes
+    copied = copy.deepcopy(item)
+    self.assertEqual(str(item), str(copied))
+    self.assertEqual("example.com", copied.get_domain())
+    self.assertEqual("sample snippet", copied.get_abstract())
+    self.assertEqual("[Title] Test Article 1 [URL] https://example.com/news/ [Engine] , Google [HRank] 3 [LRank] 3", str(item))
+
+  # Check if the variants of a URL have the same canonical form
+  def test_canonicalize_url(self):
+    expected: str = "example.com/news?id=3"
+    self.assertEqual(expected, canonicalize_url("https://www.example.com/news?id=3"))
+    self.assertEqual(expected, canonicalize_url("http://example.com/news/?id=3"))
+    self.assertEqual(expected, canonicalize_url("https://WWW.Example.com:443/news?utm_source=feed&id=3&fbclid=abc#top"))
+    self.assertEqual("example.com", canonicalize_url("https://example.com/"))
+    # The parameters other than the tracking ones are kept, in the sorted order
+    self.assertEqual("example.com/search?page=2&q=news", canonicalize_url("https://example.com/search?q=news&page=2&gclid=xyz"))
+    # The pages differing in the port, the path or its case are not the same
+    self.assertEqual("example.com:8080/news", canonicalize_url("http://example.com:8080/news"))
+    self.assertNotEqual(canonicalize_url("https://example.com/News"), canonicalize_url("https://example.com/news"))
+    self.assertNotEqual(canonicalize_url("https://jp.example.com/news"), canonicalize_url("https://example.com/news"))
+
+  # Check if the titles differing only in the case and the white spaces are the same
+  def test_normalize_title(self):
+    self.assertEqual("hello world", normalize_title("  Hello \t World "))
+    self.assertEqual("", normalize_title("   "))
+    self.assertNotEqual(normalize_title("Hello World"), normalize_title("Hello World | Example"))
+
   # Check if it sets the URL correctly
   def test_set_url_sets_the_url_correctly(self):
     # [Success] ResultItem having a correct URL
@@ -65,6 +135,36 @@ class ResultItemModelTests(TestCase):
     item = ResultItem("Test Article 2", "https://example.com", "google")
     self.assertEqual([], item.get_engine())
 
+  # Check if the source search engines are kept as a bitmask and merged correctly
+  def test_engines_are_kept_as_a_bitmask(self):
+    item = ResultItem("Test Article 1", "https://example.com", "Yandex")
+    self.assertTrue(item.set_engine("Google"))
+    self.assertFalse(item.set_engine("Yandex"))
+    self.assertEqual(SearchEngine.GOOGLE | SearchEngine.YANDEX, item.get_engine_mask())
+    # The names are listed in the order of SEARCHENGINES
+    self.assertEqual(["Google", "Yandex"], item.get_engine())
+
+    duplicated_item = ResultItem("Test Article 1", "https://example.com", "DuckDuckGo")
+    duplicated_item.set_engine("Google")
+    item.merge(duplicated_item)
+    self.assertEqual(["Google", "Yandex", "DuckDuckGo"], item.get_engine())
+    self.assertEqual("[Title] Test Article 1 [URL] https://example.com [Engine] , Google, Yandex, DuckDuckGo [HRank] 100 [LRank] 100", str(item))
+
+    items: list = [item, duplicated_item, ResultItem("Test Article 2", "https://example.org", "Yahoo!")]
+    self.assertEqual({"Google": 2, "Yahoo!": 1, "Bing": 0, "Yandex": 1, "DuckDuckGo": 2}, count_engines(items))
+
+  # Check if the source search engines are listed in the order of SEARCHENGINES, not in the order they were found
+  # The result page shows them in this order, the same for every item
+  def test_engines_are_listed_in_the_order_of_searchengines(self):
+    item = ResultItem("Test Article 1", "https://example.com", "DuckDuckGo")
+    item.merge(ResultItem("Test Article 1", "https://example.com", "Yahoo!"))
+    item.merge(ResultItem("Test Article 1", "https://example.com", "Google"))
+    self.assertEqual(["Google", "Yahoo!", "DuckDuckGo"], item.get_engine())
+    self.assertEqual([engine for engine in ResultItem.SEARCHENGINES if engine in item.get_engine()], item.get_engine())
+    item.set_abstract("sample snippet")
+    page: str = render_to_string('metasearch/result.html', {'query': "test", 'search_results': [item], 'dropped_engines': []})
+    self.assertIn("Google, Yahoo!, DuckDuckGo", page)
+
   # Check if it sets the rank in the search engine correctly
   def test_set_rank_correctly(self):
 
@@ -0,0 +1 @@
+from metasearch.tests.unit_test.profiling.request_profiling import RequestProfilingTests
\ No newline at end of file
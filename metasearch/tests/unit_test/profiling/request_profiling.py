@@ -0,0 +1,76 @@
+import os
+import marshal
+import tempfile
+import threading
+from django.test import TestCase, RequestFactory, override_settings
+from metasearch import views
+from metasearch.profiling import RequestProfile, SamplingProfiler, get_requested_profile
+from metasearch.tests.unit_test.view.mock_search_engines import mock_search_engines, mock_search
+
+# Label of the frames of the mock search engines in the sampled stacks, e.g. "search (mock_search_engines.py:27)"
+MOCKSEARCHFRAME = mock_search("Google").__name__ + " (" + os.path.basename(mock_search("Google").__code__.co_filename) + ":"
+
+def search_with_mock_engines(request):
+  # Give the sampling profiler the time to see the threads of the search engines
+  with mock_search_engines(delay=0.05):
+    return views.search(request)
+
+def make_request(parameters: dict, token: str = None):
+  headers: dict = {} if token is None else {'HTTP_X_METASEARCH_PROFILE_TOKEN': token}
+  return RequestFactory().get('/metasearch/search/', parameters, **headers)
+
+@override_settings(METASEARCH_PROFILING_ENABLED=True, METASEARCH_PROFILING_TOKEN="profiling-test-token", METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=False)
+class RequestProfilingTests(TestCase):
+
+  def test_profile_needs_the_permission(self):
+    self.assertIsNone(get_requested_profile(make_request({'query': 'a', 'profile': 'cprofile'})))
+    self.assertIsNone(get_requested_profile(make_request({'query': 'a', 'profile': 'cprofile'}, "wrong-token")))
+    self.assertIsNone(get_requested_profile(make_request({'query': 'a', 'profile': 'unknown'}, "profiling-test-token")))
+    self.assertIsNotNone(get_requested_profile(make_request({'query': 'a', 'profile': 'cprofile'}, "profiling-test-token")))
+    with override_settings(METASEARCH_PROFILING_ENABLED=False):
+      self.assertIsNone(get_requested_profile(make_request({'query': 'a', 'profile': 'cprofile'}, "profiling-test-token")))
+    with override_settings(METASEARCH_PROFILING_TOKEN=None):
+      self.assertIsNone(get_requested_profile(make_request({'query': 'a', 'profile': 'cprofile'}, "")))
+
+  def test_request_without_the_permission_gets_the_results(self):
+    response = search_with_mock_engines(make_request({'query': 'profiling test', 'profile': 'cprofile'}, "wrong-token"))
+    self.assertTrue(response["Content-Type"].startswith("text/html"))
+    self.assertFalse(response.has_header("Content-Disposition"))
+
+  def test_download_the_cprofile_of_a_search(self):
+    response = search_with_mock_engines(make_request({'query': 'cprofile test', 'profile': 'cprofile'}, "profiling-test-token"))
+    self.assertRegex(response["Content-Disposition"], r'^attachment; filename="search-[0-9-]+\.pstats"$')
+    # (file name, line, function name) -> statistics, the calls of the threads of the search engines are included
+    stats: dict = marshal.loads(response.content)
+    function_names: set = set(function_name for file_name, line, function_name in stats.keys())
+    self.assertIn("filter_search_results", function_names)
+    self.assertIn("search", function_names)
+
+  def test_save_the_sampled_stacks_of_a_search(self):
+    with tempfile.TemporaryDirectory() as directory:
+      with override_settings(METASEARCH_PROFILES_DIR=directory, METASEARCH_PROFILING_SAMPLE_INTERVAL=0.001):
+        response = search_with_mock_engines(
+          make_request({'query': 'sampling test', 'profile': 'sampling', 'profile_output': 'save'}, "profiling-test-token")
+        )
+      self.assertTrue(response["Content-Type"].startswith("text/html"))
+      self.assertEqual([response["X-Metasearch-Profile"]], os.listdir(directory))
+      self.assertTrue(response["X-Metasearch-Profile"].endswith(".collapsed"))
+      with open(os.path.join(directory, response["X-Metasearch-Profile"]), mode='r', encoding='utf-8') as f:
+        lines: list = f.read().splitlines()
+    self.assertTrue(len(lines) > 0)
+    for line in lines:
+      self.assertRegex(line, r"^[^ ].*;.* [0-9]+$")
+    # the search engines are sampled on the threads of the pool
+    self.assertTrue(any(line.startswith("metasearch-engine") and MOCKSEARCHFRAME in line for line in lines))
+
+  def test_sampling_profiler_counts_the_stacks_of_the_registered_threads(self):
+    sampler = SamplingProfiler(0.001)
+    sampler.add_thread(threading.get_ident())
+    sampler.sample()
+    sampler.sample()
+    stacks: str = sampler.get_collapsed_stacks()
+    self.assertEqual(1, len(stacks.splitlines()))
+    # the stack from the thread to the innermost function, and the number of the samples
+    self.assertTrue(stacks.startswith("MainThread;"))
+    self.assertIn(".test_sampling_profiler_counts_the_stacks_of_the_registered_threads (request_profiling.py:", stacks)
+    self.assertTrue(stacks.endswith(" 2\n"))
\ No newline at end of file
@@ -0,0 +1,2 @@
+from metasearch.tests.unit_test.quota.quota_ledger import QuotaLedgerTests
+from metasearch.tests.unit_test.quota.rate_limiter import TokenBucketTests
\ No newline at end of file
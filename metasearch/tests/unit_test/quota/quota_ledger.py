@@ -0,0 +1,91 @@
+import os
+import time
+import sqlite3
+import tempfile
+from unittest.mock import patch
+from django.test import TestCase
+from metasearch.search_modules.response_cache import ResponseCache
+from metasearch.search_modules.quota_ledger import QuotaLedger, QuotaExceeded
+from metasearch.search_modules.yandex_search_module import yandexSearch
+
+class QuotaLedgerTests(TestCase):
+
+  def setUp(self):
+    self.ledger_dir = tempfile.TemporaryDirectory()
+    self.ledger_path = os.path.join(self.ledger_dir.name, "quota_ledger.sqlite3")
+
+  def tearDown(self):
+    self.ledger_dir.cleanup()
+
+  def test_reserve_up_to_limit_minus_margin(self):
+    ledger = QuotaLedger(self.ledger_path, {"Google": 5}, margin=2)
+    self.assertEqual([True, True, True, False], [ledger.reserve("Google") for i in range(4)])
+    self.assertEqual(3, ledger.get_used("Google"))
+    self.assertEqual(2, ledger.get_remaining("Google"))
+    with self.assertRaises(QuotaExceeded) as context:
+      ledger.reserve_or_raise("Google")
+    self.assertEqual("Google", context.exception.engine)
+    self.assertEqual(2, context.exception.remaining)
+    # The engines without a limit are never refused
+    self.assertTrue(ledger.reserve("Yahoo!"))
+    self.assertEqual(None, ledger.get_remaining("Yahoo!"))
+
+  def test_usage_is_shared_through_database(self):
+    # Two ledgers on the same file behave as two workers
+    ledger = QuotaLedger(self.ledger_path, {"Yandex": 3})
+    another_ledger = QuotaLedger(self.ledger_path, {"Yandex": 3})
+    self.assertTrue(ledger.reserve("Yandex", 2))
+    self.assertTrue(another_ledger.reserve("Yandex"))
+    self.assertFalse(ledger.reserve("Yandex"))
+    self.assertEqual({"Yandex": {"limit": 3, "used": 3, "remaining": 0}}, another_ledger.get_stats())
+
+  def test_usage_is_reset_every_day(self):
+    ledger = QuotaLedger(self.ledger_path, {"Google": 1})
+    with patch.object(ledger, 'get_day', return_value="2020-10-01"):
+      self.assertTrue(ledger.reserve("Google"))
+      self.assertFalse(ledger.reserve("Google"))
+    with patch.object(ledger, 'get_day', return_value="2020-10-02"):
+      self.assertEqual(1, ledger.get_remaining("Google"))
+      self.assertTrue(ledger.reserve("Google"))
+
+  def test_ledger_creates_the_directory_of_the_database(self):
+    ledger_path: str = os.path.join(self.ledger_dir.name, "missing", "directory", "quota_ledger.sqlite3")
+    ledger = QuotaLedger(ledger_path, {"Google": 5})
+    self.assertTrue(ledger.reserve("Google"))
+    self.assertTrue(os.path.exists(ledger_path))
+    self.assertEqual(1, ledger.get_used("Google"))
+
+  def test_reservation_waits_for_database_only_for_timeout(self):
+    ledger = QuotaLedger(self.ledger_path, {"Google": 5})
+    self.assertTrue(ledger.reserve("Google"))
+    # Another worker holds the database for writing
+    connection = sqlite3.connect(self.ledger_path, isolation_level=None)
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+      started_at: float = time.monotonic()
+      with self.assertRaises(sqlite3.OperationalError):
+        ledger.reserve_or_raise("Google", timeout=0.2)
+      self.assertLess(time.monotonic() - started_at, 1.0)
+    finally:
+      connection.execute("ROLLBACK")
+      connection.close()
+    self.assertTrue(ledger.reserve("Google", timeout=0.2))
+    self.assertEqual(2, ledger.get_used("Google"))
+
+  def test_disabled_ledger_accepts_everything(self):
+    ledger = QuotaLedger(self.ledger_path, {"Google": 0}, enabled=False)
+    self.assertTrue(ledger.reserve("Google"))
+    self.assertFalse(os.path.exists(self.ledger_path))
+
+  def test_search_module_skips_engine_without_quota(self):
+    ledger = QuotaLedger(self.ledger_path, {"Yandex": 10}, margin=10)
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = ResponseCache(cache_dir)
+      with patch('metasearch.search_modules.yandex_search_module.get_response_cache', return_value=cache):
+        with patch('metasearch.search_modules.yandex_search_module.get_quota_ledger', return_value=ledger):
+          with patch('metasearch.search_modules.yandex_search_module.request_get', side_effect=AssertionError("request thrown")):
+            with self.assertRaises(QuotaExceeded):
+              yandexSearch("hello world")
+            # A response cached a while ago is still served without spending the quota
+            cache.put("Yandex", "hello world", {"groups": 10}, b'<?xml version="1.0" encoding="utf-8"?><yandexsearch><response><results><grouping></grouping></results></response></yandexsearch>', "utf-8")
+            self.assertEqual([], yandexSearch("hello world"))
@@ -0,0 +1,74 @@
+import time
+import asyncio
+import threading
+from django.test import TestCase
+from metasearch.search_modules.rate_limiter import TokenBucket, RateLimitExceeded
+
+class TokenBucketTests(TestCase):
+
+  def test_burst_is_thrown_without_waiting(self):
+    bucket = TokenBucket(rate=10.0, burst=3)
+    self.assertEqual([0.0, 0.0, 0.0], [bucket.acquire() for i in range(3)])
+    # The bucket is empty, the next caller waits for a token to be refilled (1 / rate seconds)
+    started_at: float = time.monotonic()
+    wait: float = bucket.acquire()
+    self.assertAlmostEqual(0.1, wait, delta=0.02)
+    self.assertGreaterEqual(time.monotonic() - started_at, wait)
+    stats: dict = bucket.get_stats()
+    self.assertEqual(4, stats["acquired"])
+    self.assertEqual(1, stats["waited"])
+    self.assertAlmostEqual(wait, stats["total_wait_seconds"])
+
+  def test_waiting_callers_are_spaced_by_rate(self):
+    bucket = TokenBucket(rate=20.0, burst=1)
+    waits: list = []
+    lock = threading.Lock()
+    def acquire():
+      wait: float = bucket.acquire()
+      with lock:
+        waits.append(wait)
+    threads: list = [threading.Thread(target=acquire) for i in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    # The first one goes at once and the others wait 0.05, 0.10, 0.15 and 0.20 seconds in turn
+    waits.sort()
+    self.assertEqual(0.0, waits[0])
+    for n, wait in enumerate(waits[1:]):
+      self.assertAlmostEqual(0.05 * (n + 1), wait, delta=0.02)
+
+  def test_bucket_is_refilled_up_to_burst(self):
+    bucket = TokenBucket(rate=100.0, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    time.sleep(0.1)
+    # 10 tokens would have been refilled, but the bucket holds only 2
+    self.assertEqual([0.0, 0.0], [bucket.reserve(), bucket.reserve()])
+    self.assertGreater(bucket.reserve(), 0.0)
+
+  def test_unlimited_bucket_never_waits(self):
+    bucket = TokenBucket()
+    self.assertEqual([0.0] * 100, [bucket.acquire() for i in range(100)])
+
+  def test_acquire_async(self):
+    bucket = TokenBucket(rate=10.0, burst=1)
+    async def acquire_twice() -> list:
+      return await asyncio.gather(bucket.acquire_async(), bucket.acquire_async())
+    waits: list = sorted(asyncio.run(acquire_twice()))
+    self.assertEqual(0.0, waits[0])
+    self.assertAlmostEqual(0.1, waits[1], delta=0.02)
+
+  def test_wait_longer_than_the_timeout_is_refused_without_taking_tokens(self):
+    bucket = TokenBucket(rate=10.0, burst=1)
+    self.assertEqual(0.0, bucket.acquire(timeout=0.0))
+    started_at: float = time.monotonic()
+    with self.assertRaises(RateLimitExceeded) as context:
+      bucket.acquire(timeout=0.05)
+    self.assertLess(time.monotonic() - started_at, 0.05)
+    self.assertAlmostEqual(0.1, context.exception.wait, delta=0.02)
+    # the refused caller didn't push back the next one
+    self.assertAlmostEqual(0.1, bucket.acquire(timeout=0.2), delta=0.02)
+    stats: dict = bucket.get_stats()
+    self.assertEqual(2, stats["acquired"])
+    self.assertEqual(1, stats["refused"])
\ No newline at end of file
@@ -0,0 +1 @@
+from metasearch.tests.unit_test.result_set.result_set import ResultSetTests
\ No newline at end of file
@@ -0,0 +1,138 @@
+import random
+import numpy as np
+from django.test import TestCase, override_settings
+from metasearch.models import ResultItem, ENGINEBITS, count_engines
+from metasearch.domain_categories import get_domain_categories
+from metasearch.result_set import build_result_set
+from metasearch.views import (
+  CATEGORIES,
+  filter_search_results,
+  remove_result_item_duplication,
+  result_classification,
+  separate_items_by_categories,
+  selection_for_general_computers
+)
+
+def make_items() -> list:
+  return [
+    ResultItem("Article 1", "https://en.wikipedia.org/wiki/Hello", "Google", 1),
+    ResultItem("Article 2", "https://www.reuters.com/a", "Google", 2),
+    ResultItem("Article 3", "https://www.youtube.com/watch?v=1", "Google", 3),
+    ResultItem("Article 4", "https://example.com/blog", "Google", 4),
+    ResultItem("Article 2", "http://reuters.com/a/?utm_source=feed", "Yahoo!", 7),
+    ResultItem("Article 5", "https://www.nbcnews.com/b", "Yahoo!", 1),
+    ResultItem("Article 6", "https://ja.wikipedia.org/wiki/Hello", "Yandex", 5)
+  ]
+
+def make_pool(size: int, seed: int) -> list:
+  # Items of a few domains of every category, the ranks are all different so that the selection doesn't depend on the ties
+  generator = random.Random(seed)
+  domains: list = ["wikipedia.org", "reuters.com", "apnews.com", "nbcnews.com", "time.com", "example.com", "example.org", "youtube.com"]
+  ranks: list = generator.sample(range(1, 101), size)
+  items: list = []
+  for i in range(size):
+    engine: str = ResultItem.SEARCHENGINES[i % len(ResultItem.SEARCHENGINES)]
+    items.append(ResultItem("Article " + str(i), "https://www." + generator.choice(domains) + "/" + str(i % (size // 2)), engine, ranks[i]))
+  return items
+
+def summarize(items: list) -> list:
+  return sorted((item.get_url(), sorted(item.get_engine()), item.get_highest_rank(), item.get_lowest_rank()) for item in items)
+
+class ResultSetTests(TestCase):
+
+  def setUp(self):
+    self.categories = get_domain_categories()
+
+  def test_columns_of_the_items(self):
+    items: list = make_items()
+    result_set = build_result_set(items, self.categories)
+    self.assertEqual(7, len(result_set))
+    self.assertEqual(["wikipedia.org", "reuters.com", "youtube.com", "example.com", "nbcnews.com"], result_set.domains)
+    self.assertEqual([0, 1, 2, 3, 1, 4, 0], result_set.domain_codes.tolist())
+    self.assertEqual([1, 2, 6, 6, 2, 3, 1], result_set.get_category_codes().tolist())
+    self.assertEqual(ENGINEBITS["Yahoo!"], result_set.engine_masks[4])
+    self.assertEqual([1, 2, 3, 4, 7, 1, 5], result_set.highest_ranks.tolist())
+    # the items themselves are returned, not copies
+    for item, returned_item in zip(items, result_set.to_items()):
+      self.assertIs(item, returned_item)
+
+  def test_classification_matches_result_classification(self):
+    items: list = make_pool(60, 1)
+    expected: list = sorted((category, item.get_title()) for category, item in result_classification(items, self.categories))
+    result_set = build_result_set(items, self.categories)
+    actual: list = sorted(zip(result_set.get_category_codes().tolist(), [item.get_title() for item in items]))
+    self.assertEqual(expected, actual)
+
+  def test_removing_duplicates_and_movie_contents(self):
+    result_set = build_result_set(make_items(), self.categories).remove_duplicates().remove_movie_contents()
+    items: list = result_set.to_items()
+    self.assertEqual(["Article 1", "Article 2", "Article 4", "Article 5", "Article 6"], [item.get_title() for item in items])
+    # the merged item inherits the search engines and the ranks of its duplication
+    self.assertEqual(["Google", "Yahoo!"], items[1].get_engine())
+    self.assertEqual(2, items[1].get_highest_rank())
+    self.assertEqual(7, items[1].get_lowest_rank())
+    self.assertEqual({"Google": 3, "Yahoo!": 2, "Bing": 0, "Yandex": 1, "DuckDuckGo": 0}, result_set.count_engines())
+    self.assertEqual(count_engines(items), result_set.count_engines())
+
+    ''' same as remove_result_item_duplication '''
+    result_set = build_result_set(make_pool(80, 2), self.categories).remove_duplicates()
+    self.assertEqual(summarize(remove_result_item_duplication(make_pool(80, 2))), summarize(result_set.to_items()))
+
+  def test_removing_duplicates_of_same_titles(self):
+    items: list = [
+      ResultItem("Article 1", "https://www.example1.com/news", "Google", 2),
+      ResultItem("Article 2", "https://www.example2.com/example", "Google", 3),
+      ResultItem("  article   1 ", "https://amp.example1.com/news/1", "Yahoo!", 6),
+      ResultItem("Article 1 | Example", "https://amp.example1.com/news/1?utm_source=feed", "Yandex", 1)
+    ]
+    result_set = build_result_set(items, self.categories).remove_duplicates()
+    self.assertEqual(["https://www.example1.com/news", "https://www.example2.com/example"], [item.get_url() for item in result_set.to_items()])
+    self.assertEqual(ENGINEBITS["Google"] | ENGINEBITS["Yahoo!"] | ENGINEBITS["Yandex"], result_set.engine_masks[0])
+    self.assertEqual([1, 3], result_set.highest_ranks.tolist())
+    self.assertEqual([6, 3], result_set.lowest_ranks.tolist())
+
+  def test_selection_matches_selection_for_general_computers(self):
+    for seed in range(5):
+      items: list = remove_result_item_duplication(make_pool(60, seed))
+      classified: dict = separate_items_by_categories(result_classification(items, self.categories))
+      expected: list = selection_for_general_computers(classified)
+      actual: list = build_result_set(items, self.categories).select_for_general_computers().to_items()
+      # only 1 of the items of Encyclopedia is picked randomly, the rest is decided by the ranks
+      self.assertEqual(
+        sorted(item.get_url() for item in expected if item.get_domain() != "wikipedia.org"),
+        sorted(item.get_url() for item in actual if item.get_domain() != "wikipedia.org")
+      )
+      self.assertEqual(1, len([item for item in actual if item.get_domain() == "wikipedia.org"]))
+
+  def test_filtering_on_the_columns_if_enabled(self):
+    # The search results are filtered on the lists of ResultItem by default, and on a ResultSet if enabled
+    for seed in range(3):
+      with override_settings(METASEARCH_RESULT_SET_ENABLED=False):
+        expected: list = filter_search_results(make_pool(60, seed))
+      with override_settings(METASEARCH_RESULT_SET_ENABLED=True):
+        actual: list = filter_search_results(make_pool(60, seed))
+      self.assertEqual(
+        summarize(item for item in expected if item.get_domain() != "wikipedia.org"),
+        summarize(item for item in actual if item.get_domain() != "wikipedia.org")
+      )
+
+  def test_selection_breaks_ties_randomly(self):
+    items: list = [
+      ResultItem("Article 1", "https://www.example.com/1", "Google", 1),
+      ResultItem("Article 2", "https://www.example.com/2", "Yahoo!", 1),
+      ResultItem("Article 3", "https://www.example.com/3", "Google", 9),
+      ResultItem("Article 4", "https://www.example.com/4", "Yahoo!", 9),
+      ResultItem("Article 5", "https://www.example.com/5", "Google", 5)
+    ]
+    result_set = build_result_set(items, self.categories)
+    generator = np.random.default_rng(0)
+    picked: set = set()
+    for i in range(100):
+      selected: list = result_set.select_for_general_computers(generator).to_items()
+      self.assertEqual([1, 9], sorted(item.get_highest_rank() for item in selected))
+      picked.update(item.get_title() for item in selected)
+    self.assertEqual({"Article 1", "Article 2", "Article 3", "Article 4"}, picked)
+
+  def test_empty_set(self):
+    result_set = build_result_set([], self.categories)
+    self.assertEqual([], result_set.remove_duplicates().remove_movie_contents().select_for_general_computers().to_items())
\ No newline at end of file
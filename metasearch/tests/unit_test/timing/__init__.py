@@ -0,0 +1 @@
+from metasearch.tests.unit_test.timing.stage_timing import StageTimingTests
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+from django.test import TestCase, RequestFactory, override_settings
+from metasearch import views
+from metasearch.timing import (
+  Histogram,
+  RequestTimings,
+  Timer,
+  get_engine_stage_name,
+  get_request_timings,
+  get_timing_registry
+)
+from metasearch.tests.unit_test.view.mock_search_engines import mock_search_engines
+
+class StageTimingTests(TestCase):
+
+  def test_histogram_counts_the_durations_by_bucket(self):
+    histogram = Histogram((0.01, 0.1, 1.0))
+    for seconds in [0.005, 0.01, 0.05, 0.5, 3.0]:
+      histogram.observe(seconds)
+    snapshot: dict = histogram.snapshot()
+    # the durations equal to a bound are counted in its bucket
+    self.assertEqual([2, 1, 1, 1], snapshot["counts"])
+    self.assertEqual(5, snapshot["count"])
+    self.assertAlmostEqual(3.565, snapshot["sum"])
+
+  def test_timer_adds_the_duration_to_the_histogram_and_the_request(self):
+    count: int = get_timing_registry().get_histogram("test-stage").snapshot()["count"]
+    with RequestTimings() as request_timings:
+      self.assertIs(request_timings, get_request_timings())
+      with Timer("test-stage"):
+        pass
+      # the timings of the request are passed to the other threads explicitly
+      thread = threading.Thread(target=lambda: Timer("test-thread", request_timings).__enter__().__exit__(None, None, None))
+      thread.start()
+      thread.join()
+    self.assertIsNone(get_request_timings())
+    self.assertEqual(count + 1, get_timing_registry().get_histogram("test-stage").snapshot()["count"])
+    self.assertEqual(["test-stage", "test-thread"], [name for name, seconds in request_timings.get_durations()])
+    # out of a request, only the histogram is updated
+    with Timer("test-stage"):
+      pass
+    self.assertEqual(2, len(request_timings.get_durations()))
+
+  def test_server_timing_header(self):
+    request_timings = RequestTimings()
+    request_timings.add("collect", 0.41234)
+    request_timings.add(get_engine_stage_name("Yahoo!"), 0.2)
+    server_timing: str = request_timings.get_server_timing()
+    self.assertTrue(server_timing.startswith("collect;dur=412.34, engine-yahoo;dur=200.00, total;dur="))
+
+  @override_settings(METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=False)
+  def test_search_view_sends_the_timings_of_the_stages(self):
+    with mock_search_engines():
+      response = views.search(RequestFactory().get('/metasearch/search/', {'query': 'server timing test'}))
+    names: list = [metric.split(";")[0] for metric in response["Server-Timing"].split(", ")]
+    for name in ["cache", "engine-google", "engine-yahoo", "engine-duckduckgo", "engine-yandex", "collect", "dedup", "movies", "classify", "select", "render", "total"]:
+      self.assertIn(name, names)
+    self.assertEqual("total", names[-1])
\ No newline at end of file
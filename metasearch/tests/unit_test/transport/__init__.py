@@ -0,0 +1 @@
+from metasearch.tests.unit_test.transport.http_transport import HttpTransportTests
\ No newline at end of file
@@ -0,0 +1,93 @@
+import gzip
+import asyncio
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from django.test import TestCase, override_settings
+from metasearch.search_modules.http_transport import build_http_session, get_http_session, get_async_http_session
+
+class RecordingHandler(BaseHTTPRequestHandler):
+  # Answers 503 to the first request of every path ending with "/flaky", and the gzip-compressed path to the others
+  protocol_version = "HTTP/1.1"
+
+  def do_GET(self):
+    self.server.client_ports.append(self.client_address[1])
+    self.server.accept_encodings.append(self.headers.get("Accept-Encoding"))
+    if self.path.endswith("/flaky") and self.path not in self.server.failed_paths:
+      self.server.failed_paths.add(self.path)
+      self.send_response(503)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+    body: bytes = gzip.compress(self.path.encode('utf-8'))
+    self.send_response(200)
+    self.send_header("Content-Encoding", "gzip")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass
+
+class HttpTransportTests(TestCase):
+
+  def setUp(self):
+    self.server = HTTPServer(("127.0.0.1", 0), RecordingHandler)
+    self.server.client_ports = []
+    self.server.accept_encodings = []
+    self.server.failed_paths = set()
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.start()
+    self.base_url: str = "http://127.0.0.1:" + str(self.server.server_address[1])
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+
+  def test_connection_is_kept_alive_and_gzip_is_decoded(self):
+    http_session = build_http_session()
+    first = http_session.get(self.base_url + "/first", timeout=5.0)
+    second = http_session.get(self.base_url + "/second", timeout=5.0)
+    self.assertEqual((b"/first", b"/second"), (first.content, second.content))
+    # Both requests went through the same connection
+    self.assertEqual(1, len(set(self.server.client_ports)))
+    self.assertEqual(["gzip, deflate", "gzip, deflate"], self.server.accept_encodings)
+
+  @override_settings(METASEARCH_HTTP_BACKOFF_FACTOR=0.0)
+  def test_temporary_server_error_is_retried(self):
+    response = build_http_session().get(self.base_url + "/flaky", timeout=5.0)
+    self.assertEqual(200, response.status_code)
+    self.assertEqual(2, len(self.server.client_ports))
+
+  @override_settings(METASEARCH_HTTP_RETRIES=0)
+  def test_error_status_is_returned_without_retries(self):
+    response = build_http_session().get(self.base_url + "/flaky", timeout=5.0)
+    self.assertEqual(503, response.status_code)
+
+  def test_session_for_quota_is_not_retried(self):
+    # A retried request to Google or Yandex would spend a query not reserved in the quota ledger
+    # The connection is not kept alive in the shared session, so that the server can be shut down
+    response = get_http_session(retry=False).get(self.base_url + "/metered/flaky", headers={"Connection": "close"}, timeout=5.0)
+    self.assertEqual(503, response.status_code)
+    self.assertEqual(1, len(self.server.client_ports))
+    self.assertIsNot(get_http_session(), get_http_session(retry=False))
+    self.assertIs(get_http_session(retry=False), get_http_session(retry=False))
+
+  def test_session_is_shared_by_threads(self):
+    http_sessions: list = []
+    threads: list = [threading.Thread(target=lambda: http_sessions.append(get_http_session())) for i in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertTrue(all(http_session is http_sessions[0] for http_session in http_sessions))
+
+  def test_async_session_is_shared_on_event_loop(self):
+    async def get_twice() -> tuple:
+      first = get_async_http_session()
+      second = get_async_http_session()
+      async with first.get(self.base_url + "/async") as response:
+        content: bytes = await response.read()
+      await first.close()
+      return (first is second, content)
+    self.assertEqual((True, b"/async"), asyncio.run(get_twice()))
@@ -1,3 +1,5 @@
 from metasearch.tests.unit_test.view.development_utilities import DevelopmentUtilitiesTests
 from metasearch.tests.unit_test.view.tests import MetasearchFunctionTests
-from metasearch.tests.unit_test.view.scraping_modules import *
\ No newline at end of file
+from metasearch.tests.unit_test.view.scraping_modules import *
+from metasearch.tests.unit_test.view.api_modules import *
+from metasearch.tests.unit_test.view.async_view import AsyncSearchViewTests
\ No newline at end of file
@@ -0,0 +1,2 @@
+from metasearch.tests.unit_test.view.api_modules.google import GoogleSearchModuleTests
+from metasearch.tests.unit_test.view.api_modules.yandex import YandexSearchModuleTests
\ No newline at end of file
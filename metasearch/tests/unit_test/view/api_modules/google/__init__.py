@@ -0,0 +1 @@
+from metasearch.tests.unit_test.view.api_modules.google.test_google_search_module import GoogleSearchModuleTests
\ No newline at end of file
@@ -0,0 +1,258 @@
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+from django.test import TestCase, override_settings
+from metasearch.search_modules.response_cache import ResponseCache
+from metasearch.search_modules.quota_ledger import QuotaLedger
+from metasearch.search_modules.rate_limiter import TokenBucket, RateLimitExceeded
+from metasearch.search_modules.google_search_module import (
+  get_google_service,
+  get_google_service_async,
+  get_start_indices,
+  get_page_depth,
+  drop_pages_past_total_results,
+  googleSearch,
+  googleSearchAsync
+)
+
+SAMPLE_RESULT_PAGE: dict = {
+  "kind": "customsearch#search",
+  "items": [
+    {"title": "Hello World - Wikipedia", "link": "https://en.wikipedia.org/wiki/Hello_World", "snippet": "Hello World may refer to..."},
+    {"title": "Hello, World!", "link": "https://example.com/hello"}
+  ]
+}
+
+def make_result_page(num_results: int, start_index: int, total_results: int) -> dict:
+  # Result page of the API with the results start_index..start_index+num_results-1 out of total_results
+  last_index: int = min(start_index + num_results - 1, total_results)
+  queries: dict = {"request": [{"totalResults": str(total_results), "startIndex": start_index}]}
+  if last_index < total_results:
+    queries["nextPage"] = [{"totalResults": str(total_results), "startIndex": last_index + 1}]
+  return {
+    "queries": queries,
+    "items": [{"title": "Result " + str(i), "link": "https://example.com/" + str(i)} for i in range(start_index, last_index + 1)]
+  }
+
+class GoogleSearchModuleTests(TestCase):
+
+  def setUp(self):
+    self.temporary_dir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.temporary_dir.cleanup()
+
+  def test_service_is_built_once_without_network(self):
+    with patch('metasearch.search_modules.google_search_module.google_service', None):
+      # Fetching the discovery document through the network must not happen
+      with patch('metasearch.search_modules.google_search_module.build', side_effect=AssertionError("discovery document fetched")):
+        services: list = []
+        threads: list = [threading.Thread(target=lambda: services.append(get_google_service())) for i in range(8)]
+        for thread in threads:
+          thread.start()
+        for thread in threads:
+          thread.join()
+    self.assertEqual(8, len(services))
+    self.assertTrue(all(service is services[0] for service in services))
+    uri: str = services[0].cse().list(q="hello world", cx="cx", num=10, start=11).uri
+    self.assertTrue(uri.startswith("https://customsearch.googleapis.com/customsearch/v1?"))
+    self.assertIn("start=11", uri)
+
+  def test_service_is_built_off_the_event_loop(self):
+    loop_threads: list = []
+    build_threads: list = []
+    def build_google_service():
+      build_threads.append(threading.get_ident())
+      return "service"
+    async def get_service():
+      loop_threads.append(threading.get_ident())
+      return await get_google_service_async()
+    with patch('metasearch.search_modules.google_search_module.google_service', None), \
+         patch('metasearch.search_modules.google_search_module.build_google_service', build_google_service):
+      self.assertEqual("service", asyncio.run(get_service()))
+      # the built client is returned without the executor afterwards
+      self.assertEqual("service", asyncio.run(get_service()))
+    self.assertEqual(1, len(build_threads))
+    self.assertNotEqual(loop_threads[0], build_threads[0])
+
+  def test_search_executes_only_the_list_request(self):
+    http_session = MagicMock()
+    http_session.get.return_value.content = json.dumps(SAMPLE_RESULT_PAGE).encode('utf-8')
+    cache = ResponseCache(self.temporary_dir.name)
+    ledger = QuotaLedger(self.temporary_dir.name + "/quota_ledger.sqlite3", {"Google": 10})
+    with patch('metasearch.search_modules.google_search_module.get_response_cache', return_value=cache), \
+         patch('metasearch.search_modules.google_search_module.get_quota_ledger', return_value=ledger), \
+         patch('metasearch.search_modules.google_search_module.get_http_session', return_value=http_session) as get_http_session:
+      results: list = googleSearch("hello world")
+    # The request composed by the shared client is thrown once through the shared transport
+    self.assertEqual(1, http_session.get.call_count)
+    # through the session without the retries, which would spend the quota not reserved
+    self.assertEqual({"retry": False}, get_http_session.call_args[1])
+    self.assertTrue(http_session.get.call_args[0][0].startswith("https://customsearch.googleapis.com/customsearch/v1?q=hello+world&"))
+    self.assertEqual(None, http_session.get.call_args[1]["timeout"])
+    self.assertEqual(["https://en.wikipedia.org/wiki/Hello_World", "https://example.com/hello"], [item.get_url() for item in results])
+    self.assertEqual("", results[1].get_abstract())
+    self.assertEqual(1, ledger.get_used("Google"))
+
+  def test_quota_is_not_spent_on_a_request_given_up_for_the_rate_limit(self):
+    http_session = MagicMock()
+    http_session.get.return_value.content = json.dumps(SAMPLE_RESULT_PAGE).encode('utf-8')
+    cache = ResponseCache(self.temporary_dir.name)
+    ledger = QuotaLedger(self.temporary_dir.name + "/quota_ledger.sqlite3", {"Google": 10})
+    # the only token is taken, the next request would wait 1 second
+    bucket = TokenBucket(rate=1.0, burst=1)
+    bucket.acquire()
+    with patch('metasearch.search_modules.google_search_module.get_response_cache', return_value=cache), \
+         patch('metasearch.search_modules.google_search_module.get_quota_ledger', return_value=ledger), \
+         patch('metasearch.search_modules.google_search_module.get_rate_limiter', return_value=bucket), \
+         patch('metasearch.search_modules.google_search_module.get_http_session', return_value=http_session):
+      started_at: float = time.monotonic()
+      with self.assertRaises(RateLimitExceeded):
+        googleSearch("hello world", timeout=0.2)
+      self.assertLess(time.monotonic() - started_at, 0.2)
+    self.assertEqual(0, http_session.get.call_count)
+    self.assertEqual(0, ledger.get_used("Google"))
+
+  def test_quota_is_reserved_off_the_event_loop_after_the_rate_limit(self):
+    calls: list = []
+    reserve_timeouts: list = []
+    class Ledger:
+      def reserve_or_raise(self, engine: str, timeout: float = None):
+        calls.append(("reserve", threading.get_ident()))
+        reserve_timeouts.append(timeout)
+    class Bucket:
+      async def acquire_async(self, timeout: float = None) -> float:
+        calls.append(("acquire", threading.get_ident()))
+        # as if it waited for 0.25 seconds
+        return 0.25
+    class Response:
+      async def __aenter__(self):
+        return self
+      async def __aexit__(self, *args):
+        return False
+      def raise_for_status(self):
+        pass
+      async def read(self) -> bytes:
+        return json.dumps(SAMPLE_RESULT_PAGE).encode('utf-8')
+    session = MagicMock()
+    session.get.return_value = Response()
+    async def search() -> tuple:
+      return (threading.get_ident(), await googleSearchAsync("hello world", session, timeout=1.0))
+    with patch('metasearch.search_modules.google_search_module.get_response_cache', return_value=ResponseCache(self.temporary_dir.name)), \
+         patch('metasearch.search_modules.google_search_module.get_quota_ledger', return_value=Ledger()), \
+         patch('metasearch.search_modules.google_search_module.get_rate_limiter', return_value=Bucket()):
+      loop_thread, results = asyncio.run(search())
+    self.assertEqual(2, len(results))
+    self.assertEqual(["acquire", "reserve"], [name for name, thread in calls])
+    self.assertEqual(loop_thread, calls[0][1])
+    self.assertNotEqual(loop_thread, calls[1][1])
+    # The ledger waits for the database only for the time left after the rate limit
+    self.assertEqual([0.75], reserve_timeouts)
+
+  def test_start_indices(self):
+    self.assertEqual([1], get_start_indices(10, 1))
+    self.assertEqual([1, 11, 21, 31, 41], get_start_indices(10, 5))
+    # Stop at the 100 results the API returns at most
+    self.assertEqual(10, len(get_start_indices(10, 20)))
+
+  def test_pages_past_total_results_are_dropped(self):
+    start_indices: list = [1, 11, 21, 31, 41]
+    result_pages: list = [make_result_page(10, start_index, 25) for start_index in start_indices]
+    self.assertEqual(result_pages[:3], drop_pages_past_total_results(result_pages, start_indices))
+    result_pages = [make_result_page(10, start_index, 7) for start_index in start_indices]
+    self.assertEqual(result_pages[:1], drop_pages_past_total_results(result_pages, start_indices))
+    # The pages retrieved before a failed page
+    result_pages = [make_result_page(10, start_index, 300) for start_index in start_indices[:2]]
+    self.assertEqual(result_pages, drop_pages_past_total_results(result_pages, start_indices))
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=5)
+  def test_page_depth_is_bounded_by_max_results(self):
+    self.assertEqual(5, get_page_depth(10))
+    self.assertEqual(1, get_page_depth(10, 10))
+    self.assertEqual(2, get_page_depth(10, 11))
+    self.assertEqual(5, get_page_depth(10, 1000))
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=3)
+  def test_pages_are_merged_with_global_ranks(self):
+    started: list = []
+    def retrieve_result_page(query, num_results, start_index, timeout=None):
+      started.append(start_index)
+      return make_result_page(num_results, start_index, 25)
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      results: list = googleSearch("hello world")
+    self.assertEqual([1, 11, 21], sorted(started))
+    self.assertEqual(list(range(1, 26)), [item.get_highest_rank() for item in results])
+    # The pages past the total number of the results are requested at once with the others, and dropped
+    started.clear()
+    with override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=5), \
+      patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      results = googleSearch("hello world")
+    self.assertEqual([1, 11, 21, 31, 41], sorted(started))
+    self.assertEqual(list(range(1, 26)), [item.get_highest_rank() for item in results])
+    self.assertEqual(["https://example.com/" + str(i) for i in range(1, 26)], [item.get_url() for item in results])
+    # Only the pages containing the results to use are retrieved
+    started.clear()
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      results = googleSearch("hello world", max_results=15)
+    self.assertEqual([1, 11], sorted(started))
+    self.assertEqual(15, len(results))
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=4)
+  def test_pages_after_failed_page_are_dropped(self):
+    def retrieve_result_page(query, num_results, start_index, timeout=None):
+      if start_index == 21:
+        raise RuntimeError("quota")
+      return make_result_page(num_results, start_index, 100)
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      results: list = googleSearch("hello world")
+    self.assertEqual(list(range(1, 21)), [item.get_highest_rank() for item in results])
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=3)
+  def test_pages_are_retrieved_concurrently_in_async(self):
+    async def retrieve_result_page_async(query, num_results, start_index, session, timeout=None):
+      await asyncio.sleep(0.1)
+      return make_result_page(num_results, start_index, 1000)
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page_async', side_effect=retrieve_result_page_async):
+      started_at: float = time.monotonic()
+      results: list = asyncio.run(googleSearchAsync("hello world", None))
+      elapsed: float = time.monotonic() - started_at
+    self.assertEqual(list(range(1, 31)), [item.get_highest_rank() for item in results])
+    # the three pages at once, without waiting for the first page
+    self.assertLess(elapsed, 0.2)
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=3)
+  def test_pages_are_retrieved_with_first_page_at_once(self):
+    def retrieve_result_page(query, num_results, start_index, timeout=None):
+      time.sleep(0.1)
+      return make_result_page(num_results, start_index, 1000)
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      started_at: float = time.monotonic()
+      results: list = googleSearch("hello world")
+      elapsed: float = time.monotonic() - started_at
+    self.assertEqual(list(range(1, 31)), [item.get_highest_rank() for item in results])
+    self.assertLess(elapsed, 0.2)
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=2)
+  def test_ranks_follow_start_index_of_pages(self):
+    # The first page has only 8 results (e.g. some are omitted by the API), the second page still starts from the 11th
+    def retrieve_result_page(query, num_results, start_index, timeout=None):
+      result_page: dict = make_result_page(num_results, start_index, 1000)
+      if start_index == 1:
+        result_page["items"] = result_page["items"][:8]
+      return result_page
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page', side_effect=retrieve_result_page):
+      results: list = googleSearch("hello world")
+    self.assertEqual(list(range(1, 9)) + list(range(11, 21)), [item.get_highest_rank() for item in results])
+
+  @override_settings(METASEARCH_GOOGLE_PAGE_DEPTH=3)
+  def test_search_fails_without_first_page(self):
+    async def retrieve_result_page_async(query, num_results, start_index, session, timeout=None):
+      if start_index == 1:
+        raise RuntimeError("unavailable")
+      return make_result_page(num_results, start_index, 1000)
+    with patch('metasearch.search_modules.google_search_module.retrieve_result_page_async', side_effect=retrieve_result_page_async):
+      with self.assertRaises(RuntimeError):
+        asyncio.run(googleSearchAsync("hello world", None))
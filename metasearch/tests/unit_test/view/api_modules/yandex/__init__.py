@@ -0,0 +1 @@
+from metasearch.tests.unit_test.view.api_modules.yandex.test_yandex_search_module import YandexSearchModuleTests
\ No newline at end of file
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+from django.test import TestCase
+from metasearch.search_modules.yandex_search_module import (
+  read_result_items,
+  iterate_chunks,
+  escape_ampersands,
+  yandexSearch
+)
+
+TEST_DATA_DIR = 'metasearch/tests/unit_test/view/api_modules/yandex/test_data/'
+
+class YandexSearchModuleTests(TestCase):
+
+  def setUp(self):
+    with open(TEST_DATA_DIR + 'sample_response_01.xml', mode='rb') as f:
+      self.payload: bytes = f.read()
+
+  def test_reading_result_items(self):
+    results: list = list(read_result_items(iterate_chunks(self.payload)))
+    self.assertEqual(5, len(results))
+    # the highlighted words are kept in the title, and the entities are read as plain text
+    self.assertEqual('"Hello, World!" program - Wikipedia', results[0].get_title())
+    self.assertEqual('https://en.wikipedia.org/wiki/%22Hello,_World!%22_program', results[0].get_url())
+    self.assertIn('A "Hello, World!" program generally is', results[0].get_abstract())
+    self.assertEqual('Hello World | Stories & Games', results[1].get_title())
+    self.assertIn('Read stories & play games', results[1].get_abstract())
+    for rank, result in enumerate(results, 1):
+      self.assertEqual(["Yandex"], result.get_engine())
+      self.assertEqual(rank, result.get_highest_rank())
+
+  def test_reading_headline_and_missing_passages(self):
+    results: list = list(read_result_items(iterate_chunks(self.payload)))
+    # the headline is used for the doc without the passages
+    self.assertEqual('Get the latest BBC World News: international news, features and analysis.', results[2].get_abstract())
+    # the doc without the passages nor the headline, whose lang isn't at doc[8][1]
+    self.assertEqual('National Geographic<World>', results[4].get_title())
+    self.assertEqual('https://www.nationalgeographic.com/world', results[4].get_url())
+    self.assertEqual('', results[4].get_abstract())
+
+  def test_escaping_ampersands(self):
+    results: list = list(read_result_items(iterate_chunks(self.payload)))
+    # bare "&" and the HTML entities don't break the parse
+    self.assertEqual('Tom & Jerry say hello', results[3].get_title())
+    self.assertEqual('https://example.com/search?q=hello&lang=en', results[3].get_url())
+    self.assertIn('Café menu — coffee & tea ☕', results[3].get_abstract())
+    self.assertEqual(b'a &amp; b &amp;c &lt; &#169; &#x2615; &amp;unknown;', b''.join(escape_ampersands([b'a & b &c &lt; &copy; &#x2615; &unknown;'])))
+
+  def test_reading_in_small_chunks(self):
+    # the results don't depend on where the response is split, even inside the references
+    expected: list = list(read_result_items(iterate_chunks(self.payload)))
+    for chunk_size in [1, 3, 7, 64]:
+      actual: list = list(read_result_items(iterate_chunks(self.payload, chunk_size)))
+      self.assertEqual([str(item) for item in expected], [str(item) for item in actual])
+      self.assertEqual([item.get_abstract() for item in expected], [item.get_abstract() for item in actual])
+
+  def test_stopping_at_max_results(self):
+    chunks: list = []
+    def record(payload: bytes, chunk_size: int):
+      for chunk in iterate_chunks(payload, chunk_size):
+        chunks.append(chunk)
+        yield chunk
+    results: list = list(read_result_items(record(self.payload, 256), 2))
+    self.assertEqual(2, len(results))
+    self.assertEqual('Hello World | Stories & Games', results[1].get_title())
+    # the rest of the response isn't read
+    self.assertLess(len(chunks) * 256, len(self.payload))
+
+  @patch('metasearch.search_modules.yandex_search_module.request_get_content')
+  def test_yandex_search(self, request_get_content):
+    request_get_content.return_value = self.payload
+    with patch('metasearch.search_modules.yandex_search_module.get_quota_ledger'):
+      results: list = yandexSearch("hello world yandex test", max_results=3)
+    self.assertEqual(3, len(results))
+    self.assertEqual('BBC News - World', results[2].get_title())
\ No newline at end of file
@@ -0,0 +1,95 @@
+import asyncio
+import tempfile
+import importlib
+import threading
+from unittest.mock import patch
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches
+from metasearch import views
+from metasearch.search_modules import duckduckgo_search_module
+from metasearch.search_modules.response_cache import ResponseCache
+from metasearch.search_modules.http_transport import get_async_http_session
+from metasearch.tests.unit_test.view.mock_search_engines import mock_search_engines_async
+
+TEST_DATA_DIR = 'metasearch/tests/unit_test/view/scraping_modules/duckduckgo/test_data/'
+
+def route_search(async_views: bool):
+  # Route /metasearch/search/ as metasearch/urls.py does with settings.METASEARCH_ASYNC_VIEWS
+  # The root URLconf is reloaded too, since it holds the resolver of metasearch.urls with its patterns cached
+  with override_settings(METASEARCH_ASYNC_VIEWS=async_views):
+    importlib.reload(importlib.import_module('metasearch.urls'))
+  importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+  clear_url_caches()
+
+async def call_asgi_application(application, scope: dict, messages: list) -> list:
+  # Send the messages to the ASGI application, and return the messages it sends back
+  sent_messages: list = []
+  async def receive() -> dict:
+    if len(messages) > 0:
+      return messages.pop(0)
+    # Never disconnect before the response is sent
+    await asyncio.Event().wait()
+  async def send(message: dict):
+    sent_messages.append(message)
+  await application(scope, receive, send)
+  return sent_messages
+
+@override_settings(METASEARCH_SINGLE_FLIGHT_ACROSS_WORKERS=False, METASEARCH_RESULT_CACHE_ENABLED=False)
+class AsyncSearchViewTests(TestCase):
+
+  def setUp(self):
+    route_search(True)
+
+  def tearDown(self):
+    route_search(False)
+
+  def test_search_through_the_asgi_application(self):
+    from DjangoMetasearch.asgi import application
+    threads: dict = {}
+    filter_search_results = views.filter_search_results
+    def filter_on_thread(results: list) -> list:
+      threads["filter"] = threading.get_ident()
+      return filter_search_results(results)
+    async def serve() -> tuple:
+      threads["loop"] = threading.get_ident()
+      http_scope: dict = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/metasearch/search/", "raw_path": b"/metasearch/search/", "query_string": b"query=asgi+view+test",
+        "root_path": "", "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 50000), "server": ("testserver", 80)
+      }
+      response_messages: list = await call_asgi_application(application, http_scope, [{"type": "http.request", "body": b"", "more_body": False}])
+      # The session shared on the event loop is closed when the server shuts down
+      session = get_async_http_session()
+      lifespan_messages: list = await call_asgi_application(
+        application, {"type": "lifespan", "asgi": {"version": "3.0"}}, [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+      )
+      return (response_messages, lifespan_messages, session)
+    with mock_search_engines_async(), patch('metasearch.views.filter_search_results', filter_on_thread):
+      response_messages, lifespan_messages, session = asyncio.run(serve())
+    self.assertEqual(200, response_messages[0]["status"])
+    body: str = b"".join(message.get("body", b"") for message in response_messages[1:]).decode("utf-8")
+    self.assertIn("https://www.example1.com/Google", body)
+    # The results are filtered off the event loop, so the other searches on the loop aren't blocked
+    self.assertNotEqual(threads["loop"], threads["filter"])
+    self.assertEqual(["lifespan.startup.complete", "lifespan.shutdown.complete"], [message["type"] for message in lifespan_messages])
+    self.assertTrue(session.closed)
+
+  def test_page_is_parsed_off_the_event_loop(self):
+    threads: dict = {}
+    push_into_ResultItems = duckduckgo_search_module.push_into_ResultItems
+    def push_on_thread(page: str, max_results: int = None) -> list:
+      threads["parse"] = threading.get_ident()
+      return push_into_ResultItems(page, max_results)
+    async def search() -> list:
+      threads["loop"] = threading.get_ident()
+      return await duckduckgo_search_module.duckduckgoSearchAsync("Nagorno-Karabakh conflict", None)
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = ResponseCache(cache_dir)
+      with open(TEST_DATA_DIR + 'sample_page_01.html', mode='r') as f:
+        cache.put("DuckDuckGo", "nagorno-karabakh conflict", {}, f.read().encode('utf-8'), "utf-8")
+      with patch('metasearch.search_modules.duckduckgo_search_module.get_response_cache', return_value=cache), \
+        patch('metasearch.search_modules.duckduckgo_search_module.push_into_ResultItems', push_on_thread):
+        results: list = asyncio.run(search())
+    self.assertEqual(10, len(results))
+    self.assertNotEqual(threads["loop"], threads["parse"])
\ No newline at end of file
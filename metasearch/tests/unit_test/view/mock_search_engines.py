@@ -0,0 +1,69 @@
+import time
+import asyncio
+import contextlib
+from unittest.mock import patch
+from metasearch.models import ResultItem
+
+# Search functions of the search modules called by metasearch(), replaced by the mock search engines
+SEARCHFUNCTIONS = {
+  "Google": 'metasearch.search_modules.google_search_module.googleSearch',
+  "Yahoo!": 'metasearch.search_modules.yahoo_search_module.yahooSearch',
+  "DuckDuckGo": 'metasearch.search_modules.duckduckgo_search_module.duckduckgoSearch',
+  "Yandex": 'metasearch.search_modules.yandex_search_module.yandexSearch'
+}
+# Asynchronous versions called by metasearch_async()
+ASYNCSEARCHFUNCTIONS = {
+  "Google": 'metasearch.search_modules.google_search_module.googleSearchAsync',
+  "Yahoo!": 'metasearch.search_modules.yahoo_search_module.yahooSearchAsync',
+  "DuckDuckGo": 'metasearch.search_modules.duckduckgo_search_module.duckduckgoSearchAsync',
+  "Yandex": 'metasearch.search_modules.yandex_search_module.yandexSearchAsync'
+}
+
+def mock_search(engine_name: str, delay: float = 0.0):
+  # Search function returning 5 results of the search engine, after waiting for the given seconds
+  def search(query: str, timeout: float = None, max_results: int = None) -> list:
+    if delay > 0:
+      time.sleep(delay)
+    results: list = []
+    for i in range(1, 6):
+      item = ResultItem("Article " + str(i), "https://www.example" + str(i) + ".com/" + engine_name, engine_name, i)
+      item.set_abstract("Snippet " + str(i))
+      results.append(item)
+    return results
+  return search
+
+def mock_search_async(engine_name: str, delay: float = 0.0):
+  # Coroutine function returning the same results as mock_search
+  search = mock_search(engine_name)
+  async def search_async(query: str, session, timeout: float = None, max_results: int = None) -> list:
+    if delay > 0:
+      await asyncio.sleep(delay)
+    return search(query, timeout=timeout, max_results=max_results)
+  return search_async
+
+def failing_search(query: str, timeout: float = None, max_results: int = None) -> list:
+  raise ConnectionError("unreachable")
+
+@contextlib.contextmanager
+def mock_search_engines(delay: float = 0.0, searches: dict = None):
+  '''
+  Replaces the search engines with mock_search in the block of a with statement
+  ex.
+    with mock_search_engines(searches={"DuckDuckGo": failing_search}):
+      response = views.search(request)
+  searches : name of the search engine -> search function used instead of mock_search
+  '''
+  searches = searches or {}
+  with contextlib.ExitStack() as stack:
+    for engine_name, target in SEARCHFUNCTIONS.items():
+      stack.enter_context(patch(target, searches.get(engine_name, mock_search(engine_name, delay))))
+    yield
+
+@contextlib.contextmanager
+def mock_search_engines_async(delay: float = 0.0, searches: dict = None):
+  # Same as mock_search_engines for the asynchronous versions of the search functions, with mock_search_async
+  searches = searches or {}
+  with contextlib.ExitStack() as stack:
+    for engine_name, target in ASYNCSEARCHFUNCTIONS.items():
+      stack.enter_context(patch(target, searches.get(engine_name, mock_search_async(engine_name, delay))))
+    yield
\ No newline at end of file
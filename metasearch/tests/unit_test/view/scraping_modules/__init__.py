@@ -1 +1,2 @@
-from metasearch.tests.unit_test.view.scraping_modules.duckduckgo import SearchModuleTests
\ No newline at end of file
+from metasearch.tests.unit_test.view.scraping_modules.duckduckgo import SearchModuleTests
+from metasearch.tests.unit_test.view.scraping_modules.yahoo import YahooSearchModuleTests
\ No newline at end of file
@@ -1,13 +1,17 @@
+from html.parser import HTMLParser
+from unittest.mock import patch
 from bs4 import BeautifulSoup
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from metasearch.models import ResultItem
+from metasearch.search_modules.duckduckgo_parsers import ResultItemTokenizer
 from metasearch.search_modules.duckduckgo_search_module import (
   push_into_ResultItems,
   retrieve_result_page,
   pick_result_item_parts,
   pick_title_from,
   pick_url_from,
-  pick_snippet_from
+  pick_snippet_from,
+  RESULT_PAGE_PARSERS
 )
 
 
@@ -153,6 +157,93 @@ class SearchModuleTests(TestCase):
     expected_last_item: ResultItem = ResultItem("Nagorno-Karabakh profile - BBC News", "https://www.bbc.com/news/world-europe-18270325", "DuckDuckGo", 10)
     self.assertEqual(str(expected_last_item), str(search_results[9]))
 
+  def test_parsers_pick_identical_contents(self):
+    # Every parser picks the same contents as the BeautifulSoup parser from all the sample pages
+    for file_name in ['sample_page_01.html', 'sample_page_02.html', 'sample_page_03.html']:
+      with open(TEST_DATA_DIR + file_name, mode='r') as f:
+        result_page: str = f.read()
+      expected_contents: list = RESULT_PAGE_PARSERS["beautifulsoup"](result_page)
+      self.assertLess(0, len(expected_contents))
+      for name in ["tokenizer", "lxml"]:
+        self.assertEqual(expected_contents, RESULT_PAGE_PARSERS[name](result_page), name + " " + file_name)
+
+  def test_parsers_pick_identical_contents_from_truncated_pages(self):
+    # The result items left open at the end of a truncated page are picked as BeautifulSoup does
+    for file_name in ['sample_page_01.html', 'sample_page_03.html']:
+      with open(TEST_DATA_DIR + file_name, mode='r') as f:
+        result_page: str = f.read()
+      for end in range(len(result_page) // 20, len(result_page), len(result_page) // 20):
+        expected_contents: list = RESULT_PAGE_PARSERS["beautifulsoup"](result_page[:end])
+        for name in ["tokenizer", "lxml"]:
+          self.assertEqual(expected_contents, RESULT_PAGE_PARSERS[name](result_page[:end]), name + " " + file_name + " " + str(end))
+    item: str = '<div class="result"><h2 class="result__title"><a class="result__a">T</a></h2><a class="result__url" href="https://a.example.com/">a</a><div class="result__snippet">Snippet</div></div>'
+    for name in ["beautifulsoup", "tokenizer", "lxml"]:
+      self.assertEqual([("T", "https://a.example.com/", "Snip")], RESULT_PAGE_PARSERS[name](item[:-15]), name)
+
+  def test_parsers_pick_nested_items_as_beautifulsoup(self):
+    # A result item nested in another one is picked on its own, after the outer one
+    def make_item(n: int, inner: str = "") -> str:
+      return (
+        '<div class="result"><h2 class="result__title"><a class="result__a">T' + str(n) + '</a></h2>'
+        '<a class="result__url" href="https://' + str(n) + '.example.com/">u</a>' + inner + '<div class="result__snippet">S' + str(n) + '</div></div>'
+      )
+    result_pages: list = [
+      '<div class="web-result">' + make_item(1) + make_item(2) + '</div>' + make_item(3),
+      make_item(1, make_item(2)) + make_item(3),
+      make_item(1, make_item(2))[:-6]
+    ]
+    for result_page in result_pages:
+      expected_contents: list = RESULT_PAGE_PARSERS["beautifulsoup"](result_page)
+      for name in ["tokenizer", "lxml"]:
+        self.assertEqual(expected_contents, RESULT_PAGE_PARSERS[name](result_page), name)
+        for max_results in range(1, len(expected_contents) + 1):
+          self.assertEqual(expected_contents[:max_results], RESULT_PAGE_PARSERS[name](result_page, max_results), name)
+    self.assertEqual(
+      [("T1", "https://1.example.com/", "S1"), ("T1", "https://1.example.com/", "S1"), ("T2", "https://2.example.com/", "S2"), ("T3", "https://3.example.com/", "S3")],
+      RESULT_PAGE_PARSERS["tokenizer"](result_pages[0])
+    )
+
+  def test_parsers_skip_incomplete_items(self):
+    result_page: str = (
+      '<div class="result"><h2 class="result__title"><a class="result__a" href="#">A &amp; <b>B</b><!-- c --></a></h2>'
+      '<a class="result__url" href="https://a.example.com/">a.example.com</a><div><a class="result__snippet">S<img src="x"/>nippet</a></div></div>'
+      '<div class="web-result"><h2 class="result__title"><a class="result__a">No URL</a></h2><div class="result__snippet">-</div></div>'
+      '<div class="result"><h2 class="other">Other</h2><h2 class="result__title"><a class="result__a">Second heading</a></h2>'
+      '<a class="result__url" href="https://b.example.com/">b</a><div class="result__snippet">-</div></div>'
+    )
+    for name in ["beautifulsoup", "tokenizer", "lxml"]:
+      self.assertEqual([("A & B", "https://a.example.com/", "Snippet"), ("Second heading", "https://b.example.com/", "-")], RESULT_PAGE_PARSERS[name](result_page), name)
+
+  def test_parsers_stop_at_max_results(self):
+    with open(TEST_DATA_DIR + 'sample_page_03.html', mode='r') as f:
+      result_page: str = f.read()
+    expected_contents: list = RESULT_PAGE_PARSERS["beautifulsoup"](result_page)
+    for name in ["beautifulsoup", "tokenizer", "lxml"]:
+      self.assertEqual(expected_contents[:5], RESULT_PAGE_PARSERS[name](result_page, 5), name)
+      self.assertEqual(expected_contents, RESULT_PAGE_PARSERS[name](result_page, 100), name)
+    # The tokenizer stops reading the page after the fifth result item
+    with patch('metasearch.search_modules.duckduckgo_parsers.CHUNKSIZE', 1000):
+      with patch.object(ResultItemTokenizer, 'feed', autospec=True, side_effect=HTMLParser.feed) as feed:
+        RESULT_PAGE_PARSERS["tokenizer"](result_page, 5)
+    self.assertLess(feed.call_count * 1000, len(result_page) / 2)
+
+  def test_push_into_resultitems_with_max_results(self):
+    with open(TEST_DATA_DIR + 'sample_page_01.html', mode='r') as f:
+      result_page: str = f.read()
+    search_results: list = push_into_ResultItems(result_page, 3)
+    self.assertEqual(3, len(search_results))
+    self.assertEqual([1, 2, 3], [item.get_highest_rank() for item in search_results])
+
+  @override_settings(METASEARCH_DUCKDUCKGO_PARSER="beautifulsoup")
+  def test_push_into_resultitems_with_beautifulsoup(self):
+    with open(TEST_DATA_DIR + 'sample_page_03.html', mode='r') as f:
+      result_page: str = f.read()
+    beautifulsoup_results: list = push_into_ResultItems(result_page)
+    with override_settings(METASEARCH_DUCKDUCKGO_PARSER="tokenizer"):
+      tokenizer_results: list = push_into_ResultItems(result_page)
+    self.assertEqual([str(item) for item in beautifulsoup_results], [str(item) for item in tokenizer_results])
+    self.assertEqual([item.get_abstract() for item in beautifulsoup_results], [item.get_abstract() for item in tokenizer_results])
+
   def test_retrieve_result_page_01(self):
     query: str = "5G in japan"
     result_page: str = retrieve_result_page(query)
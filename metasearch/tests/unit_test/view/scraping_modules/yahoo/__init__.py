@@ -0,0 +1 @@
+from metasearch.tests.unit_test.view.scraping_modules.yahoo.test_yahoo_search_module import YahooSearchModuleTests
\ No newline at end of file
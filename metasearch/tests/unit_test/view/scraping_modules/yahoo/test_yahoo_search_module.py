@@ -0,0 +1,43 @@
+from django.test import TestCase
+from metasearch.search_modules.yahoo_search_module import (
+  cut_after_result_items,
+  push_into_ResultItems
+)
+
+def make_result_item_part(n: int) -> str:
+  # A search result item in the markup of the Yahoo! result page
+  return (
+    '<div class="dd algo algo-sr relsrch Sr" data-n="' + str(n) + '">'
+    '<div class="compTitle options-toggle"><h3 class="title"><a class="ac-algo fz-l ac-21th lh-24" href="https://example.com/' + str(n) + '">Article ' + str(n) + '</a></h3></div>'
+    '<div class="compText aAbs"><p class="fz-ms lh-1_43x">Snippet &amp; ' + str(n) + '</p></div>'
+    '</div>'
+  )
+
+SAMPLE_PAGE: bytes = (
+  '<!DOCTYPE html><html><head><title>hello world - Yahoo Search Results</title></head><body><div id="web"><ol>'
+  + ''.join(['<li>' + make_result_item_part(n) + '</li>' for n in range(1, 8)])
+  + '</ol><div class="dd algo">Not a result item</div></div></body></html>'
+).encode('utf-8')
+
+class YahooSearchModuleTests(TestCase):
+
+  def test_push_into_resultitems(self):
+    results: list = push_into_ResultItems(SAMPLE_PAGE, "utf-8")
+    self.assertEqual(7, len(results))
+    self.assertEqual(["https://example.com/" + str(n) for n in range(1, 8)], [item.get_url() for item in results])
+    self.assertEqual("Article 1", results[0].get_title())
+    self.assertEqual("Snippet & 1", results[0].get_abstract())
+    self.assertEqual(list(range(1, 8)), [item.get_highest_rank() for item in results])
+
+  def test_push_into_resultitems_with_max_results(self):
+    results: list = push_into_ResultItems(SAMPLE_PAGE, "utf-8", 3)
+    self.assertEqual(["https://example.com/1", "https://example.com/2", "https://example.com/3"], [item.get_url() for item in results])
+    self.assertEqual(7, len(push_into_ResultItems(SAMPLE_PAGE, "utf-8", 10)))
+
+  def test_page_is_cut_before_unneeded_result_items(self):
+    cut_page: bytes = cut_after_result_items(SAMPLE_PAGE, 3)
+    self.assertIn(b'href="https://example.com/3"', cut_page)
+    self.assertNotIn(b'data-n="4"', cut_page)
+    self.assertTrue(SAMPLE_PAGE.startswith(cut_page))
+    self.assertEqual(SAMPLE_PAGE, cut_after_result_items(SAMPLE_PAGE, None))
+    self.assertEqual(SAMPLE_PAGE, cut_after_result_items(SAMPLE_PAGE, 7))
@@ -1,11 +1,20 @@
 import sys
+import time
+import asyncio
+import threading
 from django.test import TestCase
 from unittest.mock import patch
+from asgiref.sync import async_to_sync
 from metasearch.tests.test_utils import TestUtils
 from metasearch.models import ResultItem
+from metasearch import domain_categories
+from metasearch.tests.unit_test.view.mock_search_engines import mock_search_engines
 from metasearch.views import (
     CATEGORIES,
     metasearch, 
+    collect_search_results_from_multiple_search_engines,
+    collect_search_results_from_multiple_search_engines_async,
+    call_search_engine,
     result_classification,
     remove_result_item_duplication, 
     remove_movie_contents_from,
@@ -589,7 +598,7 @@ class TestDataProvider:
     return [highest, lowest]
 
 class MockSearchModule:
-  def mock_google_search(self) -> list:
+  def mock_google_search(self, timeout: float = None, max_results: int = None) -> list:
     results = []
     results.append(ResultItem("Article 01", "http://www.googleexample1.com", "Google"))  
     results.append(ResultItem("Article 02", "http://www.googleexample2.com", "Google"))
@@ -605,7 +614,7 @@ class MockSearchModule:
       results[i].set_rank(i + 1)
     return results  
 
-  def mock_yahoo_search(self) -> list:
+  def mock_yahoo_search(self, timeout: float = None, max_results: int = None) -> list:
     results = []
     results.append(ResultItem("Article 01", "http://www.yahooexample1.com", "Yahoo!"))  
     results.append(ResultItem("Article 02", "http://www.yahooexample2.com", "Yahoo!"))
@@ -621,6 +630,37 @@ class MockSearchModule:
       results[i].set_rank(i + 1)
     return results  
 
+  def mock_slow_duckduckgo_search(self, timeout: float = None, max_results: int = None) -> list:
+    time.sleep(0.5)
+    results = []
+    for i in range(0, 30):
+      results.append(ResultItem("Article " + str(i + 1), "https://www.duckduckgoexample" + str(i + 1) + ".com", "DuckDuckGo", i + 1))
+    return results
+
+  def mock_slow_yandex_search(self, timeout: float = None, max_results: int = None) -> list:
+    time.sleep(0.5)
+    return [ResultItem("Article 01", "https://www.yandexexample1.com", "Yandex", 1)]
+
+  def mock_failing_search(self, timeout: float = None, max_results: int = None) -> list:
+    raise ConnectionError("mock connection error")
+
+  async def mock_google_search_async(self, session, timeout: float = None, max_results: int = None) -> list:
+    return MockSearchModule.mock_google_search(self)
+
+  async def mock_yahoo_search_async(self, session, timeout: float = None, max_results: int = None) -> list:
+    raise ConnectionError("mock connection error")
+
+  async def mock_slow_duckduckgo_search_async(self, session, timeout: float = None, max_results: int = None) -> list:
+    await asyncio.sleep(0.1)
+    results = []
+    for i in range(0, 30):
+      results.append(ResultItem("Article " + str(i + 1), "https://www.duckduckgoexample" + str(i + 1) + ".com", "DuckDuckGo", i + 1))
+    return results
+
+  async def mock_slow_yandex_search_async(self, session, timeout: float = None, max_results: int = None) -> list:
+    await asyncio.sleep(0.5)
+    return [ResultItem("Article 01", "https://www.yandexexample1.com", "Yandex", 1)]
+
 class MetasearchFunctionTests(TestCase):
   # Check whether the actual list of search results contains the element of the expected list of search results by the length of the list and 3 points of each result item: title, URL, and string expression of the ResultItem object
   def compare_the_list_of_result_items(self, method_name: str, expected: list, actual: list):
@@ -653,6 +693,91 @@ class MetasearchFunctionTests(TestCase):
   def test_metasearch(self):
     pass
 
+  @patch('metasearch.search_modules.google_search_module.googleSearch', MockSearchModule.mock_google_search)
+  @patch('metasearch.search_modules.yahoo_search_module.yahooSearch', MockSearchModule.mock_yahoo_search)
+  @patch('metasearch.search_modules.duckduckgo_search_module.duckduckgoSearch', MockSearchModule.mock_slow_duckduckgo_search)
+  @patch('metasearch.search_modules.yandex_search_module.yandexSearch', MockSearchModule.mock_slow_yandex_search)
+  def test_collect_search_results_calls_search_engines_concurrently(self):
+    started_at: float = time.monotonic()
+    results: list = collect_search_results_from_multiple_search_engines("query")
+    elapsed: float = time.monotonic() - started_at
+    # Two engines sleep 0.5 seconds each, so it takes less than the sum of them when they run at the same time
+    self.assertLess(elapsed, 0.9)
+    # Results are merged in the order of the engines, and only 10 items are kept from DuckDuckGo
+    self.assertEqual(10 + 10 + 10 + 1, len(results))
+    self.assertEqual(["Google"], results[0].get_engine())
+    self.assertEqual(["Yahoo!"], results[10].get_engine())
+    self.assertEqual(["DuckDuckGo"], results[20].get_engine())
+    self.assertEqual("Article 10", results[29].get_title())
+    self.assertEqual(["Yandex"], results[30].get_engine())
+
+  @patch('metasearch.search_modules.google_search_module.googleSearch', MockSearchModule.mock_google_search)
+  @patch('metasearch.search_modules.yahoo_search_module.yahooSearch', MockSearchModule.mock_failing_search)
+  @patch('metasearch.search_modules.duckduckgo_search_module.duckduckgoSearch', MockSearchModule.mock_slow_duckduckgo_search)
+  @patch('metasearch.search_modules.yandex_search_module.yandexSearch', MockSearchModule.mock_slow_yandex_search)
+  def test_collect_search_results_continues_without_slow_or_failing_engines(self):
+    dropped_engines: list = []
+    started_at: float = time.monotonic()
+    results: list = collect_search_results_from_multiple_search_engines("query", timeout=0.2, dropped_engines=dropped_engines)
+    elapsed: float = time.monotonic() - started_at
+    # It doesn't wait for the slow engines after the budget runs out
+    self.assertLess(elapsed, 0.45)
+    # Only the results from Google are returned, and the other engines are recorded as dropped
+    self.assertEqual(10, len(results))
+    self.assertEqual(["Yahoo!", "DuckDuckGo", "Yandex"], dropped_engines)
+
+  @patch('metasearch.search_modules.google_search_module.googleSearchAsync', MockSearchModule.mock_google_search_async)
+  @patch('metasearch.search_modules.yahoo_search_module.yahooSearchAsync', MockSearchModule.mock_yahoo_search_async)
+  @patch('metasearch.search_modules.duckduckgo_search_module.duckduckgoSearchAsync', MockSearchModule.mock_slow_duckduckgo_search_async)
+  @patch('metasearch.search_modules.yandex_search_module.yandexSearchAsync', MockSearchModule.mock_slow_yandex_search_async)
+  def test_collect_search_results_async_continues_without_slow_or_failing_engines(self):
+    dropped_engines: list = []
+    started_at: float = time.monotonic()
+    results: list = async_to_sync(collect_search_results_from_multiple_search_engines_async)("query", timeout=0.3, dropped_engines=dropped_engines)
+    elapsed: float = time.monotonic() - started_at
+    # It doesn't wait for the slow engine after the budget runs out
+    self.assertLess(elapsed, 0.45)
+    # Results are merged in the order of the engines, and only 10 items are kept from DuckDuckGo
+    self.assertEqual(10 + 10, len(results))
+    self.assertEqual(["Google"], results[0].get_engine())
+    self.assertEqual(["DuckDuckGo"], results[10].get_engine())
+    self.assertEqual(["Yahoo!", "Yandex"], dropped_engines)
+
+  def test_collect_search_results_of_concurrent_searches_beyond_8_threads(self):
+    # 6 searches make 24 engine calls at the same time, 3 times what 8 threads serve (2 searches)
+    # With 8 threads the calls of the third round would wait until 0.4 seconds and end after the budget
+    dropped_engines: list = [[] for i in range(0, 6)]
+    results: list = [None] * 6
+    def search(i: int):
+      results[i] = collect_search_results_from_multiple_search_engines("query " + str(i), timeout=0.5, dropped_engines=dropped_engines[i])
+    with mock_search_engines(delay=0.2):
+      started_at: float = time.monotonic()
+      threads: list = [threading.Thread(target=search, args=(i,)) for i in range(0, 6)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+      elapsed: float = time.monotonic() - started_at
+    self.assertEqual([[]] * 6, dropped_engines)
+    self.assertEqual([4 * 5] * 6, [len(result) for result in results])
+    self.assertLess(elapsed, 0.45)
+
+  def test_engine_call_gets_the_time_left_until_the_deadline(self):
+    timeouts: list = []
+    def search(query: str, timeout: float = None, max_results: int = None) -> list:
+      timeouts.append(timeout)
+      return []
+    call_search_engine("Google", None, None, time.monotonic() + 0.3, search, "query", max_results=None)
+    self.assertLessEqual(timeouts[0], 0.3)
+    self.assertGreater(timeouts[0], 0.2)
+    # The call which waited for a thread until the deadline is skipped
+    with self.assertRaises(TimeoutError):
+      call_search_engine("Google", None, None, time.monotonic() - 0.01, search, "query", max_results=None)
+    self.assertEqual(1, len(timeouts))
+    # Without the budget, the search engine has no timeout
+    call_search_engine("Google", None, None, None, search, "query", max_results=None)
+    self.assertEqual(None, timeouts[1])
+
   def test_removing_search_result_item_duplication_works_correctly(self):
     # Removing of the duplication of search result items works fine with only one item
     raw_search_results: list = TestDataProvider.test_data_duplication_01()
@@ -670,6 +795,40 @@ class MetasearchFunctionTests(TestCase):
     expected_search_result: list = TestDataProvider.test_data_duplication_03_expected()
     self.compare_the_list_of_result_items(sys._getframe().f_code.co_name + ": third case", expected_search_result, search_result_without_duplication)
 
+  def test_removing_duplication_of_url_variants(self):
+    # The variants of a URL pointing to the same page are merged into the first item
+    raw_search_results: list = [
+      ResultItem("Article 1", "https://www.example1.com/news/", "Google", 2),
+      ResultItem("Article 2", "https://www.example2.com/example", "Google", 3),
+      ResultItem("Article 1 | Example", "http://example1.com/news", "Yahoo!", 5),
+      ResultItem("Article 1", "https://example1.com/news?utm_source=feed&utm_medium=rss#comments", "Yandex", 1),
+      ResultItem("Article 3", "https://www.example1.com/news?id=3", "DuckDuckGo", 4)
+    ]
+    actual_results: list = remove_result_item_duplication(raw_search_results)
+    self.assertEqual(
+      ["https://www.example1.com/news/", "https://www.example2.com/example", "https://www.example1.com/news?id=3"],
+      [item.get_url() for item in actual_results]
+    )
+    self.assertEqual(["Google", "Yahoo!", "Yandex"], actual_results[0].get_engine())
+    self.assertEqual(1, actual_results[0].get_highest_rank())
+    self.assertEqual(5, actual_results[0].get_lowest_rank())
+    self.assertEqual(["DuckDuckGo"], actual_results[2].get_engine())
+
+  def test_removing_duplication_of_same_titles(self):
+    # The items having the same title are merged as the items having the same URL, whatever their URLs
+    raw_search_results: list = [
+      ResultItem("Article 1", "https://www.example1.com/news", "Google", 2),
+      ResultItem("Article 2", "https://www.example2.com/example", "Google", 3),
+      ResultItem("  article   1 ", "https://amp.example1.com/news/1", "Yahoo!", 6),
+      ResultItem("Article 1 | Example", "https://amp.example1.com/news/1?utm_source=feed", "Yandex", 1)
+    ]
+    actual_results: list = remove_result_item_duplication(raw_search_results)
+    self.assertEqual(["https://www.example1.com/news", "https://www.example2.com/example"], [item.get_url() for item in actual_results])
+    # The URL of the item merged by its title leads to the first item too
+    self.assertEqual(["Google", "Yahoo!", "Yandex"], actual_results[0].get_engine())
+    self.assertEqual(1, actual_results[0].get_highest_rank())
+    self.assertEqual(6, actual_results[0].get_lowest_rank())
+
   def test_categorize_search_result_item_classification_by_domain(self): 
     # Prepare the domain to be detected
     domains = ["abcde.com", "example.org", "sample.net", "abc.tokyo", "abcde.gov"]
@@ -752,6 +911,27 @@ class MetasearchFunctionTests(TestCase):
     # Assert not categorized results
     self.compare_the_list_of_result_items(sys._getframe().f_code.co_name + ": not categorized results", expected_categorization_remains, actual_categorization_remains)
 
+  def test_categorize_items_without_known_top_level_domain(self):
+    # The items whose URL has no known top level domain have no domain (None),
+    # and are categorized as portals and blogs instead of failing the whole search
+    items: list = [
+      ResultItem("IP address", "http://192.168.0.1/page", "Google", 1),
+      ResultItem("Intranet", "https://intranet.notatld/page", "Yahoo!", 2),
+      ResultItem("Wikipedia", "https://en.wikipedia.org/wiki/Page", "Google", 3)
+    ]
+    categorized_items: list = result_classification(items)
+    self.assertEqual(
+      {
+        "http://192.168.0.1/page": CATEGORIES["Portals and Blogs"],
+        "https://intranet.notatld/page": CATEGORIES["Portals and Blogs"],
+        "https://en.wikipedia.org/wiki/Page": CATEGORIES["Encyclopedia"]
+      },
+      {item.get_url(): category for category, item in categorized_items}
+    )
+    # They are grouped together as the items of a single domain
+    self.assertEqual([None, "wikipedia.org"], list(separate_items_by_domain(items).keys()))
+    self.assertEqual(items[:2], separate_items_by_domain(items)[None])
+
   def test_categorize_uncategorized_portals_and_blogs(self):
     # pick_portal_and_blog_from_items function now just returns all items given to the argument
     # so check if it returns the given items array as it is
@@ -886,6 +1066,38 @@ class MetasearchFunctionTests(TestCase):
       ac_list.append(results[1])
     self.compare_the_list_of_result_items(sys._getframe().f_code.co_name, ex_list, ac_list)
 
+  def test_result_classification_matches_picking_category_by_category(self):
+    # Classifying by the index of the domains gives the same categories in the same order as picking them one by one
+    original_search_results: list = TestDataProvider.test_data_domain_classification_complex_01()
+    expected_results: list = []
+    classified: list = pick_encyclopedia_from_items(list(original_search_results))
+    expected_results.extend([[CATEGORIES["Encyclopedia"], item] for item in classified[0]])
+    classified = pick_famous_news_agencies_from_items(classified[1])
+    expected_results.extend([[CATEGORIES["Famous News Agencies"], item] for item in classified[0]])
+    classified = pick_online_news_agencies_from_items(classified[1])
+    expected_results.extend([[CATEGORIES["Online News Agencies"], item] for item in classified[0]])
+    expected_results.extend([[CATEGORIES["Portals and Blogs"], item] for item in classified[1]])
+    actual_results: list = result_classification(original_search_results)
+    self.assertEqual([result[0] for result in expected_results], [result[0] for result in actual_results])
+    self.assertEqual([str(result[1]) for result in expected_results], [str(result[1]) for result in actual_results])
+    # The given list is left as it is
+    self.assertEqual(len(TestDataProvider.test_data_domain_classification_complex_01()), len(original_search_results))
+
+  def test_domain_index_keeps_the_category_checked_first(self):
+    domain_index: dict = domain_categories.build_domain_index((
+      (CATEGORIES["Encyclopedia"], ("example.org",)),
+      (CATEGORIES["Famous News Agencies"], ("example.com", "example.org")),
+      (CATEGORIES["Online News Agencies"], ("example.com", "example.net"))
+    ))
+    self.assertEqual({
+      "example.org": CATEGORIES["Encyclopedia"],
+      "example.com": CATEGORIES["Famous News Agencies"],
+      "example.net": CATEGORIES["Online News Agencies"]
+    }, domain_index)
+    self.assertEqual(CATEGORIES["Encyclopedia"], domain_categories.classify_domain("wikipedia.org"))
+    self.assertEqual(CATEGORIES["Portals and Blogs"], domain_categories.classify_domain("example.com"))
+    self.assertEqual(CATEGORIES["Portals and Blogs"], domain_categories.classify_domain(None))
+
   def test_pick_highest_ranked_item_works_correctly(self):
     ''' test set 1 '''
     original_search_results: list = TestDataProvider.test_data_rank_comparison_01()
@@ -912,6 +1124,15 @@ class MetasearchFunctionTests(TestCase):
     actual_results: list = pick_lowest_ranked_result_item(original_search_results)
     self.compare_the_list_of_result_items(sys._getframe().f_code.co_name + ": test set 2", expected_results, actual_results)
 
+  def test_pick_lowest_ranked_item_of_merged_items(self):
+    # The items whose highest rank is the lowest rank of the given items are picked,
+    # an item merged from the engines ranking it differently isn't picked by its lowest rank
+    first_item: ResultItem = ResultItem("Article 1", "https://www.example1.com", "Google", 1)
+    merged_item: ResultItem = ResultItem("Article 2", "https://www.example2.com", "Google", 3)
+    merged_item.merge(ResultItem("Article 2", "https://www.example2.com", "Yahoo!", 9))
+    last_item: ResultItem = ResultItem("Article 3", "https://www.example3.com", "Google", 9)
+    self.assertEqual([last_item], pick_lowest_ranked_result_item([first_item, merged_item, last_item]))
+
   def test_pick_one_highest_and_one_lowest_works_correctly(self):
     ''' test set 1 '''
     original_search_results: list = TestDataProvider.test_data_pick_one_highest_and_one_lowest_01()
@@ -1103,6 +1324,66 @@ class MetasearchFunctionTests(TestCase):
     self.compare_the_list_of_result_items(sys._getframe().f_code.co_name + ": test set 5", expected_items, actual_items)
 
 
+  def test_selection_returns_the_given_items_without_copying(self):
+    original_items: dict = {
+      CATEGORIES["Encyclopedia"]: [ResultItem("Article 1", "http://en.example1.org/example", "Google", 1)],
+      CATEGORIES["Famous News Agencies"]: [
+        ResultItem("Article 2", "http://www.example2.com/a", "Google", 2),
+        ResultItem("Article 3", "http://www.example2.com/b", "Google", 5),
+        ResultItem("Article 4", "http://www.example2.com/c", "Google", 9)
+      ]
+    }
+    actual_items: list = selection_for_general_computers(original_items)
+    self.assertEqual(3, len(actual_items))
+    self.assertIs(original_items[CATEGORIES["Encyclopedia"]][0], actual_items[0])
+    self.assertIs(original_items[CATEGORIES["Famous News Agencies"]][0], actual_items[1])
+    self.assertIs(original_items[CATEGORIES["Famous News Agencies"]][2], actual_items[2])
+
+  def test_pick_one_highest_and_one_lowest_breaks_ties_randomly(self):
+    items: list = [
+      ResultItem("Article 1", "http://www.example1.com/a", "Google", 1),
+      ResultItem("Article 2", "http://www.example1.com/b", "Google", 1),
+      ResultItem("Article 3", "http://www.example1.com/c", "Google", 7),
+      ResultItem("Article 4", "http://www.example1.com/d", "Google", 7),
+      ResultItem("Article 5", "http://www.example1.com/e", "Google", 7)
+    ]
+    picked_highest: set = set()
+    picked_lowest: set = set()
+    for i in range(200):
+      highest, lowest = pick_one_highest_and_one_lowest(items)
+      picked_highest.add(highest.get_title())
+      picked_lowest.add(lowest.get_title())
+    self.assertEqual({"Article 1", "Article 2"}, picked_highest)
+    self.assertEqual({"Article 3", "Article 4", "Article 5"}, picked_lowest)
+
+    ''' in case all the items have the same rank, the lowest-ranked item is another one than the highest-ranked item '''
+    for i in range(50):
+      highest, lowest = pick_one_highest_and_one_lowest(items[2:])
+      self.assertIsNot(highest, lowest)
+
+  def test_pick_one_highest_and_one_lowest_compares_the_lowest_ranks(self):
+    # the item found at rank 2 and 9 is the lowest-ranked one, though its highest rank is 2
+    merged_item = ResultItem("Article 1", "http://www.example1.com/a", "Google", 2)
+    merged_item.merge(ResultItem("Article 1", "http://www.example1.com/a", "Bing", 9))
+    items: list = [
+      ResultItem("Article 2", "http://www.example1.com/b", "Google", 1),
+      merged_item,
+      ResultItem("Article 3", "http://www.example1.com/c", "Google", 5)
+    ]
+    self.assertEqual([items[0], merged_item], pick_one_highest_and_one_lowest(items))
+    # pick_lowest_ranked_result_item keeps comparing the highest ranks with the lowest rank, and finds no item here
+    self.assertEqual([], pick_lowest_ranked_result_item(items))
+
+    ''' in case the lowest-ranked item is also the highest-ranked one, the second lowest is picked '''
+    items = [
+      ResultItem("Article 2", "http://www.example1.com/b", "Google", 3),
+      merged_item,
+      ResultItem("Article 3", "http://www.example1.com/c", "Google", 5)
+    ]
+    items[0].merge(ResultItem("Article 2", "http://www.example1.com/b", "Bing", 6))
+    for i in range(20):
+      self.assertEqual([merged_item, items[0]], pick_one_highest_and_one_lowest(items))
+
   def test_pick_one_from_works_correctly(self):
     ''' test set 1 : in case the list has 3 documents '''
     original_search_results: list = [
@@ -0,0 +1,173 @@
+import re
+import time
+import bisect
+import threading
+import contextvars
+from django.conf import settings
+
+# Timing of the stages of the search requests
+# Every stage (e.g. the collection of the search results, the removal of the duplication) and every search engine call
+# is measured by a Timer, which adds its duration to the histogram of the stage shared by the requests of this process,
+# and to the timings of the request being served if any. The timings of a request are sent back in its Server-Timing header.
+
+# Upper bounds in seconds of the buckets of the histograms, the last bucket has no upper bound
+DEFAULTBUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Characters not allowed in the name of a metric of the Server-Timing header
+INVALID_METRIC_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.\-]")
+
+class Histogram:
+    '''
+    Distribution of the durations of a stage: the number of the durations in every bucket, their number and their sum
+    '''
+    __slots__ = ("bounds", "counts", "count", "sum", "lock")
+
+    def __init__(self, bounds: tuple = DEFAULTBUCKETS):
+        self.bounds: tuple = bounds
+        # Number of the durations of every bucket, the last one for the durations above the last bound
+        self.counts: list = [0] * (len(bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index: int = bisect.bisect_left(self.bounds, seconds)
+        with self.lock:
+            self.counts[index] = self.counts[index] + 1
+            self.count = self.count + 1
+            self.sum = self.sum + seconds
+
+    def snapshot(self) -> dict:
+        '''
+        Returns
+        ----------
+        snapshot : dict
+            Copy of the histogram
+            ex. {"bounds": (0.0005, 0.001, ...), "counts": [0, 3, ...], "count": 12, "sum": 0.042}
+        '''
+        with self.lock:
+            return {"bounds": self.bounds, "counts": list(self.counts), "count": self.count, "sum": self.sum}
+
+class TimingRegistry:
+    # Histograms of the durations of the stages, by the name of the stage
+    def __init__(self, bounds: tuple = DEFAULTBUCKETS):
+        self.bounds: tuple = bounds
+        self.histograms: dict = {}
+        self.lock = threading.Lock()
+
+    def get_histogram(self, name: str) -> Histogram:
+        histogram: Histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.bounds))
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        self.get_histogram(name).observe(seconds)
+
+    def snapshot(self) -> dict:
+        # name of the stage -> snapshot of its histogram
+        with self.lock:
+            histograms: list = list(self.histograms.items())
+        return {name: histogram.snapshot() for name, histogram in histograms}
+
+class RequestTimings:
+    '''
+    Durations of the stages of a search request, in the order they finished
+    The stages measured in the block of a with statement are added to it:
+    ex.
+        with RequestTimings() as request_timings:
+            results = metasearch(query)
+        response["Server-Timing"] = request_timings.get_server_timing()
+    The search engine calls finish on other threads, so the durations are added under a lock
+    '''
+    __slots__ = ("durations", "started_at", "lock", "token")
+
+    def __init__(self):
+        # List of (name of the stage, seconds)
+        self.durations: list = []
+        self.started_at: float = time.perf_counter()
+        self.lock = threading.Lock()
+        # Token to restore the timings of the context when the with statement ends
+        self.token = None
+
+    def __enter__(self):
+        self.token = current_request_timings.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        current_request_timings.reset(self.token)
+        return False
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.durations.append((name, seconds))
+
+    def get_durations(self) -> list:
+        with self.lock:
+            return list(self.durations)
+
+    def get_server_timing(self) -> str:
+        '''
+        Returns
+        ----------
+        server_timing : str
+            Value of the Server-Timing header: the durations of the stages in milliseconds,
+            then the time elapsed since the request started as "total"
+            ex. "cache;dur=0.01, engine-google;dur=412.3, collect;dur=415.2, ..., total;dur=421.7"
+        '''
+        metrics: list = []
+        for name, seconds in self.get_durations() + [("total", time.perf_counter() - self.started_at)]:
+            metrics.append(INVALID_METRIC_NAME_CHARACTERS.sub("", name) + ";dur=" + "{:.2f}".format(seconds * 1000))
+        return ", ".join(metrics)
+
+class Timer:
+    '''
+    Measures the block of a with statement as the stage of the given name
+    ex.
+        with Timer("dedup"):
+            items = remove_result_item_duplication(items)
+    '''
+    __slots__ = ("name", "request_timings", "started_at")
+
+    def __init__(self, name: str, request_timings: RequestTimings = None):
+        self.name: str = name
+        # Timings of the request to add the duration to, the request being served in the current context if None
+        self.request_timings: RequestTimings = request_timings if request_timings is not None else current_request_timings.get()
+        self.started_at: float = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds: float = time.perf_counter() - self.started_at
+        get_timing_registry().observe(self.name, seconds)
+        if self.request_timings is not None:
+            self.request_timings.add(self.name, seconds)
+        return False
+
+def get_engine_stage_name(engine_name: str) -> str:
+    # Name of the stage of a search engine call, ex. "engine-yahoo" for "Yahoo!"
+    return "engine-" + INVALID_METRIC_NAME_CHARACTERS.sub("", engine_name).lower()
+
+# Timings of the request served in the current thread or task
+# The tasks of asyncio inherit it, but the calls submitted to a thread pool don't: pass the timings to Timer for them
+current_request_timings: contextvars.ContextVar = contextvars.ContextVar("current_request_timings", default=None)
+
+def get_request_timings() -> RequestTimings:
+    # Timings of the request served in the current context, None if they aren't measured
+    return current_request_timings.get()
+
+def is_server_timing_enabled() -> bool:
+    return getattr(settings, "METASEARCH_SERVER_TIMING_ENABLED", True)
+
+# Histograms shared by all requests handled by this process
+timing_registry: TimingRegistry = None
+timing_registry_lock = threading.Lock()
+
+def get_timing_registry() -> TimingRegistry:
+    global timing_registry
+    with timing_registry_lock:
+        if timing_registry is None:
+            timing_registry = TimingRegistry()
+    return timing_registry
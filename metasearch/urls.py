@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -6,5 +7,8 @@ app_name = 'metasearch'
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('search/', views.search, name='search'),
+    # Use the async view when it's served through ASGI, so that waiting for the search engines doesn't hold a thread
+    path('search/', views.search_async if settings.METASEARCH_ASYNC_VIEWS else views.search, name='search'),
+    # Metrics in the Prometheus text format, aggregated over the worker processes
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,20 +1,39 @@
 from django.shortcuts import render
 from django.template import loader
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404
 from . import forms
 import random
-import copy
 import pathlib
 import urllib.request
 import time
 import json
+import threading
+import asyncio
+import contextlib
+import contextvars
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor, wait
 from time import gmtime, strftime
 from bs4 import BeautifulSoup
-from metasearch.models import ResultItem
+from django.conf import settings
+from metasearch.models import ResultItem, canonicalize_url, normalize_title
+from metasearch import domain_categories
+from metasearch.near_duplicates import remove_near_duplicates_if_enabled
+from metasearch.result_set import ResultSet, build_result_set
+from metasearch.timing import RequestTimings, Timer, get_engine_stage_name, get_request_timings, is_server_timing_enabled
+from metasearch.profiling import RequestProfile, get_requested_profile, get_request_profile, profile_thread
+from metasearch.metrics import (
+    collect_metrics, publish_metrics, is_metrics_enabled,
+    record_engine_call, record_dropped_engine, record_result_set_size
+)
+from metasearch.result_cache import ResultCache, get_result_cache
+from metasearch.single_flight import WorkerLock, get_single_flight, get_worker_lock
 from metasearch.search_modules import yahoo_search_module
 from metasearch.search_modules import google_search_module
 from metasearch.search_modules import duckduckgo_search_module
 from metasearch.search_modules import yandex_search_module
+from metasearch.search_modules.http_transport import get_async_http_session
+from metasearch.search_modules.quota_ledger import QuotaExceeded
 
 CATEGORIES = {
     "Encyclopedia": 1,
@@ -24,6 +43,29 @@ CATEGORIES = {
     "Blogs": 5,
     "Portals and Blogs": 6
 }
+# Categories in the order result_classification lists them
+CLASSIFICATION_ORDER = (
+    CATEGORIES["Encyclopedia"],
+    CATEGORIES["Famous News Agencies"],
+    CATEGORIES["Online News Agencies"],
+    CATEGORIES["Portals and Blogs"]
+)
+
+# Search engines used for the collection of the search results, in the order their results are merged
+# (engine name, search module, name of the search function, name of its async version, max number of results to keep or None)
+SEARCH_ENGINE_MODULES = [
+    ("Google", google_search_module, "googleSearch", "googleSearchAsync", None),
+    ("Yahoo!", yahoo_search_module, "yahooSearch", "yahooSearchAsync", None),
+    # Generally DuckDuckGo returns almost 30 items at once, so restrict the number of documents from it
+    ("DuckDuckGo", duckduckgo_search_module, "duckduckgoSearch", "duckduckgoSearchAsync", 10),
+    ("Yandex", yandex_search_module, "yandexSearch", "yandexSearchAsync", None),
+]
+
+# Thread pool shared by all requests to throw the queries to the search engines at the same time
+# By default it's sized for the searches of DEFAULTCONCURRENTSEARCHES requests running at the same time
+DEFAULTCONCURRENTSEARCHES = 8
+engine_executor: ThreadPoolExecutor = None
+engine_executor_lock = threading.Lock()
 
 def index(request):
     '''
@@ -33,490 +75,456 @@ def index(request):
     form = forms.SearchForm(None)
     return render(request, 'metasearch/index.html', {'form': form})
 
-def metasearch(query: str) -> list:
-    # Collect the search results retrieved from search engines
-    results: list = collect_search_results_from_multiple_search_engines(query)
-    # dump_log_with_timestamp("_collected_results", "ResultItems collected from several search engines", results)
+def metasearch(query: str, dropped_engines: list = None, use_cache: bool = True) -> list:
+    # Search without the cached results nor the identical search in flight if use_cache is False (e.g. to profile it)
+    if not use_cache:
+        selected_results, engines_not_answered = run_metasearch(query)
+        if dropped_engines is not None:
+            dropped_engines.extend(engines_not_answered)
+        return list(selected_results)
+    # Return the results selected for the same query a while ago if they are still cached
+    with Timer("cache"):
+        cached_results: list = get_result_cache().get(query, dropped_engines)
+    if cached_results is not None:
+        return cached_results
+
+    # Search only once for the identical queries in flight, every waiter gets the same results
+    # The names of the search engines which couldn't answer within the time limit are appended to dropped_engines
+    selected_results, engines_not_answered = get_single_flight().do(
+        ResultCache.normalize_query(query), lambda: run_metasearch(query)
+    )
+    if dropped_engines is not None:
+        dropped_engines.extend(engines_not_answered)
+    return list(selected_results)
+
+async def metasearch_async(query: str, dropped_engines: list = None, use_cache: bool = True) -> list:
+    if not use_cache:
+        selected_results, engines_not_answered = await run_metasearch_async(query)
+        if dropped_engines is not None:
+            dropped_engines.extend(engines_not_answered)
+        return list(selected_results)
+    # Return the results selected for the same query a while ago if they are still cached
+    with Timer("cache"):
+        cached_results: list = get_result_cache().get(query, dropped_engines)
+    if cached_results is not None:
+        return cached_results
+
+    # Search only once for the identical queries in flight, every waiter gets the same results
+    selected_results, engines_not_answered = await get_single_flight().do_async(
+        ResultCache.normalize_query(query), lambda: run_metasearch_async(query)
+    )
+    if dropped_engines is not None:
+        dropped_engines.extend(engines_not_answered)
+    return list(selected_results)
+
+def run_metasearch(query: str) -> tuple:
+    '''
+    Parameters
+    ----------
+    query : str
+        search query string
+        ex. "hello world"
+
+    Returns
+    ----------
+    search_result : tuple
+        (list of the selected ResultItem, list of the names of the search engines which couldn't answer in time)
+    '''
+    # While another worker is searching for the same query, wait for it to fill the response cache
+    # The search only gets what is left of the latency budget after waiting
+    worker_lock: WorkerLock = get_worker_lock(ResultCache.normalize_query(query))
+    timeout: float = None
+    if worker_lock is not None:
+        timeout = worker_lock.acquire()
+    try:
+        # Collect the search results retrieved from search engines
+        engines_not_answered: list = []
+        engines_out_of_quota: list = []
+        with Timer("collect"):
+            results: list = collect_search_results_from_multiple_search_engines(
+                query, timeout=timeout, dropped_engines=engines_not_answered, exhausted_engines=engines_out_of_quota
+            )
+        # dump_log_with_timestamp("_collected_results", "ResultItems collected from several search engines", results)
+    finally:
+        if worker_lock is not None:
+            worker_lock.release()
+
+    # Pick the results to present from the collected ones
+    selected_results: list = filter_search_results(results)
+    cache_search_results(query, selected_results, engines_not_answered, engines_out_of_quota)
+    return (selected_results, engines_not_answered)
+
+async def run_metasearch_async(query: str) -> tuple:
+    # Asynchronous version of run_metasearch: collect the search results without holding a thread while waiting for the search engines
+    worker_lock: WorkerLock = get_worker_lock(ResultCache.normalize_query(query))
+    timeout: float = None
+    if worker_lock is not None:
+        timeout = await worker_lock.acquire_async()
+    try:
+        engines_not_answered: list = []
+        engines_out_of_quota: list = []
+        with Timer("collect"):
+            results: list = await collect_search_results_from_multiple_search_engines_async(
+                query, timeout=timeout, dropped_engines=engines_not_answered, exhausted_engines=engines_out_of_quota
+            )
+    finally:
+        if worker_lock is not None:
+            worker_lock.release()
+
+    # Pick the results to present from the collected ones, on the default executor not to block the other searches
+    # on the event loop; the context is copied so that the stages are added to the timings of the request
+    selected_results: list = await asyncio.get_running_loop().run_in_executor(
+        None, contextvars.copy_context().run, filter_search_results, results
+    )
+    cache_search_results(query, selected_results, engines_not_answered, engines_out_of_quota)
+    return (selected_results, engines_not_answered)
+
+def cache_search_results(query: str, selected_results: list, engines_not_answered: list, engines_out_of_quota: list):
+    # The results without some search engines are cached only for a short while, so that the engines are asked again soon
+    # The search engines out of their daily quota can't answer until the quota is reset, so they don't shorten the TTL
+    result_cache: ResultCache = get_result_cache()
+    ttl: float = None
+    if any(engine_name not in engines_out_of_quota for engine_name in engines_not_answered):
+        ttl = result_cache.partial_ttl
+    result_cache.put(query, selected_results, ttl=ttl, dropped_engines=engines_not_answered)
+
+def filter_search_results(results: list) -> list:
+    # Domains of the categories, the same version is used through the whole filtering even if the data file is reloaded
+    categories: domain_categories.DomainCategories = domain_categories.get_domain_categories()
+
+    record_result_set_size("collected", len(results))
+    # Filter the search results on the columns of a ResultSet if enabled, on the lists of ResultItem otherwise
+    if getattr(settings, "METASEARCH_RESULT_SET_ENABLED", False):
+        selected_results: list = filter_search_results_as_columns(results, categories)
+    else:
+        selected_results: list = filter_search_results_as_items(results, categories)
+    record_result_set_size("selected", len(selected_results))
+    # dump_log_with_timestamp("_selected_results", "Selection results", selected_results)
 
+    # Return the list of results
+    return selected_results
+
+def filter_search_results_as_items(results: list, categories: domain_categories.DomainCategories) -> list:
     # Remove duplication from the collected search results
-    duplication_free_results: list = remove_result_item_duplication(results)
+    with Timer("dedup"):
+        duplication_free_results: list = remove_result_item_duplication(results)
+    # Merge the near-duplicate results (e.g. syndicated copies of an article) if enabled
+    if getattr(settings, "METASEARCH_NEAR_DUPLICATES_ENABLED", False):
+        with Timer("near-dedup"):
+            duplication_free_results = remove_near_duplicates_if_enabled(duplication_free_results)
+    record_result_set_size("deduplicated", len(duplication_free_results))
     # dump_log_with_timestamp("_duplication_free_results", "ResultItems after removing duplication of URLs", duplication_free_results)
 
     # Remove unnecessary contents: Movie contents, detecting by its domain
-    usable_results: list = remove_movie_contents_from(duplication_free_results)
+    with Timer("movies"):
+        usable_results: list = remove_movie_contents_from(duplication_free_results, categories)
 
     # Classify the results into categories defined as CATEGORIES and store it in an dictionary
-    classified_results: dict = separate_items_by_categories(
-        result_classification(usable_results)
-    )
+    with Timer("classify"):
+        classified_results: dict = separate_items_by_categories(
+            result_classification(usable_results, categories)
+        )
     # dump_log_with_timestamp("_classified_results", "Classification results", classified_results)
 
     # Select from the classified results and organize the result items to present
-    selected_results: list = result_selection(classified_results)
-    # dump_log_with_timestamp("_selected_results", "Selection results", selected_results)
+    with Timer("select"):
+        return result_selection(classified_results)
 
-    # Return the list of results
-    return selected_results
+def filter_search_results_as_columns(results: list, categories: domain_categories.DomainCategories) -> list:
+    # Hold the collected search results as columns, the filtering below works on the columns
+    with Timer("build"):
+        result_set: ResultSet = build_result_set(results, categories)
 
-def collect_search_results_from_multiple_search_engines(query: str) -> list:
-    # Variable to store the search results from multiple search engines
-    results = []
+    # Remove duplication from the collected search results
+    with Timer("dedup"):
+        result_set = result_set.remove_duplicates()
+    # Merge the near-duplicate results (e.g. syndicated copies of an article) if enabled
+    # the stage works on the ResultItem objects, so the set is rebuilt from the merged items
+    if getattr(settings, "METASEARCH_NEAR_DUPLICATES_ENABLED", False):
+        with Timer("near-dedup"):
+            result_set = build_result_set(remove_near_duplicates_if_enabled(result_set.to_items()), categories)
+    record_result_set_size("deduplicated", len(result_set))
 
-    # Get the search results retrieved from Google
-    google_results = google_search_module.googleSearch(query)
-    for item in google_results:
-        results.append(item)
-    # Get the search results retrieved from Yahoo
-    yahoo_results = yahoo_search_module.yahooSearch(query)
-    for item in yahoo_results:
-        results.append(item)
-
-    # Get the search results retrieved from DuckDuckGo
-    duckduckgo_results = duckduckgo_search_module.duckduckgoSearch(query)
-    # for item in duckduckgo_results:
-    # In order to restrict the number of documents from DuckDuckGo, access by index
-    # Generally they returns almost 30 items at once
-    for i in range(0, 10):
-        try:
-            results.append(duckduckgo_results[i])
-            # results.append(item)
-        except IndexError:
-            break
-    
-    # Get the search results retrieved from Yandex
-    yandex_results = yandex_search_module.yandexSearch(query)
-    for item in yandex_results:
-        results.append(item)
+    # Remove unnecessary contents: Movie contents, detecting by its domain
+    with Timer("movies"):
+        result_set = result_set.remove_movie_contents()
 
+    # Classify the results into categories by their domains
+    with Timer("classify"):
+        category_codes = result_set.get_category_codes()
+    # Select the result items to present as selection_for_general_computers does
+    with Timer("select"):
+        return result_set.select_for_general_computers(category_codes=category_codes).to_items()
+
+def collect_search_results_from_multiple_search_engines(query: str, timeout: float = None, dropped_engines: list = None, exhausted_engines: list = None) -> list:
+    '''
+    Parameters
+    ----------
+    query : str
+        search query string to be sent to all the search engines in SEARCH_ENGINE_MODULES
+        ex. "hello world"
+    timeout : float
+        latency budget in seconds for the whole collection, settings.METASEARCH_REQUEST_TIMEOUT is used if None
+        ex. 5.0
+    dropped_engines : list
+        if a list is given, the names of the search engines which failed or couldn't answer within the budget are appended to it
+        ex. ["Yandex"]
+    exhausted_engines : list
+        if a list is given, the names of the search engines skipped because their daily quota is used up are appended to it
+        They are also appended to dropped_engines
+        ex. ["Google"]
+
+    Returns
+    ----------
+    results : list
+        The list of ResultItem retrieved from the search engines which answered within the budget
+        The search engines are called at the same time, but their results are merged in the order of SEARCH_ENGINE_MODULES
+        ex. [GoogleResultItem1, ..., YahooResultItem1, ..., DuckDuckGoResultItem1, ..., YandexResultItem1, ...]
+    '''
+    if timeout is None:
+        timeout = getattr(settings, "METASEARCH_REQUEST_TIMEOUT", None)
+    # Throw the query to all the search engines at the same time, passing the budget and the number of the results to use
+    # down to every engine call, so that the engine stops parsing its response when enough results are picked
+    executor: ThreadPoolExecutor = get_engine_executor()
+    # The engine calls run on the threads of the pool, so the timings and the profile of the request are passed to them
+    request_timings: RequestTimings = get_request_timings()
+    request_profile: RequestProfile = get_request_profile()
+    # The engine calls waiting for a thread of the pool get only the time left until the deadline of the request
+    deadline: float = None if timeout is None else time.monotonic() + timeout
+    futures: list = []
+    for engine_name, module, function_name, async_function_name, max_results in SEARCH_ENGINE_MODULES:
+        # Look up the search function on every call so that it can be replaced (e.g. patched in the tests)
+        search_function = getattr(module, function_name)
+        futures.append(executor.submit(
+            call_search_engine, engine_name, request_timings, request_profile, deadline,
+            search_function, query, max_results=max_results
+        ))
+    # Wait for the search engines until the budget runs out
+    wait(futures, timeout=timeout)
+
+    return merge_search_results_of_engines(futures, timeout, dropped_engines, exhausted_engines)
+
+async def collect_search_results_from_multiple_search_engines_async(query: str, timeout: float = None, dropped_engines: list = None, exhausted_engines: list = None) -> list:
+    '''
+    Asynchronous version of collect_search_results_from_multiple_search_engines
+    The search engines are called through a single aiohttp session on the running event loop instead of the thread pool
+    Parameters and the returned value are the same as the synchronous version
+    '''
+    if timeout is None:
+        timeout = getattr(settings, "METASEARCH_REQUEST_TIMEOUT", None)
+    # The connections are kept alive across the searches running on the event loop
+    session: aiohttp.ClientSession = get_async_http_session()
+    # Throw the query to all the search engines at the same time, passing the budget and the number of the results to use
+    tasks: list = []
+    for engine_name, module, function_name, async_function_name, max_results in SEARCH_ENGINE_MODULES:
+        search_function = getattr(module, async_function_name)
+        tasks.append(asyncio.ensure_future(call_search_engine_async(
+            engine_name, search_function(query, session, timeout=timeout, max_results=max_results)
+        )))
+    # Wait for the search engines until the budget runs out
+    await asyncio.wait(tasks, timeout=timeout)
+
+    return merge_search_results_of_engines(tasks, timeout, dropped_engines, exhausted_engines)
+
+def call_search_engine(engine_name: str, request_timings: RequestTimings, request_profile: RequestProfile, deadline: float, search_function, *args, **kwargs) -> list:
+    # Call a search engine on a thread of the pool, measured as the stage of the search engine and counted in the metrics
+    # The call is given the time left until the deadline (time.monotonic() value, None without the budget) as its timeout,
+    # and is skipped if the deadline has passed while it was waiting for a thread
+    # The call is profiled if the request is
+    timeout: float = None
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(engine_name + " waited for a thread of the pool until the deadline of the request")
+    started_at: float = time.perf_counter()
+    try:
+        with profile_thread(request_profile), Timer(get_engine_stage_name(engine_name), request_timings):
+            results: list = search_function(*args, timeout=timeout, **kwargs)
+    except Exception as e:
+        record_engine_call(engine_name, time.perf_counter() - started_at, exception=e)
+        raise
+    record_engine_call(engine_name, time.perf_counter() - started_at, results)
     return results
 
-def result_classification(items: list) -> list:
-    # Variable to store the categorized results without duplications
-    categorized_results: list = []
+async def call_search_engine_async(engine_name: str, coroutine) -> list:
+    # Await a search engine call, measured as the stage of the search engine and counted in the metrics
+    # The task inherits the timings of the request from the context it's created in
+    started_at: float = time.perf_counter()
+    try:
+        with Timer(get_engine_stage_name(engine_name)):
+            results: list = await coroutine
+    except Exception as e:
+        record_engine_call(engine_name, time.perf_counter() - started_at, exception=e)
+        raise
+    record_engine_call(engine_name, time.perf_counter() - started_at, results)
+    return results
 
-    # Classify the encyclopedia items
-    classified: list = pick_encyclopedia_from_items(items)
-    for item in classified[0]:
-        categorized_results.append([CATEGORIES["Encyclopedia"], item])
+def merge_search_results_of_engines(futures: list, timeout: float, dropped_engines: list, exhausted_engines: list = None) -> list:
+    '''
+    Parameters
+    ----------
+    futures : list
+        concurrent.futures.Future or asyncio.Task of the search engine calls, in the order of SEARCH_ENGINE_MODULES
+    timeout : float
+        latency budget in seconds given to the search engines, only used for logging
+    dropped_engines : list
+        if a list is given, the names of the search engines which failed or haven't answered yet are appended to it
+    exhausted_engines : list
+        if a list is given, the names of the search engines which failed because their daily quota is used up are appended to it
 
-    # Classify the famous news agency items
-    classified = pick_famous_news_agencies_from_items(classified[1])
-    for item in classified[0]:
-        categorized_results.append([CATEGORIES["Famous News Agencies"], item])
+    Returns
+    ----------
+    results : list
+        The list of ResultItem retrieved from the search engines which have answered, in the order of SEARCH_ENGINE_MODULES
+    '''
+    # Variable to store the search results from multiple search engines
+    results = []
+    # Merge the results in the order of SEARCH_ENGINE_MODULES, skipping the engines which didn't answer in time
+    for (engine_name, module, function_name, async_function_name, max_results), future in zip(SEARCH_ENGINE_MODULES, futures):
+        if not future.done():
+            # The engine is still running (or waiting for a thread): continue without it
+            future.cancel()
+            print("[ERROR LOG] In collect_search_results_from_multiple_search_engines, " + engine_name + " didn't answer within " + str(timeout) + " seconds.")
+            record_dropped_engine(engine_name, "timeout")
+            drop_engine(dropped_engines, engine_name)
+            continue
+        try:
+            engine_results: list = future.result()
+        except Exception as e:
+            print("[ERROR LOG] In collect_search_results_from_multiple_search_engines, " + engine_name + " failed: " + repr(e))
+            if isinstance(e, QuotaExceeded):
+                record_dropped_engine(engine_name, "quota")
+                drop_engine(exhausted_engines, engine_name)
+            elif isinstance(e, TimeoutError):
+                # The call was skipped because the deadline passed before a thread of the pool was free
+                record_dropped_engine(engine_name, "timeout")
+            else:
+                record_dropped_engine(engine_name, "failure")
+            drop_engine(dropped_engines, engine_name)
+            continue
+        if max_results is not None:
+            engine_results = engine_results[:max_results]
+        for item in engine_results:
+            results.append(item)
+
+    return results
 
-    # Classify the online news agency items
-    classified = pick_online_news_agencies_from_items(classified[1])
-    for item in classified[0]:
-        categorized_results.append([CATEGORIES["Online News Agencies"], item])
+def drop_engine(dropped_engines: list, engine_name: str):
+    # Record the name of the search engine whose results are not included, if the caller asked for it
+    if dropped_engines is not None:
+        dropped_engines.append(engine_name)
 
-    # Classify the portal and blog items (for now it returns the given items exactly as it is)
-    classified = pick_portal_and_blog_from_items(classified[1])
-    for item in classified[0]:
-        categorized_results.append([CATEGORIES["Portals and Blogs"], item])
+def get_engine_executor() -> ThreadPoolExecutor:
+    '''
+    Returns
+    ----------
+    engine_executor : ThreadPoolExecutor
+        The thread pool shared by all requests to call the search engines
+        Its size is bounded by settings.METASEARCH_ENGINE_WORKERS, a thread for every engine call of the searches
+        running at the same time (len(SEARCH_ENGINE_MODULES) calls per search)
+    '''
+    global engine_executor
+    with engine_executor_lock:
+        if engine_executor is None:
+            engine_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "METASEARCH_ENGINE_WORKERS", DEFAULTCONCURRENTSEARCHES * len(SEARCH_ENGINE_MODULES)),
+                thread_name_prefix="metasearch-engine"
+            )
+    return engine_executor
+
+def result_classification(items: list, categories: domain_categories.DomainCategories = None) -> list:
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem to classify
+        ex. [ResultItem1, ResultItem2, ...]
+    categories : DomainCategories
+        Domains of the categories, the current contents of the data file if None
+
+    Returns
+    ----------
+    categorized_results : list
+        List of pairs [category symbol defined as CATEGORIES, ResultItem], grouped by the category
+        The items of a category found by the domain are listed from the last one, the rest of the items
+        are categorized as "Portals and Blogs" in the given order
+        ex. [[CATEGORIES["Encyclopedia"], ResultItem3], [CATEGORIES["Famous News Agencies"], ResultItem1], ...]
+    '''
+    if categories is None:
+        categories = domain_categories.get_domain_categories()
+    # Classify every item by a single lookup of its domain in the index of the domains
+    classified: dict = {}
+    for category in CLASSIFICATION_ORDER:
+        classified[category] = []
+    for item in items:
+        classified[categories.classify(item.get_domain())].append(item)
 
+    # Variable to store the categorized results without duplications
+    categorized_results: list = []
+    for category in CLASSIFICATION_ORDER:
+        classified_items: list = classified[category]
+        if category != CATEGORIES["Portals and Blogs"]:
+            classified_items.reverse()
+        for item in classified_items:
+            categorized_results.append([category, item])
     return categorized_results
-        
 
 # Remove the duplication in the list of search results
 def remove_result_item_duplication(items: list) -> list:
-    # Sort the list of search results by their URL
-    sorted_items = sorted(items, key=lambda item: item.get_url())
-    # Go through the sorted list, then move the search engine to another one and remove it if it's duplicated
-    for i in range(len(sorted_items) - 1, 0, -1):
-        if(sorted_items[i].get_url() == sorted_items[i - 1].get_url() or sorted_items[i].get_title() == sorted_items[i - 1].get_title()):
-            # Inherit the search engine item registered on sorted_items[i]
-            for engine in sorted_items[i].get_engine():
-                sorted_items[i - 1].set_engine(engine)
-            # Inherit the highest and lowest rank of the sorted_items[i]
-            sorted_items[i - 1].set_rank(sorted_items[i].get_highest_rank())
-            sorted_items[i - 1].set_rank(sorted_items[i].get_lowest_rank())
-            # Pop the current item to remove duplication
-            sorted_items.pop(i)
-    # Return the sorted search results without duplication
-    return sorted_items
+    '''
+    Parameters
+    ----------
+    items : list
+        List of ResultItem collected from the search engines
+        ex. [ResultItem1, ResultItem2, ...]
+
+    Returns
+    ----------
+    unique_items : list
+        List of ResultItem without the items pointing to the same page as an item before them,
+        i.e. having the same URL once canonicalized (see canonicalize_url) or the same title once normalized
+        (see normalize_title), in the order of the given list
+        The search engines and the highest and lowest ranks of a removed item are inherited by the item kept
+        ex. [ResultItem1, ResultItem3, ...]
+    '''
+    # canonical URL -> the item kept for the URL, and normalized title -> the item kept for the title
+    unique_items_by_url: dict = {}
+    unique_items_by_title: dict = {}
+    unique_items: list = []
+    for item in items:
+        canonical_url: str = canonicalize_url(item.get_url())
+        title: str = normalize_title(item.get_title())
+        unique_item: ResultItem = unique_items_by_url.get(canonical_url)
+        if unique_item is None and title:
+            unique_item = unique_items_by_title.get(title)
+        if unique_item is None:
+            unique_item = item
+            unique_items.append(item)
+        else:
+            # Inherit the search engines and the highest and lowest rank of the duplicated item
+            unique_item.merge(item)
+        # The URL and the title of a merged item lead to the item kept too
+        unique_items_by_url.setdefault(canonical_url, unique_item)
+        if title:
+            unique_items_by_title.setdefault(title, unique_item)
+    # Return the search results without duplication
+    return unique_items
 
 # Detect the result item categorized as an "Encyclopedia"
 # Returned result: [list of result items categorizedas an Encyclopedia, list of result items not categorized (the items except Encyclopedia)]
 def pick_encyclopedia_from_items(items: list) -> list:
-    # Prepare the list of domains which are the symbol of encyclopedia
-    encyclopedia_domains: list = ["wikipedia.org"]
-    # Return the search results including the above domains in its URL
-    return pick_items_with_domain(items, encyclopedia_domains)
+    # Return the search results including the domains which are the symbol of encyclopedia in its URL
+    return pick_items_with_domain(items, domain_categories.get_domain_categories().get_domains(CATEGORIES["Encyclopedia"]))
 
 # Detect the result item categorized as an "Famous news agency"
 def pick_famous_news_agencies_from_items(items: list) -> list:
-    # Prepare the list of domains which are the symbol of famous news agencies
-    famous_news_agencies_domains: list = [
-        "xinhuanet.com",
-        "reuters.com",
-        "ria.ru",
-        "prnewswire.com",
-        "apnews.com",
-        "tass.com",
-        "tass.ru",
-        "ansa.it",
-        "yna.co.kr",
-        "aljazeera.com",
-        "aljazeera.net",
-        "upi.com",
-        "afp.com",
-        "irna.ir",
-        "aa.com.tr",
-        "alternet.org",
-        "antaranews.com",
-        "newswire.ca",
-        "jiji.com",
-        "focustaiwan.tw",
-        "cna.com.tw",
-        "efe.com",
-        "ipsnews.net",
-        "newswise.com",
-        "agi.it",
-        "belta.by",
-        "telam.com.ar",
-        "ukrinform.net",
-        "ukrinform.ua",
-        "trend.az",
-        "kyodonews.net",
-        "kyodonews.jp",
-        "bernama.com",
-        "sana.sy",
-        "pap.pl",
-        "mediafax.ro",
-        "iha.com.tr",
-        "apa.az",
-        "azertag.az",
-        "ptinews.com",
-        "kuna.net.kw",
-        "dpa.com",
-        "apa.at",
-        "agerpres.ro",
-        "unian.info",
-        "interfax.com",
-        "aps.dz",
-        "amna.gr",
-        "akipress.com",
-        "centralasia.media",
-        "armenpress.am",
-        "uniindia.com",
-        "thecanadianpress.com",
-        "fides.org",
-        "lusa.pt",
-        "tanjug.rs",
-        "anp.nl",
-        "wafa.ps",
-        "ians.in",
-        "mti.hu",
-        "bna.bh",
-        "pna.gov.ph",
-        "sta.si",
-        "vnanet.vn",
-        "tt.se",
-        "petra.gov.jo",
-        "aap.com.au",
-        "notimex.mx",
-        "avn.info.ve",
-        "bnonews.com",
-        "bta.bg",
-        "app.com.pk",
-        "bns.lt",
-        "pa.media",
-        "bssnews.net",
-        "baptistnews.com",
-        "cna.org.cy",
-        "belapan.by",
-        "moldpres.md",
-        "belga.be",
-        "tap.info.tn",
-        "hina.hr",
-        "mapnews.ma",
-        "bns.ee",
-        "pressenza.com",
-        "abi.bo",
-        "mia.mk",
-        "akipress.com",
-        "ntb.no",
-        "acn.com.ve",
-        "abnnewswire.net",
-        "bolpress.com",
-        "montsame.mn",
-        "kurdpress.com",
-        "stt.fi",
-        "ata.gov.al",
-        "catalannews.com",
-        "acn.cat",
-        "frifagbevegelse.no",
-        "bakhtarnews.com.af",
-        "pina.com.fj",
-        "zumapress.com",
-        "nampa.org",
-        "akp.gov.kh",
-        "afghanislamicpress.com",
-        "unbnews.org",
-        "wna-news.com",
-        "latviannewsservice.lv",
-        "csrwire.ca",
-        "ebc.com.br",
-        "ppinewsagency.com",
-        "aninews.in",
-        "indymedia.org"
-    ]
-    # Return the search results including the above domains in its URL
-    return pick_items_with_domain(items, famous_news_agencies_domains)
+    # Return the search results including the domains which are the symbol of famous news agencies in its URL
+    return pick_items_with_domain(items, domain_categories.get_domain_categories().get_domains(CATEGORIES["Famous News Agencies"]))
 
 # Detect the result item categorized as an "Online news agency"
 def pick_online_news_agencies_from_items(items: list) -> list:
-    # Prepare the list of domains which are the symbol of online news agency
-    online_news_agencies_domains: list = [
-        "nbcnews.com",
-        "time.com",
-        # domains listed on https://www.ohio.edu/global/international
-        "allafrica.com",
-        "africaonline.com.na",
-        "thenewhumanitarian.org",
-        "panapress.com",
-        "bbc.com",
-        "cnn.com",
-        "buenosairesherald.com",
-        "clarin.com",
-        "folha.uol.com.br",
-        "estadao.com.br",
-        "theglobeandmail.com",
-        "cbc.ca",
-        "ctv.ca",
-        "ctvnews.ca",
-        "emol.com",
-        "latercera.com",
-        "eluniversal.com.mx",
-        "voanews.com",
-        "abcnews.go.com",
-        "eluniversal.com",
-        "people.com.cn",
-        "taipeitimes.com",
-        "indiatimes.com",
-        "indianexpress.com",
-        "koreatimes.co.kr",
-        "nst.com.my",
-        "kantipuronline.com",
-        "abs-cbn.com",
-        "manilatimes.net",
-        "philstar.com",
-        "bangkokpost.com",
-        "nationmultimedia.com",
-        "dw.com",
-        "spiegel.de",
-        "rnw.org",
-        "tdg.ch",
-        "sverigesradio.se",
-        "hurriyetdailynews.com",
-        "ahram.org.eg",
-        "palestine-info.net",
-        "haaretz.com",
-        "abc.net.au",
-        # domains listed on https://www.4imn.com/top200/
-        "nytimes.com",
-        "theguardian.com",
-        "washingtonpost.com",
-        "dailymail.co.uk",
-        "kompas.com",
-        "ltn.com.tw",
-        "usatoday.com",
-        "wsj.com",
-        "telegraph.co.uk",
-        "chinadaily.com.cn",
-        "independent.co.uk",
-        "elpais.com",
-        "marca.com",
-        "latimes.com",
-        "nypost.com",
-        "manoramaonline.com",
-        "ft.com",
-        "chron.com",
-        "repubblica.it",
-        "inquirer.net",
-        "thesun.co.uk",
-        "lemonde.fr",
-        "mirror.co.uk",
-        "nikkei.com",
-        "elbalad.news",
-        "express.co.uk",
-        "elmundo.es",
-        "as.com",
-        "bild.de",
-        "asahi.com",
-        "lefigaro.fr",
-        "kp.ru",
-        "thehill.com",
-        "hurriyet.com.tr",
-        "chicagotribune.com",
-        "udn.com",
-        "welt.de",
-        "infobae.com",
-        "hollywoodreporter.com",
-        "corriere.it",
-        "thehindu.com",
-        "prothomalo.com",
-        "smh.com.au",
-        "nydailynews.com",
-        "indianexpress.com",
-        "abc.es",
-        "inquirer.net",
-        "mathrubhumi.com",
-        "metro.co.uk",
-        "theglobeandmail.com",
-        "scmp.com",
-        "thetimes.co.uk",
-        "chosun.com",
-        "hindustantimes.com",
-        "clarin.com",
-        "dawn.com",
-        "milliyet.com.tr",
-        "lun.com",
-        "zeit.de",
-        "donga.com",
-        "thestar.com",
-        "denverpost.com",
-        "lanacion.com.ar",
-        "axs.com",
-        "hpenews.com",
-        "sueddeutsche.de",
-        "idnes.cz",
-        "csmonitor.com",
-        "bostonglobe.com",
-        "japantimes.co.jp",
-        "rg.ru",
-        "standard.co.uk",
-        "mk.ru",
-        "washingtontimes.com",
-        "mercurynews.com",
-        "aksam.com.tr",
-        "seattletimes.com",
-        "ce.cn",
-        "irishtimes.com",
-        "gazzetta.it",
-        "startribune.com",
-        "leparisien.fr",
-        "lavanguardia.com",
-        "chinatimes.com",
-        "dallasnews.com",
-        "azcentral.com",
-        "theage.com.au",
-        "faz.net",
-        "yomiuri.co.jp",
-        "abola.pt",
-        "sozcu.com.tr",
-        "20minutos.es",
-        "jpost.com",
-        "iz.ru",
-        "appledaily.com",
-        "oregonlive.com",
-        "miamiherald.com",
-        "business-standard.com",
-        "nation.africa",
-        "baltimoresun.com",
-        "aif.ru",
-        "livemint.com",
-        "sabah.com.tr",
-        "straitstimes.com",
-        "lequipe.fr",
-        "ajc.com",
-        "mainichi.jp",
-        "liberation.fr",
-        "yenisafak.com",
-        "elcomercio.com",
-        "independent.ie",
-        "andhrajyothy.com",
-        "theaustralian.com.au",
-        "nzherald.co.nz",
-        "freep.com",
-        "aftonbladet.se",
-        "theonion.com",
-        "mundodeportivo.com",
-        "gazeta.pl",
-        "newsday.com",
-        "standardmedia.co.ke",
-        "lastampa.it",
-        "punchng.com",
-        "nationalpost.com",
-        "cleveland.com",
-        "kommersant.ru",
-        "post-gazette.com",
-        "alwafd.news",
-        "nouvelobs.com",
-        "ynet.co.il",
-        "tempo.co",
-        "eluniversal.com.mx",
-        "estadao.com.br",
-        "dailystar.co.uk",
-        "vg.no",
-        "sacbee.com",
-        "20minutes.fr",
-        "derstandard.at",
-        "gulfnews.com",
-        "tagesspiegel.de",
-        "inquirer.com",
-        "thestar.com.my",
-        "sakshi.com",
-        "elcomercio.pe",
-        "thenews.com.pk",
-        "scotsman.com",
-        "eltiempo.com",
-        "ilsole24ore.com",
-        "thenationalnews.com",
-        "iol.co.za",
-        "sun-sentinel.com",
-        "vanguardngr.com",
-        "sport.es",
-        "handelsblatt.com",
-        "prensalibre.com",
-        "orlandosentinel.com",
-        "jsonline.com",
-        "stltoday.com",
-        "ocregister.com",
-        "tampabay.com",
-        "lesechos.fr",
-        "sfchronicle.com",
-        "nikkansports.com",
-        "ouest-france.fr",
-        "eenadu.net",
-        "sapo.pt",
-        "bostonherald.com",
-        "heraldsun.com.au",
-        "vedomosti.ru",
-        "bhaskar.com",
-        "detroitnews.com",
-        "sapo.pt",
-        "investors.com",
-        "sport-express.ru",
-        "avaz.ba",
-        "eleconomista.es",
-        "theadvocate.com",
-        "manchestereveningnews.co.uk",
-        "expressen.se",
-        "thejakartapost.com",
-        "sltrib.com",
-        "elperiodico.com",
-        "kansascity.com",
-        "diariolibre.com",
-        "financialexpress.com",
-        "dailytelegraph.com.au",
-        "ycwb.com",
-        "expansion.com",
-        "reviewjournal.com",
-        "pravda.ru",
-        "20min.ch",
-        "afr.com",
-        "seattlepi.com",
-        "dagbladet.no",
-        "observer.com",
-        "nzz.ch",
-        "eluniverso.com",
-        "vancouversun.com",
-        "khaleejtimes.com",
-        "hankyung.com"
-    ]
-    # Return the search results including the above domains in its URL
-    return pick_items_with_domain(items, online_news_agencies_domains)
+    # Return the search results including the domains which are the symbol of online news agency in its URL
+    return pick_items_with_domain(items, domain_categories.get_domain_categories().get_domains(CATEGORIES["Online News Agencies"]))
 
 # Detect the result item categorized as an "Portal"
 def pick_portal_from_items(items: list) -> list:
@@ -532,14 +540,13 @@ def pick_portal_and_blog_from_items(items: list) -> list:
     # Just returns all the items for now
     return [items, []]
 
-def remove_movie_contents_from(items: list) -> list:
-    # Prepare the list of domains which are providing movie contents should not be included in the search result
-    domains_to_be_removed = [
-        "youtube.com"
-    ]
+def remove_movie_contents_from(items: list, categories: domain_categories.DomainCategories = None) -> list:
+    # The domains which are providing movie contents should not be included in the search result, listed in the data file
+    if categories is None:
+        categories = domain_categories.get_domain_categories()
     # If item in the list given as an argument includes the domains to be removed as its URL, simply remove it from the list and return it.
     for i in range(len(items), 0, -1):
-        if items[i - 1].get_domain() in domains_to_be_removed:
+        if categories.is_removed(items[i - 1].get_domain()):
             items.pop(i - 1)
     return items
 
@@ -551,13 +558,17 @@ def remove_movie_contents_from(items: list) -> list:
 # - list of result items haveing the domains specified in the given domain list in its URL
 # - list of result items which doesn't have the specified domains
 def pick_items_with_domain(items: list, domains: list) -> list:
+    domain_set: set = set(domains)
     items_having_the_specific_domain = []
-    for i in range(len(items) - 1, -1, -1):
-        for domain in domains:
-            if(items[i].get_domain() == domain):
-                items_having_the_specific_domain.append(items.pop(i))
-                break
-    return [items_having_the_specific_domain, items]
+    items_without_the_specific_domain = []
+    for item in items:
+        if item.get_domain() in domain_set:
+            items_having_the_specific_domain.append(item)
+        else:
+            items_without_the_specific_domain.append(item)
+    # The picked items are listed from the last one
+    items_having_the_specific_domain.reverse()
+    return [items_having_the_specific_domain, items_without_the_specific_domain]
 
 # Pick the highest-ranked item from the given set of search result items
 def pick_highest_ranked_result_item(items: list) -> list:
@@ -703,39 +714,113 @@ def selection_for_general_computers(classified_result_items: dict) -> list:
             ResultItem1, ResultItem2, ResultItem3, ...
         ]
     '''
-    # Pick only highest and lowest-ranked item from a duplicated domain of its URL
-    classified_result_item_separated_by_domain: dict = {}
-    classified_result_item_only_highest_and_lowest_for_a_domain: dict = {}
-    for category in classified_result_items.keys():
-        # Put the dictionary grouped by their domain into the mother dictionary
-        classified_result_item_separated_by_domain[category]: dict = separate_items_by_domain(classified_result_items[category])
+    selected_result_items: list = []
+    for category, items in classified_result_items.items():
         if category == CATEGORIES["Encyclopedia"]:
             # For the items categorized as Encyclopedia, pick only 1 item randomly and remove all others
-            picked_encyclopedia: ResultItem = pick_one_from(classified_result_items[CATEGORIES["Encyclopedia"]])
+            picked_encyclopedia: ResultItem = pick_one_from(items)
             if picked_encyclopedia != None:
-                classified_result_item_only_highest_and_lowest_for_a_domain[CATEGORIES["Encyclopedia"]] = [picked_encyclopedia]
-            else:
-                classified_result_item_only_highest_and_lowest_for_a_domain[CATEGORIES["Encyclopedia"]] = []
-        else:
-            # For all categories except Encyclopedia
-            classified_result_item_only_highest_and_lowest_for_a_domain[category]: list = []
-            for results_with_particular_url_domain in classified_result_item_separated_by_domain[category].values():
-                # For all list grouped by results' URL domain
-                # make the list to contain only the highest and lowest-ranked ones if it contains multiple items
-                # or keep it as it is if contains less than 3 items
-                for item in pick_highest_and_lowest_if_contains_multiple_items(results_with_particular_url_domain):
-                    classified_result_item_only_highest_and_lowest_for_a_domain[category].append(item)
-        
-    # Pick only highest and lowest-ranked item from a category
-    selected_result_items: list = []
-    for category in classified_result_items.keys():
-        items_list: list = classified_result_item_only_highest_and_lowest_for_a_domain[category]
-        for item in pick_highest_and_lowest_if_contains_multiple_items(items_list):
-            if item != None:
-                selected_result_items.append(item)
+                selected_result_items.append(picked_encyclopedia)
+            continue
+        # For all categories except Encyclopedia, go through the items once
+        # and keep only the highest and lowest-ranked item of each domain of their URL
+        extremes_by_domain: dict = {}
+        for item in items:
+            domain: str = item.get_domain()
+            extremes: RankExtremes = extremes_by_domain.get(domain)
+            if extremes is None:
+                extremes = RankExtremes()
+                extremes_by_domain[domain] = extremes
+            extremes.add(item)
+        # Pick only highest and lowest-ranked item from a category
+        category_extremes = RankExtremes()
+        for extremes in extremes_by_domain.values():
+            for item in extremes.pick():
+                category_extremes.add(item)
+        selected_result_items.extend(category_extremes.pick())
 
     return selected_result_items
-    
+
+class RankExtremes:
+    '''
+    Tracks the highest and lowest-ranked item of a group of result items in one pass over the items, without copying them
+    The ties are broken randomly by reservoir sampling: every item having the extreme rank is picked with the same probability.
+    The lowest-ranked item is picked among the items except the one picked as the highest-ranked item.
+    '''
+    __slots__ = (
+        "count", "firsts",
+        "highest", "highest_rank", "highest_ties",
+        "lowests", "lowest_rank", "lowest_ties",
+        "runner_up", "runner_up_rank", "runner_up_ties"
+    )
+
+    def __init__(self):
+        # Number of the items added, and the first 2 of them
+        self.count: int = 0
+        self.firsts: list = []
+        # One of the items having the highest rank, i.e. the smallest get_highest_rank()
+        self.highest: ResultItem = None
+        self.highest_rank: int = None
+        self.highest_ties: int = 0
+        # Up to 2 of the items having the lowest rank, i.e. the largest get_lowest_rank()
+        self.lowests: list = []
+        self.lowest_rank: int = None
+        self.lowest_ties: int = 0
+        # One of the items having the second lowest rank, used when the lowest-ranked item is the highest one
+        self.runner_up: ResultItem = None
+        self.runner_up_rank: int = None
+        self.runner_up_ties: int = 0
+
+    def add(self, item: ResultItem):
+        self.count = self.count + 1
+        if len(self.firsts) < 2:
+            self.firsts.append(item)
+
+        rank: int = item.get_highest_rank()
+        if self.highest_rank is None or rank < self.highest_rank:
+            self.highest, self.highest_rank, self.highest_ties = item, rank, 1
+        elif rank == self.highest_rank:
+            self.highest_ties = self.highest_ties + 1
+            if random.randrange(self.highest_ties) == 0:
+                self.highest = item
+
+        rank = item.get_lowest_rank()
+        if self.lowest_rank is None or rank > self.lowest_rank:
+            if self.lowest_rank is not None:
+                # The items of the previous lowest rank become the runner-up
+                self.runner_up, self.runner_up_rank, self.runner_up_ties = random.choice(self.lowests), self.lowest_rank, self.lowest_ties
+            self.lowests, self.lowest_rank, self.lowest_ties = [item], rank, 1
+        elif rank == self.lowest_rank:
+            self.lowest_ties = self.lowest_ties + 1
+            if len(self.lowests) < 2:
+                self.lowests.append(item)
+            else:
+                replaced: int = random.randrange(self.lowest_ties)
+                if replaced < 2:
+                    self.lowests[replaced] = item
+        elif self.runner_up_rank is None or rank > self.runner_up_rank:
+            self.runner_up, self.runner_up_rank, self.runner_up_ties = item, rank, 1
+        elif rank == self.runner_up_rank:
+            self.runner_up_ties = self.runner_up_ties + 1
+            if random.randrange(self.runner_up_ties) == 0:
+                self.runner_up = item
+
+    def get_highest_and_lowest(self) -> list:
+        # [highest-ranked item, lowest-ranked item among the others], only the highest if a single item is added
+        if self.count == 0:
+            return []
+        if self.count == 1:
+            return [self.highest]
+        candidates: list = [item for item in self.lowests if item is not self.highest]
+        if len(candidates) == 0:
+            return [self.highest, self.runner_up]
+        return [self.highest, random.choice(candidates)]
+
+    def pick(self) -> list:
+        # The highest and lowest-ranked item if more than 2 items are added, or the added items as they are
+        if self.count <= 2:
+            return list(self.firsts)
+        return self.get_highest_and_lowest()
 
 # Returns a list of highest and lowest-ranked item if the given list is including multiple items
 def pick_highest_and_lowest_if_contains_multiple_items(items: list) -> list:
@@ -785,27 +870,10 @@ def pick_one_highest_and_one_lowest(items: list) -> list:
         List of the highest and lowest-ranked item in the given result items
         If multiple items having the same rank returned, choose one randomly
     '''
-    # If the original results list is empty, return an empty list
-    if len(items) == 0:
-        return []
-    # Make a deepcopy of the given result item list to avoid make changes to the original items
-    results: list = copy.deepcopy(items)
-    # Get the highest-ranked items, put them into a list and pick one randomly if it contains multiple items
-    highests: list = pick_highest_ranked_result_item(results)
-    highest: ResultItem = pick_one_from(highests)
-    # Remove the item picked as highest, to avoid duplication between highest and lowest item
-    results.remove(highest)
-    # If the current size of the results list is empty, return the highest
-    if len(results) == 0:
-        return [highest]
-    # Get the lowest-ranked items, put them into a list and pick one randomly if it contains multiple items
-    lowests: list = pick_lowest_ranked_result_item(results)
-    lowest: ResultItem = pick_one_from(lowests)
-    # Make the results list empty and append highest and lowest to return it back
-    results = []
-    results.append(highest)
-    results.append(lowest)
-    return results
+    extremes = RankExtremes()
+    for item in items:
+        extremes.add(item)
+    return extremes.get_highest_and_lowest()
 
 def pick_one_from(items: list) -> ResultItem:
     if len(items) == 0:
@@ -879,13 +947,59 @@ def push_into_json(*args) -> str:
 
 def search(request):
     search_query = request.GET.get('query')
-    results = metasearch(search_query)
+    dropped_engines: list = []
+    # Measure the stages of the search, sent back in the Server-Timing header
+    # Profile the search if a profile is asked with the permission, see metasearch.profiling
+    request_profile: RequestProfile = get_requested_profile(request)
+    with RequestTimings() as request_timings, (request_profile or contextlib.nullcontext()):
+        results = metasearch(search_query, dropped_engines, use_cache=request_profile is None)
+
+        context = {
+            'query': search_query,
+            'search_results': results,
+            'dropped_engines': dropped_engines,
+            'form': forms.SearchForm({'query': search_query})
+        }
 
-    context = {
-        'query': search_query,
-        'search_results': results,
-        'form': forms.SearchForm({'query': search_query})
-    }
-    
-    return render(request, 'metasearch/result.html', context)
+        with Timer("render"):
+            response = render(request, 'metasearch/result.html', context)
+    if is_server_timing_enabled():
+        response["Server-Timing"] = request_timings.get_server_timing()
+    if is_metrics_enabled():
+        publish_metrics()
+    if request_profile is not None:
+        return request_profile.get_response(response)
+    return response
+
+async def search_async(request):
+    # Same as search, but the search engines are called on the event loop when it's served through ASGI
+    search_query = request.GET.get('query')
+    dropped_engines: list = []
+    # Profile the search if a profile is asked with the permission, see metasearch.profiling
+    request_profile: RequestProfile = get_requested_profile(request)
+    with RequestTimings() as request_timings, (request_profile or contextlib.nullcontext()):
+        results = await metasearch_async(search_query, dropped_engines, use_cache=request_profile is None)
+
+        context = {
+            'query': search_query,
+            'search_results': results,
+            'dropped_engines': dropped_engines,
+            'form': forms.SearchForm({'query': search_query})
+        }
 
+        with Timer("render"):
+            response = render(request, 'metasearch/result.html', context)
+    if is_server_timing_enabled():
+        response["Server-Timing"] = request_timings.get_server_timing()
+    if is_metrics_enabled():
+        # The snapshot of the metrics is written into a file, which must not block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, publish_metrics)
+    if request_profile is not None:
+        return request_profile.get_response(response)
+    return response
+
+def metrics(request):
+    # Metrics of all the worker processes in the Prometheus text format, disabled by settings.METASEARCH_METRICS_ENABLED
+    if not is_metrics_enabled():
+        raise Http404("Metrics are disabled")
+    return HttpResponse(collect_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")